@@ -2,179 +2,289 @@
 # -*- coding: utf-8 -*-
 
 import os
+import argparse
 import base64
+import gc
+import hashlib
+import json
 import re
+import shutil
+import subprocess
 import sys
+import tempfile
 import traceback
 import atexit
 import signal
+import socket
+import itertools
+import queue
+import threading
 import time
-from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from math import inf, log10
+from array import array
+from collections import OrderedDict, deque, namedtuple
+from types import ModuleType, SimpleNamespace
+from math import ceil, inf, log10, pi, sin, sqrt, sumprod
 import wave
 
 
-def default_dictionary_path():
-    return os.path.expanduser("~/Library/Application Support/koto-type/user_dictionary.json")
-
-
-def setup_logging():
-    log_dir = os.path.expanduser("~/Library/Application Support/koto-type")
-    os.makedirs(log_dir, exist_ok=True)
-
-    log_file = os.path.join(log_dir, "server.log")
-
-    def log(message):
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_line = f"[{timestamp}] [pid={os.getpid()}] {message}\n"
-        with open(log_file, "a", encoding="utf-8") as f:
-            f.write(log_line)
-
-    return log_file, log
+SAMPLE_RATE = 16000
+LEVEL_BLOCK_SECONDS = 0.02
 
 
-def default_server_state_path():
-    return os.path.expanduser("~/Library/Application Support/koto-type/server_state.json")
-
-
-def default_server_state_lock_path():
-    return os.path.expanduser("~/Library/Application Support/koto-type/server_state.lock")
-
+def default_dictionary_path():
+    return os.path.expanduser("~/Library/Application Support/koto-type/user_dictionary.json")
 
-def parse_int(value, default):
-    if value is None:
-        return default
 
-    try:
-        return int(str(value).strip())
-    except (TypeError, ValueError):
-        return default
+LOG_LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40}
 
 
-def pid_exists(pid):
-    if pid <= 0:
-        return False
+def infer_log_level(message):
+    # Only for call sites that pass no level: a leading marker decides, so a
+    # message that merely mentions a failure stays at info.
+    if message.startswith(("Error", "Traceback")):
+        return "error"
+    if message.startswith("Warning"):
+        return "warning"
+    return "info"
 
-    try:
-        os.kill(pid, 0)
-    except ProcessLookupError:
-        return False
-    except PermissionError:
-        return True
-    except OSError:
-        return False
 
-    return True
+def truncate_log_text(text, max_chars=None):
+    if max_chars is None:
+        max_chars = parse_int(os.environ.get("KOTOTYPE_LOG_TEXT_MAX_CHARS"), 0)
+    if text is None or max_chars <= 0 or len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}...(+{len(text) - max_chars} chars)"
+
+
+class BackgroundLogWriter:
+    # Callers only format and enqueue; a single thread keeps the file open,
+    # writes whatever has accumulated in one go and rotates by size.
+    def __init__(self, path, max_bytes=5 * 1024 * 1024, backup_count=3, batch_size=256):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self.closed = False
+        self.start()
+
+    def start(self):
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.run, name="log-writer", daemon=True)
+        self.thread.start()
+
+    def reinit_after_fork(self):
+        # Only the forking thread survives in the child; lines queued but not
+        # yet written belong to the parent and are dropped here.
+        self.lock = threading.Lock()
+        self.closed = False
+        self.start()
+
+    def write(self, line):
+        if self.closed:
+            return
+        self.queue.put(line)
 
+    def flush(self, timeout=5.0):
+        if self.closed or not self.thread.is_alive():
+            return
+        done = threading.Event()
+        self.queue.put(done)
+        done.wait(timeout)
+
+    def close(self, timeout=5.0):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+        self.queue.put(None)
+        self.thread.join(timeout)
+
+    def rotate(self, stream):
+        stream.close()
+        if self.backup_count <= 0:
+            os.remove(self.path)
+        else:
+            for index in range(self.backup_count - 1, 0, -1):
+                source = f"{self.path}.{index}"
+                if os.path.exists(source):
+                    os.replace(source, f"{self.path}.{index + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        return open(self.path, "a", encoding="utf-8")
+
+    def run(self):
+        stream = open(self.path, "a", encoding="utf-8")
+        try:
+            while True:
+                items = [self.queue.get()]
+                while len(items) < self.batch_size:
+                    try:
+                        items.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                stopping = False
+                waiters = []
+                lines = []
+                for item in items:
+                    if item is None:
+                        stopping = True
+                    elif isinstance(item, threading.Event):
+                        waiters.append(item)
+                    else:
+                        lines.append(item)
+
+                if lines:
+                    stream.write("".join(lines))
+                    stream.flush()
+                    if self.max_bytes > 0 and stream.tell() >= self.max_bytes:
+                        stream = self.rotate(stream)
+                for waiter in waiters:
+                    waiter.set()
+                if stopping:
+                    return
+        finally:
+            stream.close()
+
+
+class ServerLogger:
+    # Called like the plain log functions used everywhere else; flush() waits
+    # until queued lines have reached the file.
+    def __init__(self, writer, min_level=LOG_LEVELS["info"]):
+        self.writer = writer
+        self.min_level = min_level
+
+    def __call__(self, message, level=None):
+        level = level or infer_log_level(message)
+        if LOG_LEVELS.get(level, LOG_LEVELS["info"]) < self.min_level:
+            return
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.writer.write(f"[{timestamp}] [pid={os.getpid()}] {message}\n")
 
-def load_server_state(path):
-    default_state = {"active_pids": [], "loading_pids": [], "updated_at": None}
-    if not os.path.exists(path):
-        return default_state
+    def flush(self):
+        self.writer.flush()
 
-    try:
-        import json
 
-        with open(path, "r", encoding="utf-8") as f:
-            loaded = json.load(f)
-    except Exception:
-        return default_state
+LOG_WRITERS: list[BackgroundLogWriter] = []
 
-    if not isinstance(loaded, dict):
-        return default_state
 
-    active_pids = loaded.get("active_pids", [])
-    loading_pids = loaded.get("loading_pids", [])
+def reinit_log_writer_after_fork():
+    if LOG_WRITERS:
+        LOG_WRITERS[-1].reinit_after_fork()
 
-    if not isinstance(active_pids, list):
-        active_pids = []
-    if not isinstance(loading_pids, list):
-        loading_pids = []
 
-    return {
-        "active_pids": [int(pid) for pid in active_pids if isinstance(pid, int)],
-        "loading_pids": [int(pid) for pid in loading_pids if isinstance(pid, int)],
-        "updated_at": loaded.get("updated_at"),
-    }
+def setup_logging():
+    log_dir = os.path.expanduser("~/Library/Application Support/koto-type")
+    os.makedirs(log_dir, exist_ok=True)
 
+    log_file = os.path.join(log_dir, "server.log")
+    writer = BackgroundLogWriter(
+        log_file,
+        max_bytes=max(0, parse_int(os.environ.get("KOTOTYPE_LOG_MAX_BYTES"), 5 * 1024 * 1024)),
+        backup_count=max(0, parse_int(os.environ.get("KOTOTYPE_LOG_BACKUP_COUNT"), 3)),
+    )
+    atexit.register(writer.close)
+    if not LOG_WRITERS and hasattr(os, "register_at_fork"):
+        # Hooks cannot be unregistered; the one hook follows the latest writer.
+        os.register_at_fork(after_in_child=reinit_log_writer_after_fork)
+    LOG_WRITERS[:] = [writer]
+    min_level = LOG_LEVELS.get(
+        (os.environ.get("KOTOTYPE_LOG_LEVEL") or "info").strip().lower(),
+        LOG_LEVELS["info"],
+    )
+    return log_file, ServerLogger(writer, min_level)
 
-def save_server_state(path, state):
-    import json
 
-    state["updated_at"] = datetime.now().isoformat()
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(state, f, ensure_ascii=False)
+def default_server_slot_dir():
+    return os.path.expanduser("~/Library/Application Support/koto-type/slots")
 
 
-@contextmanager
-def server_state_lock(lock_path):
-    import fcntl
+def parse_int(value, default):
+    if value is None:
+        return default
 
-    lock_dir = os.path.dirname(lock_path)
-    os.makedirs(lock_dir, exist_ok=True)
-    lock_file = open(lock_path, "a+", encoding="utf-8")
     try:
-        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
-        yield
-    finally:
-        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
-        lock_file.close()
-
-
-def mutate_server_state(state_path, lock_path, mutator):
-    with server_state_lock(lock_path):
-        state = load_server_state(state_path)
-        state["active_pids"] = [pid for pid in state["active_pids"] if pid_exists(pid)]
-        state["loading_pids"] = [pid for pid in state["loading_pids"] if pid_exists(pid)]
-        result = mutator(state)
-        save_server_state(state_path, state)
-        return result
-
-
-def register_server_pid(state_path, lock_path, pid, max_active_servers):
-    def mutator(state):
-        if pid not in state["active_pids"]:
-            state["active_pids"].append(pid)
-
-        active_count = len(state["active_pids"])
-        if active_count > max_active_servers:
-            state["active_pids"] = [active_pid for active_pid in state["active_pids"] if active_pid != pid]
-            state["loading_pids"] = [loading_pid for loading_pid in state["loading_pids"] if loading_pid != pid]
-            return False, active_count - 1
-        return True, active_count
-
-    return mutate_server_state(state_path, lock_path, mutator)
-
-
-def unregister_server_pid(state_path, lock_path, pid):
-    def mutator(state):
-        state["active_pids"] = [active_pid for active_pid in state["active_pids"] if active_pid != pid]
-        state["loading_pids"] = [loading_pid for loading_pid in state["loading_pids"] if loading_pid != pid]
-        return None
+        return int(str(value).strip())
+    except (TypeError, ValueError):
+        return default
 
-    mutate_server_state(state_path, lock_path, mutator)
 
+class LockSlots:
+    # A counting semaphore made of `count` lock files. A slot is held by an
+    # exclusive flock on its file, so the kernel frees it the moment the
+    # holder exits or crashes; waiters poll for a free slot until timeout.
+    def __init__(self, directory, name, count):
+        self.directory = directory
+        self.name = name
+        self.count = max(1, count)
+        self.lock = threading.Lock()
+        self.held = None
 
-def try_acquire_model_load_slot(state_path, lock_path, pid, max_parallel_model_loads):
-    def mutator(state):
-        loading = state["loading_pids"]
-        if pid in loading:
-            return True, len(loading)
-        if len(loading) >= max_parallel_model_loads:
-            return False, len(loading)
-        loading.append(pid)
-        return True, len(loading)
+    def slot_path(self, index):
+        return os.path.join(self.directory, f"{self.name}_{index}.lock")
 
-    return mutate_server_state(state_path, lock_path, mutator)
+    def open_slot(self, index):
+        os.makedirs(self.directory, exist_ok=True)
+        return open(self.slot_path(index), "a+", encoding="utf-8")
 
+    def try_lock_slot(self, index):
+        import fcntl
 
-def release_model_load_slot(state_path, lock_path, pid):
-    def mutator(state):
-        state["loading_pids"] = [loading_pid for loading_pid in state["loading_pids"] if loading_pid != pid]
+        lock_file = self.open_slot(index)
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    def try_acquire(self):
+        with self.lock:
+            if self.held is not None:
+                return self.held[0]
+            for index in range(self.count):
+                lock_file = self.try_lock_slot(index)
+                if lock_file is not None:
+                    self.held = (index, lock_file)
+                    return index
         return None
 
-    mutate_server_state(state_path, lock_path, mutator)
+    def acquire(self, timeout=None, poll_interval=0.05):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            index = self.try_acquire()
+            if index is not None:
+                return index
+            if deadline is None:
+                time.sleep(poll_interval)
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            time.sleep(min(poll_interval, remaining))
+
+    def busy_count(self):
+        busy = 0
+        for index in range(self.count):
+            if self.held is not None and self.held[0] == index:
+                busy += 1
+                continue
+            lock_file = self.try_lock_slot(index)
+            if lock_file is None:
+                busy += 1
+            else:
+                lock_file.close()
+        return busy
+
+    def release(self):
+        with self.lock:
+            if self.held is None:
+                return
+            _, lock_file = self.held
+            self.held = None
+        lock_file.close()
 
 
 def build_audio_filter_chain(enable_noise_reduction=True, use_nlm_denoise=False):
@@ -210,6 +320,126 @@ def build_audio_filter_chain_candidates(enable_noise_reduction=True):
     ]
 
 
+def default_filter_capability_cache_path():
+    return os.path.expanduser("~/Library/Application Support/koto-type/ffmpeg_filter_cache.json")
+
+
+def detect_ffmpeg_identity(ffmpeg_binary="ffmpeg"):
+    binary_path = shutil.which(ffmpeg_binary)
+    if binary_path is None:
+        return None
+
+    try:
+        completed = subprocess.run(
+            [binary_path, "-hide_banner", "-version"],
+            capture_output=True,
+            text=True,
+            timeout=10,
+        )
+    except Exception:
+        return None
+
+    output_lines = completed.stdout.strip().splitlines()
+    version_line = output_lines[0] if output_lines else "unknown"
+    return f"{os.path.realpath(binary_path)}|{version_line}"
+
+
+def probe_filter_chain(ffmpeg_module, filter_chain):
+    (
+        ffmpeg_module.input(f"anullsrc=r={SAMPLE_RATE}:cl=mono", f="lavfi", t=0.1)
+        .output(
+            "-",
+            acodec="pcm_s16le",
+            ac=1,
+            ar=str(SAMPLE_RATE),
+            af=filter_chain,
+            format="null",
+        )
+        .run(quiet=True)
+    )
+
+
+class FilterChainCapabilityCache:
+    def __init__(self, cache_path, ffmpeg_identity):
+        self.cache_path = cache_path
+        self.ffmpeg_identity = ffmpeg_identity
+        self.supported = set()
+        self.unsupported = set()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, cache_path, ffmpeg_identity):
+        cache = cls(cache_path, ffmpeg_identity)
+        if ffmpeg_identity is None:
+            return cache
+
+        entry = cache.read_entries().get(ffmpeg_identity, {})
+        if isinstance(entry, dict):
+            cache.supported = {
+                chain for chain in entry.get("supported", []) if isinstance(chain, str)
+            }
+            cache.unsupported = {
+                chain for chain in entry.get("unsupported", []) if isinstance(chain, str)
+            }
+        return cache
+
+    def read_entries(self):
+        if not os.path.exists(self.cache_path):
+            return {}
+
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                loaded = json.load(f)
+        except Exception:
+            return {}
+
+        return loaded if isinstance(loaded, dict) else {}
+
+    def save(self):
+        entries = self.read_entries()
+        entries[self.ffmpeg_identity] = {
+            "supported": sorted(self.supported),
+            "unsupported": sorted(self.unsupported),
+            "updated_at": datetime.now().isoformat(),
+        }
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        temp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(entries, f, ensure_ascii=False)
+        os.replace(temp_path, self.cache_path)
+
+    def order_candidates(self, candidates):
+        with self.lock:
+            return [chain for chain in candidates if chain not in self.unsupported]
+
+    def record_failure(self, ffmpeg_module, filter_chain, log):
+        # A failed run may be caused by the input file, so confirm with a
+        # synthetic probe before remembering the chain as unsupported.
+        with self.lock:
+            if filter_chain in self.unsupported:
+                return True
+            if self.ffmpeg_identity is None or filter_chain in self.supported:
+                return False
+
+            try:
+                probe_filter_chain(ffmpeg_module, filter_chain)
+                self.supported.add(filter_chain)
+                is_unsupported = False
+            except Exception as error:
+                self.unsupported.add(filter_chain)
+                is_unsupported = True
+                log(
+                    "FFmpeg filter chain is unsupported by this binary, caching result: "
+                    f"{format_ffmpeg_error(error)}"
+                )
+
+            try:
+                self.save()
+            except Exception as error:
+                log(f"Failed to save FFmpeg filter capability cache: {error}", level="warning")
+            return is_unsupported
+
+
 def format_ffmpeg_error(error):
     stderr_output = getattr(error, "stderr", None)
     if isinstance(stderr_output, (bytes, bytearray)):
@@ -217,6 +447,11 @@ def format_ffmpeg_error(error):
     return str(error)
 
 
+def add_stage_timing(timings, name, started):
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + (time.perf_counter() - started)
+
+
 def run_preprocess_with_filter(ffmpeg_module, input_path, output_path, filter_chain):
     (
         ffmpeg_module.input(input_path)
@@ -242,43 +477,263 @@ def apply_gain_to_wav(ffmpeg_module, input_path, output_path, gain_db):
     )
 
 
-def analyze_wav_peak_dbfs(wav_path):
-    max_peak = 0
+def run_preprocess_to_array(ffmpeg_module, numpy_module, input_path, filter_chain):
+    output_bytes, _ = (
+        ffmpeg_module.input(input_path)
+        .output(
+            "pipe:",
+            format="f32le",
+            acodec="pcm_f32le",
+            ac=1,
+            ar=str(SAMPLE_RATE),
+            af=filter_chain,
+        )
+        .run(capture_stdout=True, capture_stderr=True)
+    )
+    return numpy_module.frombuffer(output_bytes, dtype=numpy_module.float32)
+
+
+def apply_gain_to_array(audio, gain_db, limit=0.98):
+    boosted = audio * (10.0 ** (gain_db / 20.0))
+    boosted.clip(-limit, limit, out=boosted)
+    return boosted
+
+
+def analyze_array_peak_dbfs(audio):
+    if len(audio) == 0:
+        return -inf
+
+    max_peak = float(abs(audio).max())
+    if max_peak <= 0:
+        return -inf
+
+    return 20.0 * log10(max_peak)
+
+
+def describe_audio_source(audio):
+    if isinstance(audio, str):
+        return audio
+    return f"<in-memory {len(audio)} samples @ {SAMPLE_RATE} Hz>"
+
+
+AudioLevelStats = namedtuple(
+    "AudioLevelStats",
+    [
+        "peak_dbfs",
+        "rms_dbfs",
+        "clip_count",
+        "noise_floor_dbfs",
+        "channel_count",
+        "frame_count",
+        "speech_ratio",
+        "zero_crossing_rate",
+    ],
+    defaults=(0.0, 0.0),
+)
+
+
+def amplitude_to_dbfs(amplitude, full_scale=1.0):
+    if amplitude <= 0:
+        return -inf
+    return 20.0 * log10(amplitude / full_scale)
+
+
+OPTIONAL_MODULES: dict[str, ModuleType | None] = {}
+
+
+def load_numpy_module():
+    # Request paths ask for numpy/ffmpeg every time; the outcome (including a
+    # failed import) is remembered so later calls are a dict lookup.
+    if "numpy" not in OPTIONAL_MODULES:
+        try:
+            import numpy as imported_numpy
+
+            OPTIONAL_MODULES["numpy"] = imported_numpy
+        except ImportError:
+            OPTIONAL_MODULES["numpy"] = None
+    return OPTIONAL_MODULES["numpy"]
+
+
+def load_ffmpeg_module():
+    if "ffmpeg" not in OPTIONAL_MODULES:
+        try:
+            import ffmpeg as imported_ffmpeg
+
+            OPTIONAL_MODULES["ffmpeg"] = imported_ffmpeg
+        except ImportError:
+            OPTIONAL_MODULES["ffmpeg"] = None
+    return OPTIONAL_MODULES["ffmpeg"]
+
+
+class AudioLevelAccumulator:
+    # Block RMS values are kept (one float per 20 ms) so the noise floor can be
+    # estimated as a low percentile without a second pass over the samples.
+    # A block counts as speech-like when it stands clear of that floor and is
+    # not dominated by zero crossings (hiss, fan noise).
+    noise_floor_percentile = 0.1
+    speech_margin_db = 12.0
+    speech_min_dbfs = -55.0
+    speech_max_zero_crossing_rate = 0.35
+
+    def __init__(self, full_scale, block_size, numpy_module=None):
+        self.full_scale = full_scale
+        self.block_size = max(1, block_size)
+        self.numpy_module = numpy_module
+        self.peak = 0
+        self.sum_squares = 0.0
+        self.clip_count = 0
+        self.sample_count = 0
+        self.block_rms = []
+        self.block_zero_crossings = []
+
+    def add_array(self, samples):
+        if len(samples) == 0:
+            return
+
+        # Arrays only arrive here from callers that already loaded numpy.
+        np = self.numpy_module
+        assert np is not None
+        self.peak = max(self.peak, samples.max().item(), -samples.min().item())
+        values = samples.astype(np.float64)
+        squares = np.square(values)
+        self.sum_squares += float(squares.sum())
+        self.clip_count += int(np.count_nonzero(np.abs(values) >= self.full_scale))
+        self.sample_count += len(values)
+
+        negative = np.signbit(values)
+        crossings = np.empty(len(values), dtype=np.float64)
+        np.not_equal(negative[1:], negative[:-1], out=crossings[1:])
+        crossings[:: self.block_size] = 0.0
+
+        whole = len(squares) - len(squares) % self.block_size
+        if whole:
+            blocks = squares[:whole].reshape(-1, self.block_size)
+            self.block_rms.extend(np.sqrt(blocks.mean(axis=1)).tolist())
+            self.block_zero_crossings.extend(
+                crossings[:whole].reshape(-1, self.block_size).mean(axis=1).tolist()
+            )
+        if whole < len(squares):
+            self.block_rms.append(float(np.sqrt(squares[whole:].mean())))
+            self.block_zero_crossings.append(float(crossings[whole:].mean()))
+
+    def add_int16_sequence(self, values):
+        if len(values) == 0:
+            return
+
+        chunk_peak = max(max(values), -min(values))
+        self.peak = max(self.peak, chunk_peak)
+        if chunk_peak >= 32767:
+            listed = values.tolist()
+            self.clip_count += listed.count(32767) + listed.count(-32767) + listed.count(-32768)
+        self.sample_count += len(values)
+
+        for start in range(0, len(values), self.block_size):
+            block = values[start : start + self.block_size]
+            block_sum_squares = sumprod(block, block)
+            self.sum_squares += block_sum_squares
+            self.block_rms.append(sqrt(block_sum_squares / len(block)))
+            crossings = sum(
+                1 for previous, current in zip(block, block[1:]) if (previous < 0) != (current < 0)
+            )
+            self.block_zero_crossings.append(crossings / len(block))
+
+    def result(self, channel_count):
+        if self.sample_count == 0:
+            return AudioLevelStats(-inf, -inf, 0, -inf, channel_count, 0)
+
+        rms = sqrt(self.sum_squares / self.sample_count)
+        ordered_blocks = sorted(self.block_rms)
+        noise_floor = ordered_blocks[int(len(ordered_blocks) * self.noise_floor_percentile)]
+        speech_level = max(
+            noise_floor * 10 ** (self.speech_margin_db / 20.0),
+            self.full_scale * 10 ** (self.speech_min_dbfs / 20.0),
+        )
+        speech_blocks = sum(
+            1
+            for block_rms, zero_crossing_rate in zip(self.block_rms, self.block_zero_crossings)
+            if block_rms >= speech_level
+            and zero_crossing_rate <= self.speech_max_zero_crossing_rate
+        )
+        return AudioLevelStats(
+            peak_dbfs=amplitude_to_dbfs(self.peak, self.full_scale),
+            rms_dbfs=amplitude_to_dbfs(rms, self.full_scale),
+            clip_count=self.clip_count,
+            noise_floor_dbfs=amplitude_to_dbfs(noise_floor, self.full_scale),
+            channel_count=channel_count,
+            frame_count=self.sample_count // max(1, channel_count),
+            speech_ratio=speech_blocks / len(self.block_rms),
+            zero_crossing_rate=sum(self.block_zero_crossings) / len(self.block_zero_crossings),
+        )
+
+
+def analyze_wav_levels(wav_path, numpy_module=None, use_numpy=True):
+    if numpy_module is None and use_numpy:
+        numpy_module = load_numpy_module()
 
     with wave.open(wav_path, "rb") as wav_file:
         sample_width = wav_file.getsampwidth()
         channel_count = wav_file.getnchannels()
+        frame_rate = wav_file.getframerate()
 
         if sample_width != 2:
             raise ValueError(
                 f"Unsupported sample width for peak analysis: {sample_width * 8}-bit"
             )
 
+        block_frames = max(1, int(frame_rate * LEVEL_BLOCK_SECONDS))
+        accumulator = AudioLevelAccumulator(
+            full_scale=32767,
+            block_size=block_frames * channel_count,
+            numpy_module=numpy_module,
+        )
+        frame_size = sample_width * channel_count
+
         while True:
-            frames = wav_file.readframes(4096)
+            frames = wav_file.readframes(block_frames * 512)
             if not frames:
                 break
 
-            frame_count = len(frames) // (sample_width * channel_count)
-            if frame_count <= 0:
+            usable_bytes = len(frames) - len(frames) % frame_size
+            if usable_bytes <= 0:
                 continue
 
-            for frame_index in range(frame_count):
-                offset = frame_index * sample_width * channel_count
-                sample_bytes = frames[offset : offset + sample_width]
-                sample_value = int.from_bytes(
-                    sample_bytes,
-                    byteorder="little",
-                    signed=True,
+            if numpy_module is not None:
+                accumulator.add_array(
+                    numpy_module.frombuffer(frames, dtype="<i2", count=usable_bytes // 2)
                 )
-                abs_sample = abs(sample_value)
-                if abs_sample > max_peak:
-                    max_peak = abs_sample
+            else:
+                values = memoryview(frames)[:usable_bytes].cast("h")
+                if sys.byteorder == "big":
+                    swapped = array("h", values)
+                    swapped.byteswap()
+                    values = memoryview(swapped)
+                accumulator.add_int16_sequence(values)
 
-    if max_peak <= 0:
-        return -inf
+    return accumulator.result(channel_count)
+
+
+def analyze_array_levels(audio, numpy_module=None):
+    if numpy_module is None:
+        numpy_module = load_numpy_module()
+
+    accumulator = AudioLevelAccumulator(
+        full_scale=1.0,
+        block_size=int(SAMPLE_RATE * LEVEL_BLOCK_SECONDS),
+        numpy_module=numpy_module,
+    )
+    accumulator.add_array(audio)
+    return accumulator.result(channel_count=1)
 
-    return 20.0 * log10(max_peak / 32767.0)
+
+def analyze_wav_peak_dbfs(wav_path):
+    return analyze_wav_levels(wav_path).peak_dbfs
+
+
+def format_level_stats(stats):
+    return (
+        f"peak={stats.peak_dbfs:.2f} dBFS, rms={stats.rms_dbfs:.2f} dBFS, "
+        f"noise_floor={stats.noise_floor_dbfs:.2f} dBFS, clipped={stats.clip_count}"
+    )
 
 
 def determine_gain_for_weak_audio(
@@ -286,6 +741,8 @@ def determine_gain_for_weak_audio(
     weak_threshold_dbfs=-18.0,
     target_peak_dbfs=-10.0,
     max_gain_db=18.0,
+    noise_floor_dbfs=None,
+    max_noise_floor_dbfs=None,
 ):
     if peak_dbfs >= weak_threshold_dbfs:
         return 0.0
@@ -294,7 +751,44 @@ def determine_gain_for_weak_audio(
     if required_gain <= 0:
         return 0.0
 
-    return min(required_gain, max_gain_db)
+    gain = min(required_gain, max_gain_db)
+    if noise_floor_dbfs is not None and max_noise_floor_dbfs is not None:
+        # Do not lift background noise above the configured floor.
+        gain = min(gain, max(0.0, max_noise_floor_dbfs - noise_floor_dbfs))
+
+    return gain
+
+
+def analyze_and_determine_gain(
+    peak_analyzer,
+    audio,
+    log,
+    weak_threshold_dbfs,
+    target_peak_dbfs,
+    max_gain_db,
+):
+    analysis = peak_analyzer(audio)
+    if isinstance(analysis, AudioLevelStats):
+        peak_dbfs = analysis.peak_dbfs
+        noise_floor_dbfs = analysis.noise_floor_dbfs
+        description = format_level_stats(analysis)
+    else:
+        peak_dbfs = analysis
+        noise_floor_dbfs = None
+        description = f"peak={peak_dbfs:.2f} dBFS"
+
+    gain_db = determine_gain_for_weak_audio(
+        peak_dbfs=peak_dbfs,
+        weak_threshold_dbfs=weak_threshold_dbfs,
+        target_peak_dbfs=target_peak_dbfs,
+        max_gain_db=max_gain_db,
+        noise_floor_dbfs=noise_floor_dbfs,
+        max_noise_floor_dbfs=parse_optional_float(
+            os.environ.get("KOTOTYPE_AUTO_GAIN_MAX_NOISE_FLOOR_DBFS")
+        ),
+    )
+    log(f"Auto gain analysis: {description}, gain={gain_db:.2f} dB")
+    return gain_db
 
 
 def build_vad_parameters(vad_threshold):
@@ -319,6 +813,48 @@ def build_vad_parameters(vad_threshold):
     }
 
 
+def resolve_auto_gain_settings(
+    auto_gain_enabled=None,
+    auto_gain_weak_threshold_dbfs=None,
+    auto_gain_target_peak_dbfs=None,
+    auto_gain_max_db=None,
+):
+    if auto_gain_enabled is None:
+        auto_gain_enabled = parse_bool(
+            os.environ.get("KOTOTYPE_AUTO_GAIN_ENABLED", "1"),
+            default=True,
+        )
+    if auto_gain_weak_threshold_dbfs is None:
+        auto_gain_weak_threshold_dbfs = parse_float(
+            os.environ.get("KOTOTYPE_AUTO_GAIN_WEAK_THRESHOLD_DBFS"),
+            default=-18.0,
+        )
+    if auto_gain_target_peak_dbfs is None:
+        auto_gain_target_peak_dbfs = parse_float(
+            os.environ.get("KOTOTYPE_AUTO_GAIN_TARGET_PEAK_DBFS"),
+            default=-10.0,
+        )
+    if auto_gain_max_db is None:
+        auto_gain_max_db = parse_float(
+            os.environ.get("KOTOTYPE_AUTO_GAIN_MAX_DB"),
+            default=18.0,
+        )
+
+    auto_gain_max_db = max(0.0, auto_gain_max_db)
+    if auto_gain_target_peak_dbfs <= auto_gain_weak_threshold_dbfs:
+        auto_gain_target_peak_dbfs = min(
+            -1.0,
+            auto_gain_weak_threshold_dbfs + 1.0,
+        )
+
+    return (
+        auto_gain_enabled,
+        auto_gain_weak_threshold_dbfs,
+        auto_gain_target_peak_dbfs,
+        auto_gain_max_db,
+    )
+
+
 def audio_preprocess(
     input_path,
     log,
@@ -328,18 +864,17 @@ def audio_preprocess(
     auto_gain_weak_threshold_dbfs=None,
     auto_gain_target_peak_dbfs=None,
     auto_gain_max_db=None,
+    filter_capabilities=None,
+    timings=None,
 ):
     if ffmpeg_module is None:
-        try:
-            import ffmpeg as imported_ffmpeg
-
-            ffmpeg_module = imported_ffmpeg
-        except ImportError:
-            log("ffmpeg-python not available, skipping preprocessing")
+        ffmpeg_module = load_ffmpeg_module()
+        if ffmpeg_module is None:
+            log("ffmpeg-python not available, skipping preprocessing", level="warning")
             return input_path
 
     if peak_analyzer is None:
-        peak_analyzer = analyze_wav_peak_dbfs
+        peak_analyzer = analyze_wav_levels
 
     try:
         base, _ = os.path.splitext(input_path)
@@ -349,38 +884,24 @@ def audio_preprocess(
             os.environ.get("KOTOTYPE_ENABLE_NOISE_REDUCTION", "1"),
             default=True,
         )
-        if auto_gain_enabled is None:
-            auto_gain_enabled = parse_bool(
-                os.environ.get("KOTOTYPE_AUTO_GAIN_ENABLED", "1"),
-                default=True,
-            )
-        if auto_gain_weak_threshold_dbfs is None:
-            auto_gain_weak_threshold_dbfs = parse_float(
-                os.environ.get("KOTOTYPE_AUTO_GAIN_WEAK_THRESHOLD_DBFS"),
-                default=-18.0,
-            )
-        if auto_gain_target_peak_dbfs is None:
-            auto_gain_target_peak_dbfs = parse_float(
-                os.environ.get("KOTOTYPE_AUTO_GAIN_TARGET_PEAK_DBFS"),
-                default=-10.0,
-            )
-        if auto_gain_max_db is None:
-            auto_gain_max_db = parse_float(
-                os.environ.get("KOTOTYPE_AUTO_GAIN_MAX_DB"),
-                default=18.0,
-            )
-
-        auto_gain_max_db = max(0.0, auto_gain_max_db)
-        if auto_gain_target_peak_dbfs <= auto_gain_weak_threshold_dbfs:
-            auto_gain_target_peak_dbfs = min(
-                -1.0,
-                auto_gain_weak_threshold_dbfs + 1.0,
-            )
+        (
+            auto_gain_enabled,
+            auto_gain_weak_threshold_dbfs,
+            auto_gain_target_peak_dbfs,
+            auto_gain_max_db,
+        ) = resolve_auto_gain_settings(
+            auto_gain_enabled=auto_gain_enabled,
+            auto_gain_weak_threshold_dbfs=auto_gain_weak_threshold_dbfs,
+            auto_gain_target_peak_dbfs=auto_gain_target_peak_dbfs,
+            auto_gain_max_db=auto_gain_max_db,
+        )
 
         log(f"Preprocessing audio: {input_path} -> {output_path}")
         filter_candidates = build_audio_filter_chain_candidates(
             enable_noise_reduction=enable_noise_reduction
         )
+        if filter_capabilities is not None:
+            filter_candidates = filter_capabilities.order_candidates(filter_candidates)
 
         for index, filter_chain in enumerate(filter_candidates):
             if index == 0:
@@ -388,26 +909,31 @@ def audio_preprocess(
             else:
                 log(f"Retry preprocess with fallback filter chain #{index}: {filter_chain}")
             try:
-                run_preprocess_with_filter(
-                    ffmpeg_module=ffmpeg_module,
-                    input_path=input_path,
-                    output_path=output_path,
-                    filter_chain=filter_chain,
-                )
+                stage_started = time.perf_counter()
+                try:
+                    run_preprocess_with_filter(
+                        ffmpeg_module=ffmpeg_module,
+                        input_path=input_path,
+                        output_path=output_path,
+                        filter_chain=filter_chain,
+                    )
+                finally:
+                    add_stage_timing(timings, f"ffmpeg_attempt_{index}", stage_started)
 
                 if auto_gain_enabled:
-                    peak_dbfs = peak_analyzer(output_path)
-                    gain_db = determine_gain_for_weak_audio(
-                        peak_dbfs=peak_dbfs,
+                    stage_started = time.perf_counter()
+                    gain_db = analyze_and_determine_gain(
+                        peak_analyzer=peak_analyzer,
+                        audio=output_path,
+                        log=log,
                         weak_threshold_dbfs=auto_gain_weak_threshold_dbfs,
                         target_peak_dbfs=auto_gain_target_peak_dbfs,
                         max_gain_db=auto_gain_max_db,
                     )
-                    log(
-                        f"Auto gain analysis: peak={peak_dbfs:.2f} dBFS, gain={gain_db:.2f} dB"
-                    )
+                    add_stage_timing(timings, "peak_analysis", stage_started)
 
                     if gain_db > 0.0:
+                        stage_started = time.perf_counter()
                         apply_gain_to_wav(
                             ffmpeg_module=ffmpeg_module,
                             input_path=output_path,
@@ -415,6 +941,7 @@ def audio_preprocess(
                             gain_db=gain_db,
                         )
                         os.replace(boosted_output_path, output_path)
+                        add_stage_timing(timings, "gain", stage_started)
                         log(
                             f"Applied automatic gain for weak input: +{gain_db:.2f} dB"
                         )
@@ -428,37 +955,161 @@ def audio_preprocess(
                     "Noise reduction preprocessing failed, trying next filter chain: "
                     f"{format_ffmpeg_error(error)}"
                 )
+                if filter_capabilities is not None:
+                    filter_capabilities.record_failure(ffmpeg_module, filter_chain, log)
 
-        log("All preprocessing filter chains failed, using original audio")
+        log("All preprocessing filter chains failed, using original audio", level="warning")
         return input_path
 
     except Exception as e:
-        log(f"Audio preprocessing failed: {str(e)}")
+        log(f"Audio preprocessing failed: {str(e)}", level="warning")
         return input_path
 
 
-def parse_bool(value, default=True):
-    if value is None:
-        return default
+def audio_preprocess_in_memory(
+    input_path,
+    log,
+    ffmpeg_module=None,
+    numpy_module=None,
+    peak_analyzer=None,
+    auto_gain_enabled=None,
+    auto_gain_weak_threshold_dbfs=None,
+    auto_gain_target_peak_dbfs=None,
+    auto_gain_max_db=None,
+    filter_capabilities=None,
+    timings=None,
+):
+    if numpy_module is None:
+        numpy_module = load_numpy_module()
+        if numpy_module is None:
+            log("numpy not available, falling back to file-based preprocessing", level="warning")
+            return audio_preprocess(
+                input_path,
+                log,
+                ffmpeg_module=ffmpeg_module,
+                auto_gain_enabled=auto_gain_enabled,
+                auto_gain_weak_threshold_dbfs=auto_gain_weak_threshold_dbfs,
+                auto_gain_target_peak_dbfs=auto_gain_target_peak_dbfs,
+                auto_gain_max_db=auto_gain_max_db,
+                filter_capabilities=filter_capabilities,
+                timings=timings,
+            )
 
-    normalized = str(value).strip().lower()
-    if normalized in {"1", "true", "yes", "on"}:
-        return True
-    if normalized in {"0", "false", "no", "off"}:
-        return False
-    return default
+    if ffmpeg_module is None:
+        ffmpeg_module = load_ffmpeg_module()
+        if ffmpeg_module is None:
+            log("ffmpeg-python not available, skipping preprocessing", level="warning")
+            return input_path
 
+    if peak_analyzer is None:
+        peak_analyzer = analyze_array_levels
 
-def parse_optional_bool(value):
-    if value is None:
-        return None
+    try:
+        enable_noise_reduction = parse_bool(
+            os.environ.get("KOTOTYPE_ENABLE_NOISE_REDUCTION", "1"),
+            default=True,
+        )
+        (
+            auto_gain_enabled,
+            auto_gain_weak_threshold_dbfs,
+            auto_gain_target_peak_dbfs,
+            auto_gain_max_db,
+        ) = resolve_auto_gain_settings(
+            auto_gain_enabled=auto_gain_enabled,
+            auto_gain_weak_threshold_dbfs=auto_gain_weak_threshold_dbfs,
+            auto_gain_target_peak_dbfs=auto_gain_target_peak_dbfs,
+            auto_gain_max_db=auto_gain_max_db,
+        )
 
-    normalized = str(value).strip().lower()
-    if normalized in {"1", "true", "yes", "on"}:
-        return True
-    if normalized in {"0", "false", "no", "off"}:
-        return False
-    return None
+        log(f"Preprocessing audio in memory: {input_path}")
+        filter_candidates = build_audio_filter_chain_candidates(
+            enable_noise_reduction=enable_noise_reduction
+        )
+        if filter_capabilities is not None:
+            filter_candidates = filter_capabilities.order_candidates(filter_candidates)
+
+        for index, filter_chain in enumerate(filter_candidates):
+            if index == 0:
+                log(f"Audio preprocess filter chain: {filter_chain}")
+            else:
+                log(f"Retry preprocess with fallback filter chain #{index}: {filter_chain}")
+            try:
+                stage_started = time.perf_counter()
+                try:
+                    audio = run_preprocess_to_array(
+                        ffmpeg_module=ffmpeg_module,
+                        numpy_module=numpy_module,
+                        input_path=input_path,
+                        filter_chain=filter_chain,
+                    )
+                finally:
+                    add_stage_timing(timings, f"ffmpeg_attempt_{index}", stage_started)
+
+                if auto_gain_enabled:
+                    stage_started = time.perf_counter()
+                    gain_db = analyze_and_determine_gain(
+                        peak_analyzer=peak_analyzer,
+                        audio=audio,
+                        log=log,
+                        weak_threshold_dbfs=auto_gain_weak_threshold_dbfs,
+                        target_peak_dbfs=auto_gain_target_peak_dbfs,
+                        max_gain_db=auto_gain_max_db,
+                    )
+                    add_stage_timing(timings, "peak_analysis", stage_started)
+
+                    if gain_db > 0.0:
+                        stage_started = time.perf_counter()
+                        audio = apply_gain_to_array(audio, gain_db)
+                        add_stage_timing(timings, "gain", stage_started)
+                        log(
+                            f"Applied automatic gain for weak input: +{gain_db:.2f} dB"
+                        )
+                    else:
+                        log("Auto gain skipped: input level is sufficient")
+
+                log(
+                    "Audio preprocessing completed: "
+                    f"{describe_audio_source(audio)}"
+                )
+                return audio
+            except Exception as error:
+                log(
+                    "Noise reduction preprocessing failed, trying next filter chain: "
+                    f"{format_ffmpeg_error(error)}"
+                )
+                if filter_capabilities is not None:
+                    filter_capabilities.record_failure(ffmpeg_module, filter_chain, log)
+
+        log("All preprocessing filter chains failed, using original audio", level="warning")
+        return input_path
+
+    except Exception as e:
+        log(f"Audio preprocessing failed: {str(e)}", level="warning")
+        return input_path
+
+
+def parse_bool(value, default=True):
+    if value is None:
+        return default
+
+    normalized = str(value).strip().lower()
+    if normalized in {"1", "true", "yes", "on"}:
+        return True
+    if normalized in {"0", "false", "no", "off"}:
+        return False
+    return default
+
+
+def parse_optional_bool(value):
+    if value is None:
+        return None
+
+    normalized = str(value).strip().lower()
+    if normalized in {"1", "true", "yes", "on"}:
+        return True
+    if normalized in {"0", "false", "no", "off"}:
+        return False
+    return None
 
 
 def parse_float(value, default):
@@ -488,6 +1139,42 @@ def should_retry_without_vad(error):
     )
 
 
+def build_fixed_clip_timestamps(duration, clip_seconds=30.0, offset=0.0):
+    if not duration or duration <= 0:
+        return None
+
+    clips = []
+    start = offset
+    stop = offset + duration
+    while start < stop:
+        end = min(stop, start + clip_seconds)
+        clips.append({"start": start, "end": end})
+        start = end
+    return clips
+
+
+def estimate_audio_duration_seconds(audio):
+    if not isinstance(audio, str):
+        return len(audio) / SAMPLE_RATE
+
+    if not audio.lower().endswith(".wav"):
+        return None
+
+    try:
+        with wave.open(audio, "rb") as wav_file:
+            return wav_file.getnframes() / float(wav_file.getframerate())
+    except Exception:
+        return None
+
+
+def should_use_batched_inference(requested, audio_duration, min_duration_seconds):
+    if requested is not None:
+        return requested
+    if min_duration_seconds <= 0 or audio_duration is None:
+        return False
+    return audio_duration >= min_duration_seconds
+
+
 def transcribe_once(model, transcribe_kwargs, vad_filter, vad_parameters=None):
     kwargs = {
         "language": transcribe_kwargs["language"],
@@ -503,6 +1190,25 @@ def transcribe_once(model, transcribe_kwargs, vad_filter, vad_parameters=None):
     }
     if vad_filter and vad_parameters is not None:
         kwargs["vad_parameters"] = vad_parameters
+    clip_regions = None if vad_filter else transcribe_kwargs.get("clip_regions")
+    if transcribe_kwargs.get("batch_size"):
+        kwargs["batch_size"] = transcribe_kwargs["batch_size"]
+        if clip_regions:
+            # The batched pipeline keeps only the first 30 s of a longer clip.
+            kwargs["clip_timestamps"] = [
+                clip
+                for start, end in clip_regions
+                for clip in build_fixed_clip_timestamps(end - start, offset=start) or []
+            ]
+        elif not vad_filter:
+            # The batched pipeline needs explicit clips when VAD is off.
+            kwargs["clip_timestamps"] = build_fixed_clip_timestamps(
+                transcribe_kwargs.get("audio_duration")
+            )
+    elif clip_regions:
+        kwargs["clip_timestamps"] = [
+            boundary for region in clip_regions for boundary in region
+        ]
 
     return model.transcribe(
         transcribe_kwargs["audio"],
@@ -510,12 +1216,84 @@ def transcribe_once(model, transcribe_kwargs, vad_filter, vad_parameters=None):
     )
 
 
+def load_vad_reuse_helpers():
+    try:
+        from faster_whisper.audio import decode_audio
+        from faster_whisper.vad import VadOptions, get_speech_timestamps
+    except ImportError:
+        return None
+    return decode_audio, get_speech_timestamps, VadOptions
+
+
+def find_vad_dropped_regions(
+    speech_timestamps,
+    total_samples,
+    min_region_seconds=0.3,
+    padding_seconds=0.2,
+):
+    # Complement of the VAD speech chunks, padded a little into the speech
+    # side so words cut at a chunk edge are not lost.
+    regions = []
+    cursor = 0
+    padding = int(padding_seconds * SAMPLE_RATE)
+    for chunk in speech_timestamps:
+        if chunk["start"] > cursor:
+            regions.append((cursor, chunk["start"]))
+        cursor = max(cursor, chunk["end"])
+    if cursor < total_samples:
+        regions.append((cursor, total_samples))
+
+    dropped = []
+    for start, end in regions:
+        if end - start < min_region_seconds * SAMPLE_RATE:
+            continue
+        start = max(0, start - padding)
+        end = min(total_samples, end + padding)
+        if dropped and start <= dropped[-1][1]:
+            dropped[-1] = (dropped[-1][0], end)
+        else:
+            dropped.append((start, end))
+    return [(start / SAMPLE_RATE, end / SAMPLE_RATE) for start, end in dropped]
+
+
+def plan_vad_fallback_retry(transcribe_kwargs, vad_parameters, vad_helpers):
+    # The first pass decoded the file and ran VAD inside faster-whisper
+    # without exposing either. Decode once more into memory (or reuse the
+    # in-memory buffer we already passed), recompute the cheap VAD, and hand
+    # the retry only the regions VAD discarded. Encoder features cannot be
+    # shared between transcribe() calls in faster-whisper.
+    decode_audio, get_speech_timestamps, vad_options_class = vad_helpers
+    audio = transcribe_kwargs["audio"]
+    if isinstance(audio, str):
+        audio = decode_audio(audio, sampling_rate=SAMPLE_RATE)
+    speech_timestamps = get_speech_timestamps(
+        audio,
+        vad_options_class(**(vad_parameters or {})),
+    )
+    return audio, find_vad_dropped_regions(speech_timestamps, len(audio))
+
+
+def collect_segments(segments_iter, info, on_segment=None):
+    # faster-whisper decodes lazily, so each segment reaches `on_segment` as
+    # soon as it is produced. Empty segments are not emitted; that keeps an
+    # empty VAD pass silent so the no-VAD retry cannot duplicate output.
+    segments = []
+    for segment in segments_iter:
+        segments.append(segment)
+        if on_segment is not None and getattr(segment, "text", "").strip():
+            on_segment(segment, info)
+    return segments
+
+
 def transcribe_with_vad_fallback(
     model,
     transcribe_kwargs,
     vad_parameters,
     log,
     fallback_on_empty_vad=True,
+    on_segment=None,
+    vad_helpers=None,
+    timings=None,
 ):
     def build_text(segments):
         return " ".join(getattr(segment, "text", "") for segment in segments).strip()
@@ -523,6 +1301,20 @@ def transcribe_with_vad_fallback(
     class DummyInfo:
         language = transcribe_kwargs["language"] or "ja"
 
+    streamed_until = []
+
+    def stream_first_pass(segment, segment_info):
+        streamed_until[:] = [getattr(segment, "end", 0.0)]
+        on_segment(segment, segment_info)
+
+    def stream_after_partial_pass(segment, segment_info):
+        # A pass that failed midway has already streamed a prefix of the
+        # clip; the retry decodes it again, so only later segments go out.
+        midpoint = (getattr(segment, "start", 0.0) + getattr(segment, "end", 0.0)) / 2.0
+        if not streamed_until or midpoint >= streamed_until[0]:
+            on_segment(segment, segment_info)
+
+    stage_started = time.perf_counter()
     try:
         segments_iter, info = transcribe_once(
             model=model,
@@ -530,23 +1322,37 @@ def transcribe_with_vad_fallback(
             vad_filter=True,
             vad_parameters=vad_parameters,
         )
-        segments = list(segments_iter)
+        segments = collect_segments(
+            segments_iter,
+            info,
+            None if on_segment is None else stream_first_pass,
+        )
+        add_stage_timing(timings, "transcribe_first", stage_started)
     except Exception as transcribe_error:
-        log(f"Transcription error: {str(transcribe_error)}")
-        log(f"Transcription error traceback: {traceback.format_exc()}")
+        add_stage_timing(timings, "transcribe_first", stage_started)
+        log(f"Transcription error: {str(transcribe_error)}", level="error")
+        log(f"Transcription error traceback: {traceback.format_exc()}", level="error")
 
         if should_retry_without_vad(transcribe_error):
-            log("Retrying transcription with vad_filter=False due to missing VAD asset")
+            log("Retrying transcription with vad_filter=False due to missing VAD asset", level="warning")
+            stage_started = time.perf_counter()
             try:
                 segments_iter, info = transcribe_once(
                     model=model,
                     transcribe_kwargs=transcribe_kwargs,
                     vad_filter=False,
                 )
-                return list(segments_iter), info
+                segments = collect_segments(
+                    segments_iter,
+                    info,
+                    None if on_segment is None else stream_after_partial_pass,
+                )
+                add_stage_timing(timings, "transcribe_fallback", stage_started)
+                return segments, info
             except Exception as fallback_error:
-                log(f"Fallback transcription error: {str(fallback_error)}")
-                log(f"Fallback transcription traceback: {traceback.format_exc()}")
+                add_stage_timing(timings, "transcribe_fallback", stage_started)
+                log(f"Fallback transcription error: {str(fallback_error)}", level="error")
+                log(f"Fallback transcription traceback: {traceback.format_exc()}", level="error")
 
         return [], DummyInfo()
 
@@ -558,13 +1364,42 @@ def transcribe_with_vad_fallback(
         "VAD-enabled transcription returned empty text, "
         "retrying once with vad_filter=False"
     )
+    retry_kwargs = transcribe_kwargs
+    vad_helpers = vad_helpers or load_vad_reuse_helpers()
+    if vad_helpers is not None:
+        try:
+            audio, dropped_regions = plan_vad_fallback_retry(
+                transcribe_kwargs,
+                vad_parameters,
+                vad_helpers,
+            )
+        except Exception as plan_error:
+            log(f"Could not reuse VAD pass, retrying on the full clip: {str(plan_error)}", level="warning")
+        else:
+            if not dropped_regions:
+                log("VAD kept the whole clip; skipping the vad_filter=False retry")
+                return segments, info
+            dropped_seconds = sum(end - start for start, end in dropped_regions)
+            log(
+                "Retrying only VAD-dropped regions "
+                f"(regions={len(dropped_regions)}, seconds={dropped_seconds:.2f}, "
+                f"clip_seconds={len(audio) / SAMPLE_RATE:.2f})"
+            )
+            retry_kwargs = dict(transcribe_kwargs, audio=audio, clip_regions=dropped_regions)
+
+    stage_started = time.perf_counter()
     try:
         fallback_segments_iter, fallback_info = transcribe_once(
             model=model,
-            transcribe_kwargs=transcribe_kwargs,
+            transcribe_kwargs=retry_kwargs,
             vad_filter=False,
         )
-        fallback_segments = list(fallback_segments_iter)
+        fallback_segments = collect_segments(
+            fallback_segments_iter,
+            fallback_info,
+            on_segment,
+        )
+        add_stage_timing(timings, "transcribe_fallback", stage_started)
         fallback_text = build_text(fallback_segments)
         if fallback_text:
             log(
@@ -574,12 +1409,181 @@ def transcribe_with_vad_fallback(
             return fallback_segments, fallback_info
         log("Fallback transcription with vad_filter=False also returned empty")
     except Exception as fallback_error:
-        log(f"Fallback transcription error: {str(fallback_error)}")
-        log(f"Fallback transcription traceback: {traceback.format_exc()}")
+        add_stage_timing(timings, "transcribe_fallback", stage_started)
+        log(f"Fallback transcription error: {str(fallback_error)}", level="error")
+        log(f"Fallback transcription traceback: {traceback.format_exc()}", level="error")
 
     return segments, info
 
 
+def should_use_chunked_transcription(requested, audio_duration, min_duration_seconds):
+    return should_use_batched_inference(requested, audio_duration, min_duration_seconds)
+
+
+def load_audio_array(audio, log):
+    if not isinstance(audio, str):
+        return audio
+    try:
+        from faster_whisper.audio import decode_audio
+
+        return decode_audio(audio, sampling_rate=SAMPLE_RATE)
+    except Exception as e:
+        log(f"Could not decode audio for chunking: {str(e)}", level="warning")
+        return None
+
+
+def plan_chunk_boundaries(audio, chunk_seconds=60.0, search_seconds=10.0, numpy_module=None):
+    # Cut near every `chunk_seconds`, at the quietest 20 ms block within
+    # +/- `search_seconds`, so chunk edges land in pauses rather than words.
+    np = numpy_module or load_numpy_module()
+    total = len(audio)
+    chunk = int(chunk_seconds * SAMPLE_RATE)
+    if total <= chunk * 1.5:
+        return [(0, total)]
+
+    block = int(SAMPLE_RATE * LEVEL_BLOCK_SECONDS)
+    usable = total - total % block
+    block_energy = np.square(np.asarray(audio[:usable], dtype=np.float32)).reshape(-1, block).mean(axis=1)
+    search_blocks = int(search_seconds * SAMPLE_RATE) // block
+
+    boundaries = []
+    start = 0
+    while total - start > chunk * 1.5:
+        target_block = (start + chunk) // block
+        low = max(start // block + 1, target_block - search_blocks)
+        high = min(len(block_energy), target_block + search_blocks + 1)
+        quietest = low + int(np.argmin(block_energy[low:high]))
+        cut = quietest * block + block // 2
+        boundaries.append((start, cut))
+        start = cut
+    boundaries.append((start, total))
+    return boundaries
+
+
+def trim_repeated_prefix(previous_text, text, min_chars=4):
+    previous_text = previous_text.strip()
+    stripped = text.strip()
+    for length in range(min(len(previous_text), len(stripped)), min_chars - 1, -1):
+        if previous_text.endswith(stripped[:length]):
+            return stripped[length:].strip()
+    return text
+
+
+def shift_segment(segment, offset_seconds, text=None):
+    return SimpleNamespace(
+        text=segment.text if text is None else text,
+        start=getattr(segment, "start", 0.0) + offset_seconds,
+        end=getattr(segment, "end", 0.0) + offset_seconds,
+        avg_logprob=getattr(segment, "avg_logprob", None),
+        no_speech_prob=getattr(segment, "no_speech_prob", None),
+    )
+
+
+def merge_chunk_segments(chunk_results, previous_segment=None):
+    # Chunks overlap slightly; a segment belongs to the chunk whose own range
+    # contains its midpoint, and text repeated across the seam is trimmed from
+    # the first segment a chunk keeps.
+    merged = []
+    for owned_start, owned_end, offset, segments in chunk_results:
+        at_seam = True
+        for segment in segments:
+            shifted = shift_segment(segment, offset)
+            midpoint = (shifted.start + shifted.end) / 2.0
+            if not owned_start <= midpoint < owned_end:
+                continue
+            seam_segment = merged[-1] if merged else previous_segment
+            if at_seam and seam_segment is not None:
+                shifted.text = trim_repeated_prefix(seam_segment.text, shifted.text)
+            at_seam = False
+            if shifted.text.strip():
+                merged.append(shifted)
+    return merged
+
+
+def transcribe_in_chunks(
+    model,
+    transcribe_kwargs,
+    vad_parameters,
+    log,
+    audio,
+    chunk_seconds,
+    max_workers,
+    fallback_on_empty_vad=True,
+    overlap_seconds=0.5,
+    on_segment=None,
+    on_progress=None,
+):
+    total_seconds = len(audio) / SAMPLE_RATE
+    boundaries = plan_chunk_boundaries(audio, chunk_seconds=chunk_seconds)
+    overlap = int(overlap_seconds * SAMPLE_RATE)
+    log(
+        f"Chunked transcription: chunks={len(boundaries)}, workers={max_workers}, "
+        f"duration={total_seconds:.1f}s"
+    )
+
+    def transcribe_chunk(index):
+        def chunk_log(message, level=None):
+            log(
+                f"[chunk {index + 1}/{len(boundaries)}] {message}",
+                level=level or infer_log_level(message),
+            )
+
+        start, end = boundaries[index]
+        slice_start = max(0, start - overlap)
+        slice_end = min(len(audio), end + overlap)
+        chunk_kwargs = dict(
+            transcribe_kwargs,
+            audio=audio[slice_start:slice_end],
+            audio_duration=(slice_end - slice_start) / SAMPLE_RATE,
+        )
+        segments, info = transcribe_with_vad_fallback(
+            model=model,
+            transcribe_kwargs=chunk_kwargs,
+            vad_parameters=vad_parameters,
+            log=chunk_log,
+            fallback_on_empty_vad=fallback_on_empty_vad,
+        )
+        chunk_result = (
+            start / SAMPLE_RATE,
+            end / SAMPLE_RATE,
+            slice_start / SAMPLE_RATE,
+            list(segments),
+        )
+        return chunk_result, info
+
+    results = [None] * len(boundaries)
+    infos = [None] * len(boundaries)
+    languages = []
+    merged = []
+    next_to_merge = 0
+    completed = 0
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="chunk") as executor:
+        futures = {executor.submit(transcribe_chunk, index): index for index in range(len(boundaries))}
+        for future in as_completed(futures):
+            index = futures[future]
+            results[index], info = future.result()
+            infos[index] = info
+            languages.append(info.language)
+            completed += 1
+            if on_progress is not None:
+                on_progress(completed, len(boundaries), total_seconds)
+
+            # Merge (and stream) strictly in order as the prefix completes.
+            while next_to_merge < len(results) and results[next_to_merge] is not None:
+                new_segments = merge_chunk_segments(
+                    [results[next_to_merge]],
+                    previous_segment=merged[-1] if merged else None,
+                )
+                merged.extend(new_segments)
+                if on_segment is not None:
+                    for segment in new_segments:
+                        on_segment(segment, infos[next_to_merge])
+                next_to_merge += 1
+
+    language = max(set(languages), key=languages.count) if languages else None
+    return merged, SimpleNamespace(language=transcribe_kwargs["language"] or language or "ja")
+
+
 def post_process_text(text, language="ja", auto_punctuation=True):
     if not text:
         return text
@@ -662,8 +1666,6 @@ def load_user_dictionary(path=None, log=None):
         if not os.path.exists(dict_path):
             return []
 
-        import json
-
         with open(dict_path, "r", encoding="utf-8") as f:
             data = json.load(f)
 
@@ -680,11 +1682,17 @@ def load_user_dictionary(path=None, log=None):
         return words
     except Exception as error:
         if log:
-            log(f"Failed to load user dictionary: {error}")
+            log(f"Failed to load user dictionary: {error}", level="warning")
         return []
 
 
-def generate_initial_prompt(language, use_context=True, user_words=None, screenshot_context=None):
+def generate_initial_prompt(
+    language,
+    use_context=True,
+    user_words=None,
+    screenshot_context=None,
+    words_normalized=False,
+):
     base_prompts = {
         "ja": "これは会話の文字起こしです。正確な日本語で出力してください。",
         "en": "This is a speech transcription. Please output accurate English.",
@@ -694,7 +1702,9 @@ def generate_initial_prompt(language, use_context=True, user_words=None, screens
 
     if use_context:
         words_for_prompt = user_words if user_words is not None else load_user_dictionary()
-        normalized_words = normalize_user_words(words_for_prompt)
+        normalized_words = (
+            words_for_prompt if words_normalized else normalize_user_words(words_for_prompt)
+        )
         if normalized_words:
             if language == "ja":
                 word_list = "、".join(normalized_words[:20])
@@ -715,251 +1725,2865 @@ def generate_initial_prompt(language, use_context=True, user_words=None, screens
     return prompt if prompt else None
 
 
-def main():
-    log_file, log = setup_logging()
-    log("=== Server started ===")
-
-    state_path = default_server_state_path()
-    lock_path = default_server_state_lock_path()
-    current_pid = os.getpid()
-    max_active_servers = max(1, parse_int(os.environ.get("KOTOTYPE_MAX_ACTIVE_SERVERS"), 1))
-    max_parallel_model_loads = max(1, parse_int(os.environ.get("KOTOTYPE_MAX_PARALLEL_MODEL_LOADS"), 1))
-    model_load_wait_timeout = max(1, parse_int(os.environ.get("KOTOTYPE_MODEL_LOAD_WAIT_TIMEOUT_SECONDS"), 120))
+def hash_text(text):
+    if not text:
+        return None
+    return hashlib.blake2b(str(text).encode("utf-8"), digest_size=16).hexdigest()
+
+
+class UserDictionaryCache:
+    max_cached_prompts = 64
+
+    def __init__(self, path=None):
+        self.path = path or default_dictionary_path()
+        self.signature = None
+        self.words = []
+        self.version = 0
+        self.prompts = OrderedDict()
+        self.dictionary_hits = 0
+        self.dictionary_misses = 0
+        self.prompt_hits = 0
+        self.prompt_misses = 0
+        self.content_hash_version = None
+        self.words_hash = None
+        self.lock = threading.RLock()
+
+    def file_signature(self):
+        try:
+            stat_result = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat_result.st_mtime_ns, stat_result.st_size, stat_result.st_ino)
+
+    def get_words(self, log=None):
+        with self.lock:
+            signature = self.file_signature()
+            if self.version and signature == self.signature:
+                self.dictionary_hits += 1
+                return self.words
+
+            self.dictionary_misses += 1
+            self.words = load_user_dictionary(path=self.path, log=log)
+            self.signature = signature
+            self.version += 1
+            self.prompts.clear()
+            return self.words
+
+    def get_initial_prompt(self, language, screenshot_context=None, log=None):
+        with self.lock:
+            words = self.get_words(log=log)
+            key = (language, self.version, hash_text(screenshot_context))
+            if key in self.prompts:
+                self.prompt_hits += 1
+                self.prompts.move_to_end(key)
+                return self.prompts[key]
+
+            self.prompt_misses += 1
+            prompt = generate_initial_prompt(
+                language,
+                use_context=True,
+                user_words=words,
+                screenshot_context=screenshot_context,
+                words_normalized=True,
+            )
+            self.prompts[key] = prompt
+            while len(self.prompts) > self.max_cached_prompts:
+                self.prompts.popitem(last=False)
+            return prompt
+
+    def content_hash(self, log=None):
+        # Version numbers restart with every process; the content hash is
+        # stable across restarts, which the on-disk result cache relies on.
+        with self.lock:
+            words = self.get_words(log=log)
+            if self.content_hash_version != self.version:
+                self.words_hash = hash_text("\n".join(words)) or "empty"
+                self.content_hash_version = self.version
+            return self.words_hash
+
+    def stats(self):
+        with self.lock:
+            return {
+                "version": self.version,
+                "dictionary_hits": self.dictionary_hits,
+                "dictionary_misses": self.dictionary_misses,
+                "prompt_hits": self.prompt_hits,
+                "prompt_misses": self.prompt_misses,
+            }
 
-    registered, active_count = register_server_pid(
-        state_path=state_path,
-        lock_path=lock_path,
-        pid=current_pid,
-        max_active_servers=max_active_servers,
-    )
-    if not registered:
-        log(
-            "Server startup skipped: active server limit reached "
-            f"(max={max_active_servers}, current={active_count})"
-        )
-        return
 
-    def cleanup_server_state():
-        release_model_load_slot(state_path=state_path, lock_path=lock_path, pid=current_pid)
-        unregister_server_pid(state_path=state_path, lock_path=lock_path, pid=current_pid)
+PROTOCOL_VERSION = 1
+SKIPPED_LEGACY_RESPONSE_ERRORS = {"empty_audio_path"}
 
-    atexit.register(cleanup_server_state)
 
-    for signal_name in ("SIGTERM", "SIGINT"):
-        if hasattr(signal, signal_name):
-            sig = getattr(signal, signal_name)
+def default_request(protocol="legacy", request_id=None):
+    return {
+        "protocol": protocol,
+        "id": request_id,
+        "type": "transcribe",
+        "audio_path": "",
+        "language": "auto",
+        "temperature": 0.0,
+        "beam_size": 5,
+        "no_speech_threshold": 0.6,
+        "compression_ratio_threshold": 2.4,
+        "task": "transcribe",
+        "best_of": 5,
+        "vad_threshold": 0.5,
+        "auto_punctuation": True,
+        "auto_gain_enabled": None,
+        "auto_gain_weak_threshold_dbfs": None,
+        "auto_gain_target_peak_dbfs": None,
+        "auto_gain_max_db": None,
+        "screenshot_context": None,
+        "batched": None,
+        "stream": False,
+        "chunked": None,
+        "pcm": None,
+    }
 
-            def _handler(signum, frame):
-                cleanup_server_state()
-                raise SystemExit(0)
 
-            signal.signal(sig, _handler)
+def decode_screenshot_context(screenshot_context_base64, log):
+    if not screenshot_context_base64:
+        return None
 
-    wait_started = time.time()
-    while True:
-        acquired, loading_count = try_acquire_model_load_slot(
-            state_path=state_path,
-            lock_path=lock_path,
-            pid=current_pid,
-            max_parallel_model_loads=max_parallel_model_loads,
-        )
-        if acquired:
-            if loading_count > 1:
-                log(
-                    "Model load slot acquired after waiting "
-                    f"(parallel_loads={loading_count}, max={max_parallel_model_loads})"
-                )
-            break
+    try:
+        return base64.b64decode(screenshot_context_base64).decode("utf-8")
+    except Exception as decode_error:
+        log(f"Failed to decode screenshot context: {decode_error}", level="warning")
+        return None
 
-        elapsed = time.time() - wait_started
-        if elapsed >= model_load_wait_timeout:
-            log(
-                "Server startup aborted: timed out waiting for model-load slot "
-                f"(timeout={model_load_wait_timeout}s, max_parallel={max_parallel_model_loads})"
-            )
-            cleanup_server_state()
-            return
 
-        time.sleep(0.25)
+def parse_legacy_request(line, log):
+    parts = line.strip().split("|", 14)
+    request = default_request()
+    request["audio_path"] = parts[0]
+    if len(parts) > 1:
+        request["language"] = parts[1]
+    if len(parts) > 2:
+        request["temperature"] = float(parts[2])
+    if len(parts) > 3:
+        request["beam_size"] = int(parts[3])
+    if len(parts) > 4:
+        request["no_speech_threshold"] = float(parts[4])
+    if len(parts) > 5:
+        request["compression_ratio_threshold"] = float(parts[5])
+    if len(parts) > 6:
+        request["task"] = parts[6]
+    if len(parts) > 7:
+        request["best_of"] = int(parts[7])
+    if len(parts) > 8:
+        request["vad_threshold"] = float(parts[8])
+    if len(parts) > 9:
+        request["auto_punctuation"] = parse_bool(parts[9], default=True)
+    if len(parts) > 10:
+        request["auto_gain_enabled"] = parse_optional_bool(parts[10])
+    if len(parts) > 11:
+        request["auto_gain_weak_threshold_dbfs"] = parse_optional_float(parts[11])
+    if len(parts) > 12:
+        request["auto_gain_target_peak_dbfs"] = parse_optional_float(parts[12])
+    if len(parts) > 13:
+        request["auto_gain_max_db"] = parse_optional_float(parts[13])
+    if len(parts) > 14:
+        request["screenshot_context"] = decode_screenshot_context(parts[14], log)
+    return request
+
+
+def parse_json_request(line, log):
+    data = json.loads(line)
+    if not isinstance(data, dict):
+        raise ValueError("JSON request must be an object")
+
+    request = default_request(protocol="json", request_id=data.get("id"))
+    version = data.get("v", PROTOCOL_VERSION)
+    if version != PROTOCOL_VERSION:
+        raise ValueError(f"Unsupported protocol version: {version}")
+
+    request["type"] = str(data.get("type", "transcribe"))
+    request["audio_path"] = str(data.get("audio", data.get("audio_path", "")) or "")
+    request["language"] = str(data.get("language", request["language"]) or "auto")
+    request["task"] = str(data.get("task", request["task"]))
+    for key in (
+        "temperature",
+        "no_speech_threshold",
+        "compression_ratio_threshold",
+        "vad_threshold",
+    ):
+        if data.get(key) is not None:
+            request[key] = float(data[key])
+    for key in ("beam_size", "best_of"):
+        if data.get(key) is not None:
+            request[key] = int(data[key])
+    if "auto_punctuation" in data:
+        request["auto_punctuation"] = parse_bool(data["auto_punctuation"], default=True)
+    request["auto_gain_enabled"] = parse_optional_bool(data.get("auto_gain_enabled"))
+    for key in (
+        "auto_gain_weak_threshold_dbfs",
+        "auto_gain_target_peak_dbfs",
+        "auto_gain_max_db",
+    ):
+        request[key] = parse_optional_float(data.get(key))
 
-    log("Loading Whisper model...")
+    request["batched"] = parse_optional_bool(data.get("batched"))
+    request["chunked"] = parse_optional_bool(data.get("chunked"))
+    request["stream"] = parse_bool(data.get("stream"), default=False)
+    if data.get("pcm") is not None:
+        request["pcm"] = str(data["pcm"])
 
-    # faster-whisperのみを使用
-    from faster_whisper import WhisperModel
+    if data.get("screenshot_context") is not None:
+        request["screenshot_context"] = str(data["screenshot_context"])
+    else:
+        request["screenshot_context"] = decode_screenshot_context(
+            data.get("screenshot_context_base64"),
+            log,
+        )
+    return request
 
-    model = WhisperModel(
-        "large-v3-turbo",
-        device="cpu",
-        compute_type="int8",
-    )
-    release_model_load_slot(state_path=state_path, lock_path=lock_path, pid=current_pid)
 
-    log("Model loaded (device=cpu, compute_type=int8)")
-    log("Using faster-whisper backend")
+def is_json_request_line(line):
+    return line.lstrip().startswith("{")
 
-    log("Waiting for input from stdin...")
-    sys.stdout.flush()
 
-    while True:
-        try:
-            line = sys.stdin.readline()
-            if not line:
-                log("EOF reached, exiting")
-                break
+def parse_request_line(line, log):
+    if is_json_request_line(line):
+        return parse_json_request(line, log)
+    return parse_legacy_request(line, log)
 
-            parts = line.strip().split("|", 14)
-            audio_path = parts[0]
-            language = parts[1] if len(parts) > 1 else "auto"
-            temperature = float(parts[2]) if len(parts) > 2 else 0.0
-            beam_size = int(parts[3]) if len(parts) > 3 else 5
-            no_speech_threshold = float(parts[4]) if len(parts) > 4 else 0.6
-            compression_ratio_threshold = float(parts[5]) if len(parts) > 5 else 2.4
-            task = parts[6] if len(parts) > 6 else "transcribe"
-            best_of = int(parts[7]) if len(parts) > 7 else 5
-            vad_threshold = float(parts[8]) if len(parts) > 8 else 0.5
-            auto_punctuation = parse_bool(parts[9], default=True) if len(parts) > 9 else True
-            auto_gain_enabled = (
-                parse_optional_bool(parts[10]) if len(parts) > 10 else None
-            )
-            auto_gain_weak_threshold_dbfs = (
-                parse_optional_float(parts[11]) if len(parts) > 11 else None
-            )
-            auto_gain_target_peak_dbfs = (
-                parse_optional_float(parts[12]) if len(parts) > 12 else None
-            )
-            auto_gain_max_db = (
-                parse_optional_float(parts[13]) if len(parts) > 13 else None
-            )
-            screenshot_context_base64 = parts[14] if len(parts) > 14 else ""
-            screenshot_context = None
-            if screenshot_context_base64:
-                try:
-                    screenshot_context = base64.b64decode(screenshot_context_base64).decode("utf-8")
-                except Exception as decode_error:
-                    log(f"Failed to decode screenshot context: {decode_error}")
 
-            actual_language = None if language == "auto" else language
-            log(
-                f"Received: audio={audio_path}, language={language}, actual_language={actual_language}, temp={temperature}, beam={beam_size}, "
-                f"no_speech_threshold={no_speech_threshold}, compression_ratio_threshold={compression_ratio_threshold}, "
-                f"task={task}, best_of={best_of}, vad_threshold={vad_threshold}, auto_punctuation={auto_punctuation}, "
-                f"auto_gain_enabled={auto_gain_enabled}, auto_gain_weak_threshold_dbfs={auto_gain_weak_threshold_dbfs}, "
-                f"auto_gain_target_peak_dbfs={auto_gain_target_peak_dbfs}, auto_gain_max_db={auto_gain_max_db}, "
-                f"screenshot_context_len={len(screenshot_context) if screenshot_context else 0}"
-            )
+def peek_request_id(line):
+    if not is_json_request_line(line):
+        return None
 
-            if not audio_path:
-                log("Empty audio path, skipping")
-                continue
+    try:
+        data = json.loads(line)
+    except Exception:
+        return None
+    return data.get("id") if isinstance(data, dict) else None
 
-            if not os.path.exists(audio_path):
-                log(f"Error: File not found: {audio_path}")
-                print("", file=sys.stdout)
-                sys.stdout.flush()
-                continue
 
-            log(f"File exists, size: {os.path.getsize(audio_path)} bytes")
+def serialize_segment(segment):
+    return {
+        "start": getattr(segment, "start", None),
+        "end": getattr(segment, "end", None),
+        "text": getattr(segment, "text", ""),
+        "avg_logprob": getattr(segment, "avg_logprob", None),
+        "no_speech_prob": getattr(segment, "no_speech_prob", None),
+    }
 
-            processed_audio_path = audio_preprocess(
-                audio_path,
-                log,
-                auto_gain_enabled=auto_gain_enabled,
-                auto_gain_weak_threshold_dbfs=auto_gain_weak_threshold_dbfs,
-                auto_gain_target_peak_dbfs=auto_gain_target_peak_dbfs,
-                auto_gain_max_db=auto_gain_max_db,
-            )
 
-            try:
-                if (
-                    os.path.exists(processed_audio_path)
-                    and processed_audio_path != audio_path
-                ):
-                    log(
-                        f"Processed file size: {os.path.getsize(processed_audio_path)} bytes"
-                    )
-                transcription_audio_path = processed_audio_path
-            except Exception as e:
-                log(f"Error checking processed file: {str(e)}, using original")
-                transcription_audio_path = audio_path
+def error_result(error_code, message):
+    return {
+        "text": "",
+        "language": None,
+        "segments": [],
+        "timings": {},
+        "error": {"code": error_code, "message": message},
+    }
 
-            user_words = load_user_dictionary(log=log)
-            initial_prompt = generate_initial_prompt(
-                actual_language or language or "ja",
-                use_context=True,
-                user_words=user_words,
-                screenshot_context=screenshot_context,
-            )
 
-            start_time = time.time()
-            vad_parameters = build_vad_parameters(vad_threshold)
+def format_response(request, result):
+    if request is None or request["protocol"] == "legacy":
+        return result["text"]
 
-            log("Starting transcription with Whisper...")
-            log(
-                f"Transcription parameters: audio={transcription_audio_path}, language={actual_language}, task={task}, temperature={temperature}, beam_size={beam_size}, best_of={best_of}, vad_parameters={vad_parameters}, auto_punctuation={auto_punctuation}, initial_prompt={initial_prompt[:50] if initial_prompt else None}..."
-            )
+    response = {
+        "v": PROTOCOL_VERSION,
+        "id": request["id"],
+        "type": result.get("type") or ("done" if request.get("stream") else "result"),
+        "text": result["text"],
+        "language": result["language"],
+        "segments": result["segments"],
+        "timings": result["timings"],
+    }
+    for key in ("committed", "pending", "skipped", "cached", "metrics"):
+        if key in result:
+            response[key] = result[key]
+    if result.get("error"):
+        response["type"] = "error"
+        response["error"] = result["error"]
+    return json.dumps(response, ensure_ascii=False)
+
+
+def format_segment_event(request, index, text, segment):
+    return json.dumps(
+        {
+            "v": PROTOCOL_VERSION,
+            "id": request["id"],
+            "type": "segment",
+            "index": index,
+            "text": text,
+            "start": getattr(segment, "start", None),
+            "end": getattr(segment, "end", None),
+        },
+        ensure_ascii=False,
+    )
 
-            transcribe_kwargs = {
-                "audio": transcription_audio_path,
-                "language": actual_language,
-                "task": task,
-                "temperature": temperature,
-                "beam_size": beam_size,
-                "best_of": best_of,
-                "word_timestamps": False,
-                "initial_prompt": initial_prompt,
-                "no_speech_threshold": no_speech_threshold,
-                "compression_ratio_threshold": compression_ratio_threshold,
-            }
 
-            segments, info = transcribe_with_vad_fallback(
-                model=model,
-                transcribe_kwargs=transcribe_kwargs,
-                vad_parameters=vad_parameters,
-                log=log,
-                fallback_on_empty_vad=parse_bool(
-                    os.environ.get("KOTOTYPE_RETRY_WITHOUT_VAD_ON_EMPTY", "1"),
-                    default=True,
-                ),
-            )
+def format_progress_event(request, completed, total, audio_seconds):
+    return json.dumps(
+        {
+            "v": PROTOCOL_VERSION,
+            "id": request["id"],
+            "type": "progress",
+            "completed_chunks": completed,
+            "total_chunks": total,
+            "audio_seconds": round(audio_seconds, 3),
+        },
+        ensure_ascii=False,
+    )
 
-            detected_language = (
-                info.language if actual_language is None else actual_language
-            )
-            elapsed_time = time.time() - start_time
-            log(
-                f"Transcription completed in {elapsed_time:.2f} seconds (detected language: {detected_language})"
-            )
 
-            transcription = " ".join([segment.text for segment in segments]).strip()
-            log(f"Transcription result (raw): '{transcription}'")
-            log(f"Transcription length: {len(transcription)} characters")
+def write_response_line(line):
+    print(line, file=sys.stdout)
+    sys.stdout.flush()
 
-            transcription = post_process_text(
-                transcription,
-                detected_language,
-                auto_punctuation=auto_punctuation,
-            )
-            log(f"Transcription result (post-processed): '{transcription}'")
 
-            print(transcription, file=sys.stdout)
-            sys.stdout.flush()
-            log("Output flushed")
+class ModelHolder:
+    # Owns the loaded model so it can be dropped after a quiet period and
+    # brought back on the next request. A reload takes a model-load slot like
+    # startup does, so an idle fleet waking up together does not load all at
+    # once.
+    def __init__(
+        self,
+        model=None,
+        loader=None,
+        log=None,
+        idle_unload_seconds=0.0,
+        load_slots=None,
+        load_timeout=120,
+        emit_event=None,
+    ):
+        self.model = model
+        self.loader = loader
+        self.log = log or (lambda message, level=None: None)
+        self.idle_unload_seconds = max(0.0, idle_unload_seconds)
+        self.load_slots = load_slots
+        self.load_timeout = load_timeout
+        self.emit_event = emit_event
+        self.lock = threading.Condition()
+        self.in_use = 0
+        self.loading = False
+        self.last_used = time.monotonic()
+        self.unload_callbacks = []
+        self.load_count = 0
+        self.unload_count = 0
+
+    def report(self, state, **details):
+        if self.emit_event is not None:
+            self.emit_event(format_model_state_event(state, **details))
+
+    def acquire(self):
+        with self.lock:
+            while self.loading:
+                self.lock.wait()
+            self.in_use += 1
+            if self.model is not None:
+                return self.model
+            self.loading = True
 
-            if transcription_audio_path != audio_path and os.path.exists(
-                transcription_audio_path
-            ):
-                try:
-                    os.remove(transcription_audio_path)
-                    log(f"Cleaned up temporary file: {transcription_audio_path}")
-                except Exception as e:
-                    log(f"Error removing temporary file: {str(e)}")
+        try:
+            model = self.load()
+        except Exception:
+            with self.lock:
+                self.loading = False
+                self.in_use -= 1
+                self.lock.notify_all()
+            raise
+
+        with self.lock:
+            self.model = model
+            self.loading = False
+            self.lock.notify_all()
+            return model
+
+    def release(self):
+        with self.lock:
+            self.in_use = max(0, self.in_use - 1)
+            self.last_used = time.monotonic()
+
+    def load(self):
+        if self.loader is None:
+            raise RuntimeError("Model was unloaded and no loader is configured")
+
+        self.report("loading")
+        started = time.perf_counter()
+        if self.load_slots is not None and self.load_slots.acquire(timeout=self.load_timeout) is None:
+            raise RuntimeError(f"Timed out waiting for model-load slot ({self.load_timeout}s)")
+        try:
+            model = self.loader()
+        finally:
+            if self.load_slots is not None:
+                self.load_slots.release()
+        load_seconds = time.perf_counter() - started
+        self.load_count += 1
+        self.log(f"Model reloaded in {load_seconds:.2f} seconds")
+        self.report("loaded", load_seconds=round(load_seconds, 3))
+        return model
+
+    def unload_if_idle(self, now=None):
+        if self.idle_unload_seconds <= 0 or self.loader is None:
+            return False
+
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            if self.model is None or self.in_use or self.loading:
+                return False
+            idle_seconds = now - self.last_used
+            if idle_seconds < self.idle_unload_seconds:
+                return False
+            self.model = None
+            for callback in self.unload_callbacks:
+                callback()
+
+        # The runtime caches (batched pipeline) were dropped above, so this is
+        # the last reference and the CTranslate2 buffers are freed here.
+        gc.collect()
+        self.unload_count += 1
+        self.log(f"Model unloaded after {idle_seconds:.0f} seconds idle")
+        self.report("unloaded", idle_seconds=round(idle_seconds, 1))
+        return True
 
+    def run_idle_monitor(self, stop_event, poll_interval=None):
+        if poll_interval is None:
+            poll_interval = min(30.0, max(1.0, self.idle_unload_seconds / 4))
+        while not stop_event.wait(poll_interval):
+            try:
+                self.unload_if_idle()
+            except Exception as e:
+                self.log(f"Idle unload failed: {str(e)}", level="warning")
+
+    def start_idle_monitor(self, stop_event=None):
+        if self.idle_unload_seconds <= 0 or self.loader is None:
+            return None
+        thread = threading.Thread(
+            target=self.run_idle_monitor,
+            args=(stop_event or threading.Event(),),
+            name="model-idle-monitor",
+            daemon=True,
+        )
+        thread.start()
+        return thread
+
+
+class ServerRuntime:
+    def __init__(
+        self,
+        model,
+        log,
+        preprocess_in_memory=True,
+        filter_capabilities=None,
+        dictionary_cache=None,
+        fallback_on_empty_vad=True,
+        ffmpeg_module=None,
+        max_concurrent_requests=1,
+        batched_min_duration_seconds=0.0,
+        batch_size=8,
+        batched_pipeline_factory=None,
+        live_settings=None,
+        silence_gate=None,
+        result_cache=None,
+        result_cache_context="",
+        chunked_min_duration_seconds=0.0,
+        chunk_seconds=60.0,
+        chunk_workers=2,
+        metrics=None,
+        trace=None,
+        model_holder=None,
+    ):
+        self.model_holder = model_holder or ModelHolder(model=model, log=log)
+        self.model_holder.unload_callbacks.append(self.drop_batched_pipeline)
+        self.log = log
+        self.ffmpeg_module = ffmpeg_module
+        self.max_concurrent_requests = max(1, max_concurrent_requests)
+        self.batched_min_duration_seconds = batched_min_duration_seconds
+        self.batch_size = max(1, batch_size)
+        self.batched_pipeline_factory = batched_pipeline_factory
+        self.batched_pipeline = None
+        self.batched_pipeline_lock = threading.Lock()
+        self.request_counter = itertools.count(1)
+        self.preprocess_in_memory = preprocess_in_memory
+        self.filter_capabilities = filter_capabilities
+        self.dictionary_cache = dictionary_cache or UserDictionaryCache()
+        self.fallback_on_empty_vad = fallback_on_empty_vad
+        self.live_settings = dict(DEFAULT_LIVE_SETTINGS, **(live_settings or {}))
+        self.live_sessions = {}
+        self.live_sessions_lock = threading.Lock()
+        self.silence_gate = dict(DEFAULT_SILENCE_GATE_SETTINGS, **(silence_gate or {}))
+        self.result_cache = result_cache
+        self.chunked_min_duration_seconds = chunked_min_duration_seconds
+        self.chunk_seconds = max(10.0, chunk_seconds)
+        self.chunk_workers = max(1, chunk_workers)
+        self.result_cache_context = result_cache_context
+        self.metrics = metrics
+        self.trace = trace
+        self.counters = {}
+        self.counters_lock = threading.Lock()
+
+    def next_request_number(self):
+        return next(self.request_counter)
+
+    def count(self, name, amount=1):
+        with self.counters_lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def counter_snapshot(self):
+        with self.counters_lock:
+            return dict(self.counters)
+
+    def record_metrics(self, request, write_seconds=None):
+        if self.metrics is None or request is None:
+            return
+        result = request.pop("completed_result", None)
+        if result is None:
+            return
+        try:
+            self.metrics.record(request, result, write_seconds=write_seconds)
         except Exception as e:
-            log(f"Error: {str(e)}")
-            log(f"Traceback: {traceback.format_exc()}")
-            print("", file=sys.stdout)
-            sys.stdout.flush()
+            self.log(f"Metrics record failed: {str(e)}", level="warning")
+
+    @property
+    def model(self):
+        return self.model_holder.model
+
+    def get_batched_pipeline(self, model=None):
+        with self.batched_pipeline_lock:
+            if self.batched_pipeline is None:
+                factory = self.batched_pipeline_factory
+                if factory is None:
+                    from faster_whisper import BatchedInferencePipeline
+
+                    factory = BatchedInferencePipeline
+                self.batched_pipeline = factory(model=model or self.model)
+            return self.batched_pipeline
+
+    def drop_batched_pipeline(self):
+        with self.batched_pipeline_lock:
+            self.batched_pipeline = None
+
+    def expire_live_sessions(self, now=None):
+        idle_seconds = self.live_settings["session_idle_seconds"]
+        if idle_seconds <= 0:
+            return []
+        now = time.monotonic() if now is None else now
+        with self.live_sessions_lock:
+            expired = [
+                key
+                for key, session in self.live_sessions.items()
+                if now - session.last_active > idle_seconds
+            ]
+            for key in expired:
+                del self.live_sessions[key]
+        for _, session_id in expired:
+            self.log(f"Live stream expired after {idle_seconds:g}s idle: id={session_id}")
+        return expired
+
+    def drop_live_sessions(self, client):
+        with self.live_sessions_lock:
+            dropped = [key for key in self.live_sessions if key[0] == client]
+            for key in dropped:
+                del self.live_sessions[key]
+        return dropped
+
+    def request_log(self, request):
+        if self.max_concurrent_requests <= 1:
+            return self.log
+
+        tag = request["id"] if request["id"] is not None else request.get("number")
+
+        def log(message, level=None):
+            self.log(f"[req={tag}] {message}", level=level or infer_log_level(message))
+
+        return log
+
+
+RESULT_CACHE_REQUEST_KEYS = (
+    "language",
+    "temperature",
+    "beam_size",
+    "no_speech_threshold",
+    "compression_ratio_threshold",
+    "task",
+    "best_of",
+    "vad_threshold",
+    "auto_punctuation",
+    "auto_gain_enabled",
+    "auto_gain_weak_threshold_dbfs",
+    "auto_gain_target_peak_dbfs",
+    "auto_gain_max_db",
+    "batched",
+    "chunked",
+)
+RESULT_CACHE_ENV_KEYS = (
+    "KOTOTYPE_ENABLE_NOISE_REDUCTION",
+    "KOTOTYPE_VAD_STRICT",
+    "KOTOTYPE_AUTO_GAIN_ENABLED",
+    "KOTOTYPE_AUTO_GAIN_WEAK_THRESHOLD_DBFS",
+    "KOTOTYPE_AUTO_GAIN_TARGET_PEAK_DBFS",
+    "KOTOTYPE_AUTO_GAIN_MAX_DB",
+    "KOTOTYPE_AUTO_GAIN_MAX_NOISE_FLOOR_DBFS",
+    "KOTOTYPE_RETRY_WITHOUT_VAD_ON_EMPTY",
+    "KOTOTYPE_BATCHED_MIN_DURATION_SECONDS",
+    "KOTOTYPE_BATCH_SIZE",
+    "KOTOTYPE_PREPROCESS_IN_MEMORY",
+    "KOTOTYPE_CHUNKED_MIN_DURATION_SECONDS",
+    "KOTOTYPE_CHUNK_SECONDS",
+)
+
+
+def default_result_cache_dir():
+    return os.path.expanduser("~/Library/Application Support/koto-type/result_cache")
+
+
+def build_result_cache_context(model_settings, environ=None):
+    environ = os.environ if environ is None else environ
+    context = {
+        "model": model_settings["model"],
+        "device": model_settings["device"],
+        "compute_type": model_settings["compute_type"],
+        "env": {key: environ.get(key) for key in RESULT_CACHE_ENV_KEYS},
+    }
+    return json.dumps(context, sort_keys=True)
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def build_result_cache_key(audio_hash, request, dictionary_hash, context):
+    parameters = {key: request[key] for key in RESULT_CACHE_REQUEST_KEYS}
+    parameters["screenshot_context"] = hash_text(request["screenshot_context"])
+    material = json.dumps(
+        [audio_hash, parameters, dictionary_hash, context],
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    # One JSON file per key. A hit refreshes the file's mtime, so eviction by
+    # oldest mtime is LRU across processes without a shared index.
+    def __init__(self, directory, max_entries=2000, max_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max(1, max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def entry_path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        path = self.entry_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                result = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            with self.lock:
+                self.misses += 1
+            return None
+
+        with self.lock:
+            self.hits += 1
+        return result
+
+    def put(self, key, result):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.entry_path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+        with self.lock:
+            self.stores += 1
+        self.evict()
+
+    def evict(self):
+        entries = []
+        total_bytes = 0
+        with os.scandir(self.directory) as iterator:
+            for entry in iterator:
+                if not entry.name.endswith(".json"):
+                    continue
+                try:
+                    stat_result = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat_result.st_mtime_ns, stat_result.st_size, entry.path))
+                total_bytes += stat_result.st_size
+
+        entries.sort()
+        evicted = 0
+        while entries and (len(entries) > self.max_entries or total_bytes > self.max_bytes):
+            _, size, path = entries.pop(0)
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total_bytes -= size
+            evicted += 1
+
+        if evicted:
+            with self.lock:
+                self.evictions += evicted
+
+    def stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "evictions": self.evictions,
+            }
+
+
+def lookup_cached_result(runtime, request, log):
+    cache = runtime.result_cache
+    if cache is None:
+        return None, None
+
+    try:
+        cache_key = build_result_cache_key(
+            hash_file(request["audio_path"]),
+            request,
+            runtime.dictionary_cache.content_hash(log=log),
+            runtime.result_cache_context,
+        )
+    except Exception as e:
+        log(f"Result cache lookup skipped: {str(e)}")
+        return None, None
+
+    result = cache.get(cache_key)
+    log(f"Result cache {'hit' if result is not None else 'miss'}: {cache.stats()}")
+    return cache_key, result
+
+
+def store_cached_result(runtime, cache_key, result, log):
+    if runtime.result_cache is None or cache_key is None or not result["text"]:
+        return
+    try:
+        runtime.result_cache.put(
+            cache_key,
+            {key: result[key] for key in ("text", "language", "segments")},
+        )
+    except Exception as e:
+        log(f"Result cache store failed: {str(e)}", level="warning")
+
+
+def default_metrics_path():
+    return os.path.expanduser("~/Library/Application Support/koto-type/metrics.jsonl")
+
+
+def nearest_rank_percentile(sorted_values, percent):
+    if not sorted_values:
+        return None
+    rank = max(1, ceil(percent / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class StageMetrics:
+    # One JSON line per request with every stage that ran, plus rolling
+    # windows per stage for p50/p95/p99 summaries.
+    percentiles = (50, 95, 99)
+
+    def __init__(self, writer=None, window=500):
+        self.writer = writer
+        self.window = max(1, window)
+        self.samples = {}
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def record(self, request, result, write_seconds=None):
+        timings = dict(result.get("timings") or {})
+        if write_seconds is not None:
+            timings["write"] = write_seconds
+        audio_seconds = result.get("audio_seconds")
+        rtf = None
+        transcribe_rtf = None
+        if audio_seconds:
+            rtf = timings.get("total", 0.0) / audio_seconds
+            if "transcribe" in timings:
+                transcribe_rtf = timings["transcribe"] / audio_seconds
+
+        if result.get("error"):
+            outcome = result["error"]["code"]
+        elif result.get("cached"):
+            outcome = "cached"
+        elif result.get("skipped"):
+            outcome = "skipped"
+        else:
+            outcome = "ok"
+
+        record = {
+            "ts": datetime.now().isoformat(timespec="milliseconds"),
+            "id": request.get("id"),
+            "number": request.get("number"),
+            "type": request.get("type"),
+            "outcome": outcome,
+            "audio_seconds": round(audio_seconds, 3) if audio_seconds else audio_seconds,
+            "rtf": round(rtf, 4) if rtf is not None else None,
+            "transcribe_rtf": round(transcribe_rtf, 4) if transcribe_rtf is not None else None,
+            "timings": {name: round(value, 6) for name, value in timings.items()},
+        }
+
+        with self.lock:
+            self.requests += 1
+            for name, value in timings.items():
+                self.add_sample(name, value)
+            if rtf is not None:
+                self.add_sample("rtf", rtf)
+            if transcribe_rtf is not None:
+                self.add_sample("transcribe_rtf", transcribe_rtf)
+
+        if self.writer is not None:
+            self.writer.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return record
+
+    def add_sample(self, name, value):
+        samples = self.samples.get(name)
+        if samples is None:
+            samples = self.samples[name] = deque(maxlen=self.window)
+        samples.append(value)
+
+    def summary(self):
+        with self.lock:
+            stages = {}
+            for name, samples in sorted(self.samples.items()):
+                values = sorted(samples)
+                stage = {"count": len(values)}
+                for percent in self.percentiles:
+                    stage[f"p{percent}"] = round(nearest_rank_percentile(values, percent), 6)
+                stage["max"] = round(values[-1], 6)
+                stages[name] = stage
+            return {"requests": self.requests, "window": self.window, "stages": stages}
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def create_stage_metrics(log, environ=None):
+    environ = os.environ if environ is None else environ
+    window = parse_int(environ.get("KOTOTYPE_METRICS_WINDOW"), 500)
+    writer = None
+    if parse_bool(environ.get("KOTOTYPE_METRICS_ENABLED", "1"), default=True):
+        path = environ.get("KOTOTYPE_METRICS_PATH") or default_metrics_path()
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            writer = BackgroundLogWriter(
+                path,
+                max_bytes=max(0, parse_int(environ.get("KOTOTYPE_METRICS_MAX_BYTES"), 5 * 1024 * 1024)),
+                backup_count=max(0, parse_int(environ.get("KOTOTYPE_METRICS_BACKUP_COUNT"), 2)),
+            )
+            log(f"Stage metrics: path={path}, window={window}")
+        except Exception as e:
+            log(f"Stage metrics file disabled: {str(e)}")
+    return StageMetrics(writer=writer, window=window)
+
+
+class TraceRecorder:
+    # Appends every transcription request line with when it arrived and
+    # which audio it referenced, so scripts/replay_trace.py can replay the
+    # same load later. Recordings are usually deleted after transcription;
+    # with audio_mode "copy" they are kept, deduplicated by content hash.
+    def __init__(self, writer, audio_mode="hash", audio_dir=None):
+        self.writer = writer
+        self.audio_mode = audio_mode
+        self.audio_dir = audio_dir
+
+    def record(self, line, request, log):
+        audio_path = request["audio_path"]
+        entry = {
+            "ts": round(time.time(), 6),
+            "pid": os.getpid(),
+            "line": line.rstrip("\r\n"),
+            "audio": audio_path,
+            "sha256": None,
+            "bytes": None,
+            "seconds": None,
+            "copy": None,
+        }
+        try:
+            if audio_path and os.path.exists(audio_path):
+                entry["bytes"] = os.path.getsize(audio_path)
+                entry["seconds"] = estimate_audio_duration_seconds(audio_path)
+                if self.audio_mode in ("hash", "copy"):
+                    entry["sha256"] = hash_file(audio_path)
+                if self.audio_mode == "copy" and self.audio_dir:
+                    _, extension = os.path.splitext(audio_path)
+                    copy_name = f"{entry['sha256']}{extension}"
+                    copy_path = os.path.join(self.audio_dir, copy_name)
+                    if not os.path.exists(copy_path):
+                        os.makedirs(self.audio_dir, exist_ok=True)
+                        shutil.copyfile(audio_path, copy_path)
+                    entry["copy"] = copy_name
+        except Exception as e:
+            log(f"Trace audio capture failed: {str(e)}", level="warning")
+        self.writer.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def close(self):
+        self.writer.close()
+
+
+def create_trace_recorder(log, environ=None):
+    environ = os.environ if environ is None else environ
+    path = environ.get("KOTOTYPE_TRACE_PATH")
+    if not path:
+        return None
+
+    path = os.path.expanduser(path)
+    audio_mode = (environ.get("KOTOTYPE_TRACE_AUDIO") or "hash").strip().lower()
+    if audio_mode not in ("none", "hash", "copy"):
+        audio_mode = "hash"
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        writer = BackgroundLogWriter(path, max_bytes=0)
+    except Exception as e:
+        log(f"Trace capture disabled: {str(e)}")
+        return None
+    log(f"Trace capture enabled: path={path}, audio={audio_mode}")
+    return TraceRecorder(writer, audio_mode=audio_mode, audio_dir=f"{path}.audio")
+
+
+DEFAULT_SILENCE_GATE_SETTINGS = {
+    "enabled": True,
+    "peak_dbfs": -50.0,
+    "min_speech_ratio": 0.01,
+    "max_seconds": 120.0,
+}
+
+
+def resolve_silence_gate_settings(environ=None):
+    environ = os.environ if environ is None else environ
+    return {
+        "enabled": parse_bool(environ.get("KOTOTYPE_SILENCE_GATE", "1"), default=True),
+        "peak_dbfs": parse_float(environ.get("KOTOTYPE_SILENCE_GATE_PEAK_DBFS"), -50.0),
+        "min_speech_ratio": max(
+            0.0,
+            parse_float(environ.get("KOTOTYPE_SILENCE_GATE_MIN_SPEECH_RATIO"), 0.01),
+        ),
+        "max_seconds": max(
+            0.0,
+            parse_float(environ.get("KOTOTYPE_SILENCE_GATE_MAX_SECONDS"), 120.0),
+        ),
+    }
+
+
+def evaluate_silence_gate(stats, settings):
+    if stats.frame_count == 0:
+        return "empty"
+    if stats.peak_dbfs < settings["peak_dbfs"]:
+        return "silent"
+    if stats.speech_ratio < settings["min_speech_ratio"]:
+        return "no_speech"
+    return None
+
+
+def check_silence_gate(runtime, audio_path, log, count=True):
+    settings = runtime.silence_gate
+    if not settings["enabled"] or not audio_path.lower().endswith(".wav"):
+        return None
+
+    duration = estimate_audio_duration_seconds(audio_path)
+    if duration is None or duration > settings["max_seconds"]:
+        return None
+
+    try:
+        stats = analyze_wav_levels(audio_path)
+    except Exception as e:
+        log(f"Silence gate skipped: {str(e)}")
+        return None
+
+    if count:
+        runtime.count("silence_gate_checked")
+    reason = evaluate_silence_gate(stats, settings)
+    if reason is not None:
+        if count:
+            runtime.count("silence_gate_skipped")
+        log(
+            f"Silence gate: skipping model ({reason}; {format_level_stats(stats)}, "
+            f"speech_ratio={stats.speech_ratio:.3f}, zcr={stats.zero_crossing_rate:.3f})"
+        )
+    return reason
+
+
+def prepare_transcription_request(runtime, request):
+    log = runtime.request_log(request)
+    request_started = time.perf_counter()
+    audio_path = request["audio_path"]
+    language = request["language"]
+    actual_language = None if language == "auto" else language
+    screenshot_context = request["screenshot_context"]
+    prepared = {
+        "request": request,
+        "log": log,
+        "audio_path": audio_path,
+        "actual_language": actual_language,
+        "transcription_audio": audio_path,
+        "initial_prompt": None,
+        "timings": {"parse": request.get("parse_seconds", 0.0)},
+        "request_started": request_started,
+        "prepared_at": None,
+        "result": None,
+        "cache_key": None,
+    }
+    log(
+        f"Received: id={request['id']}, protocol={request['protocol']}, audio={audio_path}, language={language}, actual_language={actual_language}, temp={request['temperature']}, beam={request['beam_size']}, "
+        f"no_speech_threshold={request['no_speech_threshold']}, compression_ratio_threshold={request['compression_ratio_threshold']}, "
+        f"task={request['task']}, best_of={request['best_of']}, vad_threshold={request['vad_threshold']}, auto_punctuation={request['auto_punctuation']}, "
+        f"auto_gain_enabled={request['auto_gain_enabled']}, auto_gain_weak_threshold_dbfs={request['auto_gain_weak_threshold_dbfs']}, "
+        f"auto_gain_target_peak_dbfs={request['auto_gain_target_peak_dbfs']}, auto_gain_max_db={request['auto_gain_max_db']}, "
+        f"screenshot_context_len={len(screenshot_context) if screenshot_context else 0}"
+    )
+
+    stage_started = time.perf_counter()
+    if not audio_path:
+        log("Empty audio path, skipping")
+        prepared["result"] = error_result("empty_audio_path", "Empty audio path")
+        return prepared
+
+    if not os.path.exists(audio_path):
+        log(f"Error: File not found: {audio_path}", level="error")
+        prepared["result"] = error_result("file_not_found", f"File not found: {audio_path}")
+        return prepared
+
+    log(f"File exists, size: {os.path.getsize(audio_path)} bytes", level="debug")
+    prepared["timings"]["stat"] = time.perf_counter() - stage_started
+
+    # The synthetic warm-up clip is kept out of the cache and the counters
+    # operators read through the metrics request.
+    warmup = request.get("warmup", False)
+    stage_started = time.perf_counter()
+    cache_key, cached = (None, None) if warmup else lookup_cached_result(runtime, request, log)
+    if cached is not None:
+        elapsed = time.perf_counter() - stage_started
+        cached["timings"] = {"cache": elapsed, "total": time.perf_counter() - request_started}
+        cached["cached"] = True
+        prepared["result"] = cached
+        return prepared
+    prepared["cache_key"] = cache_key
+    if cache_key is not None:
+        prepared["timings"]["cache"] = time.perf_counter() - stage_started
+
+    stage_started = time.perf_counter()
+    skipped = check_silence_gate(runtime, audio_path, log, count=not warmup)
+    if skipped is not None:
+        elapsed = time.perf_counter() - stage_started
+        prepared["result"] = {
+            "text": "",
+            "language": actual_language,
+            "segments": [],
+            "timings": {"silence_gate": elapsed, "total": time.perf_counter() - request_started},
+            "skipped": skipped,
+        }
+        return prepared
+    prepared["timings"]["silence_gate"] = time.perf_counter() - stage_started
+
+    stage_started = time.perf_counter()
+    preprocess_kwargs = {
+        "auto_gain_enabled": request["auto_gain_enabled"],
+        "auto_gain_weak_threshold_dbfs": request["auto_gain_weak_threshold_dbfs"],
+        "auto_gain_target_peak_dbfs": request["auto_gain_target_peak_dbfs"],
+        "auto_gain_max_db": request["auto_gain_max_db"],
+        "filter_capabilities": runtime.filter_capabilities,
+        "ffmpeg_module": runtime.ffmpeg_module,
+        "timings": prepared["timings"],
+    }
+    if runtime.preprocess_in_memory:
+        transcription_audio = audio_preprocess_in_memory(
+            audio_path,
+            log,
+            **preprocess_kwargs,
+        )
+    else:
+        transcription_audio = audio_preprocess(
+            audio_path,
+            log,
+            **preprocess_kwargs,
+        )
+
+    if isinstance(transcription_audio, str):
+        try:
+            if (
+                os.path.exists(transcription_audio)
+                and transcription_audio != audio_path
+            ):
+                log(
+                    f"Processed file size: {os.path.getsize(transcription_audio)} bytes",
+                    level="debug",
+                )
+        except Exception as e:
+            log(f"Error checking processed file: {str(e)}, using original", level="warning")
+            transcription_audio = audio_path
+    prepared["transcription_audio"] = transcription_audio
+    prepared["timings"]["preprocess"] = time.perf_counter() - stage_started
+
+    try:
+        stage_started = time.perf_counter()
+        dictionary_cache = runtime.dictionary_cache
+        dictionary_cache.get_words(log=log)
+        prepared["timings"]["dictionary"] = time.perf_counter() - stage_started
+        stage_started = time.perf_counter()
+        prepared["initial_prompt"] = dictionary_cache.get_initial_prompt(
+            actual_language or language or "ja",
+            screenshot_context=screenshot_context,
+            log=log,
+        )
+        log(f"User dictionary cache: {dictionary_cache.stats()}", level="debug")
+        prepared["timings"]["prompt"] = time.perf_counter() - stage_started
+    except Exception:
+        cleanup_prepared_audio(prepared)
+        raise
+
+    prepared["prepared_at"] = time.perf_counter()
+    return prepared
+
+
+def cleanup_prepared_audio(prepared):
+    log = prepared["log"]
+    transcription_audio = prepared["transcription_audio"]
+    if (
+        isinstance(transcription_audio, str)
+        and transcription_audio != prepared["audio_path"]
+        and os.path.exists(transcription_audio)
+    ):
+        try:
+            os.remove(transcription_audio)
+            log(f"Cleaned up temporary file: {transcription_audio}", level="debug")
+        except Exception as e:
+            log(f"Error removing temporary file: {str(e)}", level="warning")
+
+
+def emit_cached_segments(request, result, emit_line):
+    for index, segment in enumerate(
+        segment for segment in result["segments"] if segment["text"].strip()
+    ):
+        emit_line(
+            format_segment_event(
+                request,
+                index,
+                post_process_text(
+                    segment["text"].strip(),
+                    result["language"],
+                    auto_punctuation=request["auto_punctuation"],
+                ),
+                SimpleNamespace(**segment),
+            )
+        )
+
+
+def run_prepared_transcription(runtime, prepared, emit_line=None):
+    if prepared["result"] is not None:
+        result = prepared["result"]
+        if result.get("cached") and prepared["request"].get("stream") and emit_line is not None:
+            emit_cached_segments(prepared["request"], result, emit_line)
+        return result
+
+    request = prepared["request"]
+    log = prepared["log"]
+    timings = prepared["timings"]
+    actual_language = prepared["actual_language"]
+    transcription_audio = prepared["transcription_audio"]
+    initial_prompt = prepared["initial_prompt"]
+    timings["queue_wait"] = time.perf_counter() - prepared["prepared_at"]
+
+    model_holder = runtime.model_holder
+    model = None
+    try:
+        stage_started = time.perf_counter()
+        model = model_holder.acquire()
+        timings["model_acquire"] = time.perf_counter() - stage_started
+
+        start_time = time.time()
+        stage_started = time.perf_counter()
+        vad_parameters = build_vad_parameters(request["vad_threshold"])
+
+        log("Starting transcription with Whisper...")
+        log(
+            f"Transcription parameters: audio={describe_audio_source(transcription_audio)}, language={actual_language}, task={request['task']}, temperature={request['temperature']}, beam_size={request['beam_size']}, best_of={request['best_of']}, vad_parameters={vad_parameters}, auto_punctuation={request['auto_punctuation']}, initial_prompt={initial_prompt[:50] if initial_prompt else None}...",
+            level="debug",
+        )
+
+        audio_duration = estimate_audio_duration_seconds(transcription_audio)
+        batched_requested = request["batched"]
+        if request["chunked"] and batched_requested is None:
+            batched_requested = False
+        use_batched = should_use_batched_inference(
+            batched_requested,
+            audio_duration,
+            runtime.batched_min_duration_seconds,
+        )
+        if use_batched and audio_duration is None:
+            # Without VAD the batched pipeline needs clips built from the
+            # duration, which only WAV headers give cheaply; decode once here.
+            decoded_audio = load_audio_array(transcription_audio, log)
+            if decoded_audio is None:
+                log("Batched inference skipped: audio duration is unknown")
+                use_batched = False
+            else:
+                transcription_audio = decoded_audio
+                audio_duration = estimate_audio_duration_seconds(decoded_audio)
+        transcription_model = model
+        if use_batched:
+            log(
+                "Using batched inference pipeline "
+                f"(duration={audio_duration}, batch_size={runtime.batch_size})"
+            )
+            transcription_model = runtime.get_batched_pipeline(model)
+
+        transcribe_kwargs = {
+            "audio": transcription_audio,
+            "audio_duration": audio_duration,
+            "batch_size": runtime.batch_size if use_batched else None,
+            "language": actual_language,
+            "task": request["task"],
+            "temperature": request["temperature"],
+            "beam_size": request["beam_size"],
+            "best_of": request["best_of"],
+            "word_timestamps": False,
+            "initial_prompt": initial_prompt,
+            "no_speech_threshold": request["no_speech_threshold"],
+            "compression_ratio_threshold": request["compression_ratio_threshold"],
+        }
+
+        on_segment = None
+        if request.get("stream") and emit_line is not None:
+            emitted = itertools.count()
+
+            def on_segment(segment, info):
+                index = next(emitted)
+                if index == 0:
+                    timings["first_segment"] = time.perf_counter() - stage_started
+                segment_language = info.language if actual_language is None else actual_language
+                emit_line(
+                    format_segment_event(
+                        request,
+                        index,
+                        post_process_text(
+                            segment.text.strip(),
+                            segment_language,
+                            auto_punctuation=request["auto_punctuation"],
+                        ),
+                        segment,
+                    )
+                )
+
+        chunk_audio = None
+        if not use_batched and should_use_chunked_transcription(
+            request["chunked"],
+            audio_duration,
+            runtime.chunked_min_duration_seconds,
+        ):
+            chunk_audio = load_audio_array(transcription_audio, log)
+
+        if chunk_audio is not None:
+            on_progress = None
+            if request.get("stream") and emit_line is not None:
+
+                def on_progress(completed, total, audio_seconds):
+                    emit_line(format_progress_event(request, completed, total, audio_seconds))
+
+            segments, info = transcribe_in_chunks(
+                model=transcription_model,
+                transcribe_kwargs=transcribe_kwargs,
+                vad_parameters=vad_parameters,
+                log=log,
+                audio=chunk_audio,
+                chunk_seconds=runtime.chunk_seconds,
+                max_workers=runtime.chunk_workers,
+                fallback_on_empty_vad=runtime.fallback_on_empty_vad,
+                on_segment=on_segment,
+                on_progress=on_progress,
+            )
+        else:
+            segments, info = transcribe_with_vad_fallback(
+                model=transcription_model,
+                transcribe_kwargs=transcribe_kwargs,
+                vad_parameters=vad_parameters,
+                log=log,
+                fallback_on_empty_vad=runtime.fallback_on_empty_vad,
+                on_segment=on_segment,
+                timings=timings,
+            )
+        timings["transcribe"] = time.perf_counter() - stage_started
+
+        detected_language = (
+            info.language if actual_language is None else actual_language
+        )
+        elapsed_time = time.time() - start_time
+        log(
+            f"Transcription completed in {elapsed_time:.2f} seconds (detected language: {detected_language})"
+        )
+
+        stage_started = time.perf_counter()
+        transcription = " ".join([segment.text for segment in segments]).strip()
+        log(f"Transcription result (raw): '{truncate_log_text(transcription)}'")
+        log(f"Transcription length: {len(transcription)} characters", level="debug")
+
+        transcription = post_process_text(
+            transcription,
+            detected_language,
+            auto_punctuation=request["auto_punctuation"],
+        )
+        log(f"Transcription result (post-processed): '{truncate_log_text(transcription)}'")
+        timings["postprocess"] = time.perf_counter() - stage_started
+    finally:
+        if model is not None:
+            model_holder.release()
+        cleanup_prepared_audio(prepared)
+
+    timings["total"] = time.perf_counter() - prepared["request_started"]
+    result = {
+        "text": transcription,
+        "language": detected_language,
+        "segments": [serialize_segment(segment) for segment in segments],
+        "timings": timings,
+        "audio_seconds": audio_duration,
+    }
+    store_cached_result(runtime, prepared["cache_key"], result, log)
+    return result
+
+
+def handle_transcription_request(runtime, request):
+    return run_prepared_transcription(
+        runtime,
+        prepare_transcription_request(runtime, request),
+    )
+
+
+DEFAULT_LIVE_SETTINGS = {
+    "min_chunk_seconds": 1.0,
+    "max_buffer_seconds": 15.0,
+    "silence_commit_seconds": 0.8,
+    "speech_threshold_dbfs": -45.0,
+    "session_idle_seconds": 300.0,
+}
+LIVE_REQUEST_TYPES = ("stream_start", "stream_audio", "stream_end")
+
+
+def resolve_live_settings(environ=None):
+    environ = os.environ if environ is None else environ
+    return {
+        "min_chunk_seconds": max(
+            0.1,
+            parse_float(environ.get("KOTOTYPE_LIVE_MIN_CHUNK_SECONDS"), 1.0),
+        ),
+        "max_buffer_seconds": max(
+            2.0,
+            parse_float(environ.get("KOTOTYPE_LIVE_MAX_BUFFER_SECONDS"), 15.0),
+        ),
+        "silence_commit_seconds": max(
+            0.1,
+            parse_float(environ.get("KOTOTYPE_LIVE_SILENCE_COMMIT_SECONDS"), 0.8),
+        ),
+        "speech_threshold_dbfs": parse_float(
+            environ.get("KOTOTYPE_LIVE_SPEECH_THRESHOLD_DBFS"),
+            -45.0,
+        ),
+        "session_idle_seconds": max(
+            0.0,
+            parse_float(environ.get("KOTOTYPE_LIVE_SESSION_IDLE_SECONDS"), 300.0),
+        ),
+    }
+
+
+def normalize_live_word(word):
+    return re.sub(r"[\s、。，．,.!?！？]", "", word).lower()
+
+
+def local_agreement_prefix(previous, current):
+    # LocalAgreement-2: a word is stable once two consecutive decodes of the
+    # growing buffer agree on it (and on everything before it).
+    agreed = 0
+    for previous_word, current_word in zip(previous, current):
+        if normalize_live_word(previous_word[2]) != normalize_live_word(current_word[2]):
+            break
+        agreed += 1
+    return current[:agreed]
+
+
+def join_live_words(words):
+    return "".join(word for _, _, word in words).strip()
+
+
+def decode_live_words(runtime, request, audio, initial_prompt):
+    model = runtime.model_holder.acquire()
+    try:
+        return decode_live_words_with_model(model, request, audio, initial_prompt)
+    finally:
+        runtime.model_holder.release()
+
+
+def decode_live_words_with_model(model, request, audio, initial_prompt):
+    segments, _ = model.transcribe(
+        audio,
+        language=None if request["language"] == "auto" else request["language"],
+        task=request["task"],
+        temperature=request["temperature"],
+        beam_size=request["beam_size"],
+        best_of=request["best_of"],
+        vad_filter=False,
+        word_timestamps=True,
+        condition_on_previous_text=False,
+        initial_prompt=initial_prompt,
+        no_speech_threshold=request["no_speech_threshold"],
+        compression_ratio_threshold=request["compression_ratio_threshold"],
+    )
+    words = []
+    for segment in segments:
+        segment_words = getattr(segment, "words", None)
+        if segment_words:
+            words.extend((word.start, word.end, word.word) for word in segment_words)
+        elif getattr(segment, "text", "").strip():
+            words.append((segment.start, segment.end, segment.text))
+    return words
+
+
+class LiveTranscriptionSession:
+    def __init__(self, request, numpy_module, settings):
+        self.request = request
+        self.np = numpy_module
+        self.settings = settings
+        self.lock = threading.Lock()
+        self.buffer = numpy_module.zeros(0, dtype=numpy_module.float32)
+        self.buffer_offset = 0.0
+        self.committed = []
+        self.hypothesis = []
+        self.undecoded_seconds = 0.0
+        self.trailing_silence_seconds = 0.0
+        self.heard_speech = False
+        self.last_active = time.monotonic()
+
+    def committed_until(self):
+        if self.committed:
+            return max(self.committed[-1][1], self.buffer_offset)
+        return self.buffer_offset
+
+    def buffer_seconds(self):
+        return len(self.buffer) / SAMPLE_RATE
+
+    def is_speech(self, chunk):
+        if len(chunk) == 0:
+            return False
+        block = max(1, int(SAMPLE_RATE * LEVEL_BLOCK_SECONDS))
+        usable = len(chunk) - len(chunk) % block or len(chunk)
+        blocks = chunk[:usable].reshape(-1, min(block, usable))
+        loudest_rms = float(self.np.sqrt(self.np.mean(blocks * blocks, axis=1)).max())
+        return amplitude_to_dbfs(loudest_rms) >= self.settings["speech_threshold_dbfs"]
+
+    def trim_to(self, absolute_seconds):
+        cut = int(round((absolute_seconds - self.buffer_offset) * SAMPLE_RATE))
+        cut = min(max(cut, 0), len(self.buffer))
+        if cut:
+            self.buffer = self.buffer[cut:]
+            self.buffer_offset += cut / SAMPLE_RATE
+
+    def append_pcm(self, pcm_bytes):
+        chunk = self.np.frombuffer(pcm_bytes, dtype="<i2").astype(self.np.float32) / 32768.0
+        self.buffer = self.np.concatenate((self.buffer, chunk))
+        duration = len(chunk) / SAMPLE_RATE
+        self.undecoded_seconds += duration
+        if self.is_speech(chunk):
+            self.heard_speech = True
+            self.trailing_silence_seconds = 0.0
+        else:
+            self.trailing_silence_seconds += duration
+
+        if not self.heard_speech:
+            # Nothing worth decoding yet; keep only a short lead-in.
+            self.trim_to(self.buffer_offset + max(0.0, self.buffer_seconds() - 0.5))
+            self.undecoded_seconds = 0.0
+
+    def decode(self, decode_words):
+        start = self.committed_until()
+        offset = int(round((start - self.buffer_offset) * SAMPLE_RATE))
+        audio = self.buffer[max(0, offset):]
+        prompt = join_live_words(self.committed)[-200:] or None
+        words = decode_words(self.request, audio, prompt)
+        self.undecoded_seconds = 0.0
+        return [(start + word_start, start + word_end, text) for word_start, word_end, text in words]
+
+    def commit(self, words):
+        self.committed.extend(words)
+        return join_live_words(words)
+
+    def process(self, decode_words):
+        if self.undecoded_seconds < self.settings["min_chunk_seconds"] or not self.heard_speech:
+            return ""
+
+        current = self.decode(decode_words)
+        end_of_utterance = (
+            self.trailing_silence_seconds >= self.settings["silence_commit_seconds"]
+        )
+        if end_of_utterance:
+            agreed = current
+        else:
+            agreed = local_agreement_prefix(self.hypothesis, current)
+        committed_text = self.commit(agreed)
+        self.hypothesis = current[len(agreed):]
+
+        if end_of_utterance:
+            self.trim_to(self.buffer_offset + self.buffer_seconds())
+            self.heard_speech = False
+        elif self.buffer_seconds() > self.settings["max_buffer_seconds"]:
+            if self.committed_until() <= self.buffer_offset:
+                # No agreement within the window: accept the hypothesis rather
+                # than letting the buffer (and each decode) grow without bound.
+                committed_text = (committed_text + self.commit(self.hypothesis)).strip()
+                self.hypothesis = []
+            self.trim_to(self.committed_until())
+        return committed_text
+
+    def finish(self, decode_words):
+        committed_text = ""
+        if self.heard_speech and self.buffer_seconds() > 0:
+            committed_text = self.commit(self.decode(decode_words))
+        self.hypothesis = []
+        return committed_text
+
+
+def handle_live_request(runtime, request):
+    log = runtime.request_log(request)
+    session_id = request["id"]
+    if session_id is None:
+        return error_result("missing_stream_id", "Live stream requests need an id")
+
+    runtime.expire_live_sessions()
+    # Daemon clients pick their ids independently, so sessions are keyed per
+    # connection as well.
+    session_key = (request.get("client"), session_id)
+    if request["type"] == "stream_start":
+        numpy_module = load_numpy_module()
+        if numpy_module is None:
+            return error_result("numpy_unavailable", "Live streaming requires numpy")
+        with runtime.live_sessions_lock:
+            runtime.live_sessions[session_key] = LiveTranscriptionSession(
+                request,
+                numpy_module,
+                runtime.live_settings,
+            )
+        log(f"Live stream started: id={session_id}, language={request['language']}")
+        return {"type": "stream_started", "text": "", "language": None, "segments": [], "timings": {}}
+
+    with runtime.live_sessions_lock:
+        if request["type"] == "stream_end":
+            session = runtime.live_sessions.pop(session_key, None)
+        else:
+            session = runtime.live_sessions.get(session_key)
+    if session is None:
+        return error_result("unknown_stream", f"Unknown live stream: {session_id}")
+
+    def decode_words(session_request, audio, prompt):
+        return decode_live_words(runtime, session_request, audio, prompt)
+
+    started = time.perf_counter()
+    with session.lock:
+        session.last_active = time.monotonic()
+        if request["type"] == "stream_audio":
+            session.append_pcm(base64.b64decode(request["pcm"] or ""))
+            committed_text = session.process(decode_words)
+            response_type = "partial"
+        else:
+            committed_text = session.finish(decode_words)
+            response_type = "done"
+        full_text = join_live_words(session.committed)
+        pending_text = join_live_words(session.hypothesis)
+
+    language = session.request["language"]
+    if response_type == "done":
+        full_text = post_process_text(
+            full_text,
+            None if language == "auto" else language,
+            auto_punctuation=session.request["auto_punctuation"],
+        )
+        log(f"Live stream finished: id={session_id}, text='{truncate_log_text(full_text)}'")
+    return {
+        "type": response_type,
+        "text": full_text,
+        "committed": committed_text,
+        "pending": pending_text,
+        "language": None if language == "auto" else language,
+        "segments": [],
+        "timings": {"decode": time.perf_counter() - started},
+    }
+
+
+def handle_metrics_request(runtime):
+    if runtime.metrics is None:
+        return error_result("metrics_disabled", "Stage metrics are not enabled")
+    return {
+        "type": "metrics",
+        "text": "",
+        "language": None,
+        "segments": [],
+        "timings": {},
+        "metrics": dict(runtime.metrics.summary(), counters=runtime.counter_snapshot()),
+    }
+
+
+def handle_request(runtime, request):
+    if request["type"] == "transcribe":
+        return handle_transcription_request(runtime, request)
+    if request["type"] in LIVE_REQUEST_TYPES:
+        return handle_live_request(runtime, request)
+    if request["type"] == "metrics":
+        return handle_metrics_request(runtime)
+    return error_result("unsupported_request_type", f"Unsupported request type: {request['type']}")
+
+
+def internal_error_result(log, request, line, error):
+    log(f"Error: {str(error)}", level="error")
+    log(f"Traceback: {traceback.format_exc()}", level="error")
+    if request is None and is_json_request_line(line):
+        request = default_request(protocol="json", request_id=peek_request_id(line))
+    return request, error_result("internal_error", str(error))
+
+
+def prepare_request_line(runtime, line):
+    request = None
+    try:
+        parse_started = time.perf_counter()
+        request = parse_request_line(line, runtime.log)
+        request["parse_seconds"] = time.perf_counter() - parse_started
+        request["number"] = runtime.next_request_number()
+        if runtime.trace is not None and request["type"] == "transcribe":
+            runtime.trace.record(line, request, runtime.log)
+        if request["type"] == "transcribe":
+            return line, request, prepare_transcription_request(runtime, request), None
+        # Everything else runs at completion: metrics snapshot after every
+        # earlier request has been written, and live decodes use the model,
+        # so they belong to the inference stage (and the daemon's slots).
+        return line, request, None, None
+    except Exception as e:
+        request, result = internal_error_result(runtime.log, request, line, e)
+        return line, request, None, result
+
+
+def complete_request_line(runtime, pending, emit_line=None):
+    line, request, prepared, result = pending
+    if result is None:
+        try:
+            if prepared is None:
+                result = handle_request(runtime, request)
+            else:
+                result = run_prepared_transcription(runtime, prepared, emit_line=emit_line)
+        except Exception as e:
+            request, result = internal_error_result(runtime.log, request, line, e)
+
+    if runtime.metrics is not None and request is not None and request["type"] != "metrics":
+        request["completed_result"] = result
+
+    error = result.get("error")
+    if (
+        error
+        and error["code"] in SKIPPED_LEGACY_RESPONSE_ERRORS
+        and (request is None or request["protocol"] == "legacy")
+    ):
+        return request, None
+
+    return request, format_response(request, result)
+
+
+def process_request_line(runtime, line, emit_line=None):
+    return complete_request_line(
+        runtime,
+        prepare_request_line(runtime, line),
+        emit_line=emit_line,
+    )
+
+
+def log_output_flushed(log, request):
+    if request is not None and request["protocol"] == "json":
+        log(f"Output flushed (id={request['id']})", level="debug")
+    else:
+        log("Output flushed", level="debug")
+
+
+def write_and_record(runtime, request, response_line, write_line):
+    write_started = time.perf_counter()
+    write_line(response_line)
+    runtime.record_metrics(request, write_seconds=time.perf_counter() - write_started)
+
+
+def serve_request_line(runtime, line):
+    request, response_line = process_request_line(
+        runtime,
+        line,
+        emit_line=write_response_line,
+    )
+    if response_line is None:
+        return None
+
+    write_and_record(runtime, request, response_line, write_response_line)
+    log_output_flushed(runtime.log, request)
+    return response_line
+
+
+def serve_pipelined(runtime, lines, depth):
+    # A preprocess stage reads ahead and prepares audio on its own thread while
+    # the model stage transcribes the previous request; the bounded queue keeps
+    # at most `depth` prepared requests (and their buffers) waiting.
+    prepared_queue = queue.Queue(maxsize=max(1, depth))
+    finished = object()
+
+    def preprocess_stage():
+        try:
+            for line in lines:
+                prepared_queue.put(prepare_request_line(runtime, line))
+        except Exception as e:
+            runtime.log(f"Preprocess stage stopped: {str(e)}")
+        finally:
+            prepared_queue.put(finished)
+
+    stage_thread = threading.Thread(
+        target=preprocess_stage,
+        name="preprocess-stage",
+        daemon=True,
+    )
+    stage_thread.start()
+
+    while True:
+        pending = prepared_queue.get()
+        if pending is finished:
+            break
+
+        request, response_line = complete_request_line(
+            runtime,
+            pending,
+            emit_line=write_response_line,
+        )
+        if response_line is not None:
+            write_and_record(runtime, request, response_line, write_response_line)
+            log_output_flushed(runtime.log, request)
+
+
+class OrderedResponseWriter:
+    # Legacy responses are matched by order, so they are released strictly in
+    # submission order; JSON responses carry an id and are written as soon as
+    # they are ready.
+    def __init__(self, write_line=None):
+        self.write_line = write_line or write_response_line
+        self.lock = threading.Lock()
+        self.next_ticket = 0
+        self.next_to_write = 0
+        self.pending = {}
+
+    def reserve(self):
+        with self.lock:
+            ticket = self.next_ticket
+            self.next_ticket += 1
+            return ticket
+
+    def complete(self, ticket, line):
+        with self.lock:
+            self.pending[ticket] = line
+            while self.next_to_write in self.pending:
+                ready_line = self.pending.pop(self.next_to_write)
+                self.next_to_write += 1
+                if ready_line is not None:
+                    self.write_line(ready_line)
+
+    def write_now(self, line):
+        with self.lock:
+            self.write_line(line)
+
+
+def serve_request_line_concurrently(runtime, line, writer, ticket):
+    request = None
+    response_line = "" if ticket is not None else None
+    try:
+        request, response_line = process_request_line(
+            runtime,
+            line,
+            emit_line=writer.write_now,
+        )
+    finally:
+        if ticket is not None:
+            write_and_record(
+                runtime,
+                request,
+                response_line,
+                lambda line: writer.complete(ticket, line),
+            )
+        elif response_line is not None:
+            write_and_record(runtime, request, response_line, writer.write_now)
+
+    if response_line is not None:
+        log_output_flushed(runtime.log, request)
+
+
+def serve_concurrently(runtime, lines, max_workers, writer=None, max_in_flight=None):
+    writer = writer or OrderedResponseWriter()
+    # Stop reading once a couple of requests per worker are waiting, so a
+    # fast client cannot queue (and hold the audio of) an unbounded backlog.
+    in_flight = threading.BoundedSemaphore(max_in_flight or max_workers * 2)
+    with ThreadPoolExecutor(
+        max_workers=max_workers,
+        thread_name_prefix="transcribe",
+    ) as executor:
+        for line in lines:
+            in_flight.acquire()
+            ticket = None if is_json_request_line(line) else writer.reserve()
+            future = executor.submit(serve_request_line_concurrently, runtime, line, writer, ticket)
+            future.add_done_callback(lambda _: in_flight.release())
+
+
+def default_daemon_socket_path():
+    return os.path.expanduser("~/Library/Application Support/koto-type/whisper_server.sock")
+
+
+def connect_daemon(socket_path, timeout=1.0):
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(socket_path):
+        return None
+
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.settimeout(timeout)
+    try:
+        connection.connect(socket_path)
+    except OSError:
+        connection.close()
+        return None
+    connection.settimeout(None)
+    return connection
+
+
+def create_daemon_socket(socket_path, log):
+    existing = connect_daemon(socket_path)
+    if existing is not None:
+        existing.close()
+        raise RuntimeError(f"Another daemon is already listening on {socket_path}")
+
+    if os.path.exists(socket_path):
+        log(f"Removing stale daemon socket: {socket_path}")
+        os.remove(socket_path)
+
+    os.makedirs(os.path.dirname(socket_path) or ".", exist_ok=True)
+    server_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server_socket.bind(socket_path)
+    os.chmod(socket_path, 0o600)
+    server_socket.listen()
+    return server_socket
+
+
+def format_daemon_envelope(response_line):
+    # Legacy requests can legitimately produce no output line; the envelope
+    # keeps that distinguishable from an empty transcription.
+    return json.dumps({"line": response_line}, ensure_ascii=False)
+
+
+def handle_daemon_connection(runtime, connection, transcription_slots, client=None):
+    log = runtime.log
+    with connection:
+        reader = connection.makefile("r", encoding="utf-8", newline="\n")
+        writer = connection.makefile("w", encoding="utf-8", newline="\n")
+
+        def send(response_line):
+            writer.write(format_daemon_envelope(response_line) + "\n")
+            writer.flush()
+
+        try:
+            for line in reader:
+                pending = prepare_request_line(runtime, line)
+                if pending[1] is not None:
+                    pending[1]["client"] = client
+                with transcription_slots:
+                    request, response_line = complete_request_line(
+                        runtime,
+                        pending,
+                        emit_line=send,
+                    )
+                write_and_record(runtime, request, response_line, send)
+                log_output_flushed(log, request)
+        except OSError as e:
+            log(f"Daemon client disconnected: {str(e)}")
+        finally:
+            dropped = runtime.drop_live_sessions(client)
+            if dropped:
+                log(f"Dropped {len(dropped)} live stream(s) of disconnected client {client}")
+            for stream in (reader, writer):
+                try:
+                    stream.close()
+                except OSError:
+                    pass
+
+
+def serve_daemon(runtime, server_socket, stop_event=None, poll_interval=0.5):
+    log = runtime.log
+    stop_event = stop_event or threading.Event()
+    # Preprocessing runs per connection; only the model stage is bounded by
+    # the configured concurrency, so relayed workers queue for the one model.
+    transcription_slots = threading.BoundedSemaphore(runtime.max_concurrent_requests)
+    server_socket.settimeout(poll_interval)
+    client_count = itertools.count(1)
+
+    while not stop_event.is_set():
+        try:
+            connection, _ = server_socket.accept()
+        except socket.timeout:
+            continue
+        except OSError as e:
+            log(f"Daemon socket closed: {str(e)}")
+            break
+
+        connection.settimeout(None)
+        client_number = next(client_count)
+        log(f"Daemon client connected (client={client_number})")
+        threading.Thread(
+            target=handle_daemon_connection,
+            args=(runtime, connection, transcription_slots, client_number),
+            name=f"daemon-client-{client_number}",
+            daemon=True,
+        ).start()
+
+
+def relay_to_daemon(connection, lines, write_line=write_response_line):
+    def send_lines():
+        try:
+            for line in lines:
+                if not line.endswith("\n"):
+                    line += "\n"
+                connection.sendall(line.encode("utf-8"))
+        except OSError:
+            pass
+        finally:
+            try:
+                connection.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+
+    sender = threading.Thread(target=send_lines, name="daemon-relay", daemon=True)
+    sender.start()
+    with connection, connection.makefile("r", encoding="utf-8", newline="\n") as reader:
+        for envelope in reader:
+            response_line = json.loads(envelope)["line"]
+            if response_line is not None:
+                write_line(response_line)
+    sender.join(timeout=1.0)
+
+
+def write_synthetic_warmup_wav(path, duration_seconds=1.0, frequency=440.0, amplitude=0.1):
+    # Half silence, half tone: enough to drive VAD, the decoder and the
+    # post-processing path without needing a bundled audio asset.
+    frame_count = max(1, int(duration_seconds * SAMPLE_RATE))
+    silent_frames = frame_count // 2
+    peak = int(32767 * amplitude)
+    samples = array("h", bytes(2 * silent_frames))
+    step = 2.0 * pi * frequency / SAMPLE_RATE
+    samples.extend(
+        int(peak * sin(step * index))
+        for index in range(frame_count - silent_frames)
+    )
+    if sys.byteorder != "little":
+        samples.byteswap()
+
+    with wave.open(path, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(SAMPLE_RATE)
+        wav_file.writeframes(samples.tobytes())
+
+
+def run_warmup(runtime, language="ja", duration_seconds=1.0):
+    log = runtime.log
+    started = time.perf_counter()
+    fd, warmup_path = tempfile.mkstemp(prefix="kototype_warmup_", suffix=".wav")
+    os.close(fd)
+    try:
+        write_synthetic_warmup_wav(warmup_path, duration_seconds=duration_seconds)
+        request = default_request(protocol="json", request_id="warmup")
+        request["audio_path"] = warmup_path
+        request["language"] = language
+        request["warmup"] = True
+        result = handle_transcription_request(runtime, request)
+        if "error" in result:
+            log(f"Warm-up failed: {result['error']['message']}", level="warning")
+            return None
+    except Exception as e:
+        log(f"Warm-up failed: {str(e)}", level="warning")
+        return None
+    finally:
+        try:
+            os.remove(warmup_path)
+        except OSError:
+            pass
+
+    elapsed = time.perf_counter() - started
+    log(f"Warm-up completed in {elapsed:.2f} seconds (text='{truncate_log_text(result['text'])}')")
+    return elapsed
+
+
+def format_ready_event(load_seconds, warmup_seconds, **details):
+    event = {
+        "v": PROTOCOL_VERSION,
+        "type": "ready",
+        "pid": os.getpid(),
+        "load_seconds": round(load_seconds, 3),
+        "warmup_seconds": None if warmup_seconds is None else round(warmup_seconds, 3),
+    }
+    event.update(details)
+    return json.dumps(event, ensure_ascii=False)
+
+
+class StartupProfile:
+    # Main-thread wall time per startup phase, in the order the phases end.
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.main_started_at = time.time()
+        self.started = clock()
+        self.last = self.started
+        self.phases = {}
+        self.details = {}
+
+    def mark(self, name):
+        now = self.clock()
+        self.phases[name] = self.phases.get(name, 0.0) + now - self.last
+        self.last = now
+
+    def summary(self):
+        return ", ".join(f"{name}={seconds:.3f}s" for name, seconds in self.phases.items())
+
+    def as_dict(self):
+        profile = {
+            "main_started_at": self.main_started_at,
+            "phases": {name: round(seconds, 4) for name, seconds in self.phases.items()},
+            "total_seconds": round(self.last - self.started, 4),
+        }
+        profile.update(self.details)
+        return profile
+
+
+class BackgroundCall:
+    # Runs a slow loader (the backend import) on a thread so startup work that
+    # does not need it, such as waiting for a load slot, overlaps with it.
+    def __init__(self, func):
+        self.func = func
+        self.value = None
+        self.error = None
+        self.seconds = None
+        self.thread = threading.Thread(target=self.run, name="BackgroundCall", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        started = time.perf_counter()
+        try:
+            self.value = self.func()
+        except BaseException as e:
+            self.error = e
+        finally:
+            self.seconds = time.perf_counter() - started
+
+    def result(self):
+        self.thread.join()
+        if self.error is not None:
+            # Retry on the calling thread so a real failure is raised there.
+            return self.func()
+        return self.value
+
+
+class StdinLineReader:
+    # Reads request lines from the start of startup, so a frontend writing
+    # before "ready" (live PCM chunks in particular) never blocks on a full
+    # pipe; the lines are served in order once the model is up.
+    def __init__(self, stream):
+        self.lines = queue.Queue()
+        self.thread = threading.Thread(
+            target=self.run,
+            args=(stream,),
+            name="StdinLineReader",
+            daemon=True,
+        )
+        self.thread.start()
+
+    def run(self, stream):
+        try:
+            for line in iter(stream.readline, ""):
+                self.lines.put(line)
+        finally:
+            self.lines.put("")
+
+    def readline(self):
+        line = self.lines.get()
+        if not line:
+            self.lines.put(line)
+        return line
+
+    def queued(self):
+        return self.lines.qsize()
+
+
+def run_startup_profile(command=None, environ=None, timeout=600.0):
+    # The child measures its own phases; spawning it from here adds the part
+    # it cannot see: interpreter start-up, module imports and (for a onefile
+    # binary) the archive unpack before main() runs.
+    env = dict(
+        os.environ if environ is None else environ,
+        KOTOTYPE_STARTUP_PROFILE="1",
+        KOTOTYPE_USE_DAEMON="0",
+    )
+    spawned_at = time.time()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        command or server_command(),
+        stdin=subprocess.PIPE,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        env=env,
+    )
+    stdin, stderr = process.stdin, process.stderr
+    assert stdin is not None and stderr is not None
+    killer = threading.Timer(timeout, process.kill)
+    killer.start()
+    ready = None
+    try:
+        for line in stderr:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(event, dict) and event.get("type") == "ready":
+                ready = event
+                break
+        ready_seconds = time.perf_counter() - started
+    finally:
+        killer.cancel()
+        stdin.close()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        stderr.close()
+
+    if ready is None or "startup" not in ready:
+        raise RuntimeError(
+            "Server exited before it was ready (active server limit reached? see server.log)"
+        )
+
+    startup = ready["startup"]
+    phases = {"interpreter": round(max(0.0, startup["main_started_at"] - spawned_at), 4)}
+    phases.update(startup["phases"])
+    report = {
+        "v": PROTOCOL_VERSION,
+        "type": "startup_profile",
+        "ready_seconds": round(ready_seconds, 4),
+        "phases": phases,
+    }
+    for key in ("backend_import_seconds", "queued_lines"):
+        if key in startup:
+            report[key] = startup[key]
+    for key in ("model", "compute_type", "cpu_threads"):
+        if key in ready:
+            report[key] = ready[key]
+    return report
+
+
+def current_rss_mb():
+    # ru_maxrss only ever grows, so it cannot show memory coming back after
+    # an unload; read the live resident size instead.
+    try:
+        with open("/proc/self/statm", "r", encoding="ascii") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        completed = subprocess.run(
+            ["ps", "-o", "rss=", "-p", str(os.getpid())],
+            capture_output=True,
+            text=True,
+            timeout=5,
+        )
+        return int(completed.stdout.strip()) / 1024
+    except Exception:
+        return None
+
+
+def format_model_state_event(state, **details):
+    event = {
+        "v": PROTOCOL_VERSION,
+        "type": "model_state",
+        "state": state,
+        "pid": os.getpid(),
+    }
+    rss = current_rss_mb()
+    if rss is not None:
+        event["rss_mb"] = round(rss, 1)
+    event.update(details)
+    return json.dumps(event, ensure_ascii=False)
+
+
+def write_event_line(line):
+    # stdout is reserved for responses (the app treats every stdout line as a
+    # transcription), so lifecycle events go to stderr.
+    print(line, file=sys.stderr)
+    sys.stderr.flush()
+
+
+class FakeWhisperModel:
+    # Deterministic stand-in used by load tests and benchmarks on machines
+    # without model weights; `rtf` sleeps that fraction of the audio length.
+    def __init__(self, model_size_or_path=None, rtf=0.0, text="テスト音声です", **kwargs):
+        self.model_size_or_path = model_size_or_path
+        self.rtf = max(0.0, rtf)
+        self.text = text
+
+    def transcribe(self, audio, **kwargs):
+        duration = estimate_audio_duration_seconds(audio) or 1.0
+        if self.rtf > 0.0:
+            time.sleep(duration * self.rtf)
+        segment = SimpleNamespace(
+            text=self.text,
+            start=0.0,
+            end=round(duration, 3),
+            avg_logprob=-0.1,
+            no_speech_prob=0.0,
+        )
+        return iter([segment]), SimpleNamespace(language=kwargs.get("language") or "ja")
+
+
+def load_whisper_model_class(environ=None):
+    environ = os.environ if environ is None else environ
+    backend = (environ.get("KOTOTYPE_MODEL_BACKEND") or "faster-whisper").strip().lower()
+    if backend == "fake":
+        rtf = parse_float(environ.get("KOTOTYPE_FAKE_MODEL_RTF"), 0.0)
+        text = environ.get("KOTOTYPE_FAKE_MODEL_TEXT") or "テスト音声です"
+
+        def build_fake_model(model_size_or_path, **kwargs):
+            return FakeWhisperModel(model_size_or_path, rtf=rtf, text=text)
+
+        return build_fake_model
+
+    from faster_whisper import WhisperModel
+
+    return WhisperModel
+
+
+DEFAULT_MODEL_SETTINGS = {
+    "model": "large-v3-turbo",
+    "device": "cpu",
+    "compute_type": "int8",
+    "cpu_threads": 0,
+    "num_workers": 1,
+}
+AUTOTUNE_COMPUTE_TYPES = ("int8", "int8_float32", "float32")
+
+
+def default_model_profile_path():
+    return os.path.expanduser("~/Library/Application Support/koto-type/model_profile.json")
+
+
+def default_autotune_audio_path():
+    return os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        "assets",
+        "audio",
+        "test_speech_ja.wav",
+    )
+
+
+def load_model_profile(profile_path, log=None):
+    try:
+        with open(profile_path, "r", encoding="utf-8") as f:
+            profile = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        if log:
+            log(f"Ignoring unreadable model profile {profile_path}: {str(e)}", level="warning")
+        return {}
+
+    settings = profile.get("settings") if isinstance(profile, dict) else None
+    if not isinstance(settings, dict):
+        return {}
+    return {key: settings[key] for key in DEFAULT_MODEL_SETTINGS if key in settings}
+
+
+def resolve_model_settings(environ=None, profile_path=None, log=None):
+    # Precedence: explicit env vars, then the autotuned profile, then defaults.
+    environ = os.environ if environ is None else environ
+    if profile_path is None:
+        profile_path = environ.get("KOTOTYPE_MODEL_PROFILE_PATH") or default_model_profile_path()
+
+    settings = dict(DEFAULT_MODEL_SETTINGS)
+    source = "defaults"
+    profile = load_model_profile(profile_path, log=log)
+    if profile:
+        settings.update(profile)
+        source = profile_path
+
+    for key, env_name in (
+        ("model", "KOTOTYPE_MODEL"),
+        ("device", "KOTOTYPE_DEVICE"),
+        ("compute_type", "KOTOTYPE_COMPUTE_TYPE"),
+    ):
+        value = (environ.get(env_name) or "").strip()
+        if value:
+            settings[key] = value
+
+    settings["cpu_threads"] = max(
+        0,
+        parse_int(environ.get("KOTOTYPE_CPU_THREADS"), parse_int(settings["cpu_threads"], 0)),
+    )
+    settings["num_workers"] = max(
+        1,
+        parse_int(environ.get("KOTOTYPE_NUM_WORKERS"), parse_int(settings["num_workers"], 1)),
+    )
+    return settings, source
+
+
+def build_autotune_candidates(compute_types, thread_counts, beam_sizes):
+    return [
+        {"compute_type": compute_type, "cpu_threads": cpu_threads, "beam_size": beam_size}
+        for compute_type in compute_types
+        for cpu_threads in thread_counts
+        for beam_size in beam_sizes
+    ]
+
+
+def default_autotune_thread_counts(cpu_count=None):
+    cpu_count = cpu_count or os.cpu_count() or 1
+    return sorted({max(1, cpu_count // 4), max(1, cpu_count // 2), cpu_count})
+
+
+def peak_rss_mb(ru_maxrss, platform=None):
+    # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux.
+    platform = sys.platform if platform is None else platform
+    if platform == "darwin":
+        return ru_maxrss / (1024 * 1024)
+    return ru_maxrss / 1024
+
+
+def run_autotune_trial(settings, audio_path, beam_size, runs):
+    import resource
+
+    from faster_whisper import WhisperModel
+
+    load_started = time.perf_counter()
+    model = WhisperModel(
+        settings["model"],
+        device=settings["device"],
+        compute_type=settings["compute_type"],
+        cpu_threads=settings["cpu_threads"],
+        num_workers=1,
+    )
+    load_seconds = time.perf_counter() - load_started
+
+    audio_duration = estimate_audio_duration_seconds(audio_path) or 0.0
+    transcribe_seconds = []
+    text = ""
+    for _ in range(max(1, runs)):
+        started = time.perf_counter()
+        segments, _ = model.transcribe(audio_path, beam_size=beam_size, language="ja")
+        text = " ".join(segment.text for segment in segments).strip()
+        transcribe_seconds.append(time.perf_counter() - started)
+
+    best_seconds = min(transcribe_seconds)
+    return {
+        "load_seconds": load_seconds,
+        "transcribe_seconds": best_seconds,
+        "audio_seconds": audio_duration,
+        "rtf": best_seconds / audio_duration if audio_duration else None,
+        "peak_rss_mb": peak_rss_mb(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss),
+        "text": text,
+    }
+
+
+def server_command():
+    if getattr(sys, "frozen", False):
+        return [sys.executable]
+    return [sys.executable, os.path.abspath(__file__)]
+
+
+def run_autotune_trial_subprocess(settings, audio_path, beam_size, runs, timeout=None):
+    # Each trial runs in a fresh process so peak RSS belongs to that setting
+    # alone and a crashing compute type cannot take the tuner down with it.
+    trial = {"settings": settings, "audio_path": audio_path, "beam_size": beam_size, "runs": runs}
+    completed = subprocess.run(
+        server_command() + ["--autotune-trial", json.dumps(trial)],
+        capture_output=True,
+        text=True,
+        timeout=timeout,
+    )
+    lines = completed.stdout.strip().splitlines()
+    if completed.returncode != 0 or not lines:
+        message = completed.stderr.strip().splitlines()[-1:] or [f"exit code {completed.returncode}"]
+        raise RuntimeError(message[0])
+    return json.loads(lines[-1])
+
+
+def choose_best_trial(trials, beam_size):
+    candidates = [
+        trial
+        for trial in trials
+        if trial.get("error") is None
+        and trial.get("rtf") is not None
+        and trial["beam_size"] == beam_size
+    ]
+    if not candidates:
+        return None
+    return min(candidates, key=lambda trial: (trial["rtf"], trial["peak_rss_mb"]))
+
+
+def run_autotune(
+    base_settings,
+    audio_path,
+    compute_types,
+    thread_counts,
+    beam_sizes,
+    runs,
+    profile_path,
+    report,
+    trial_runner=run_autotune_trial_subprocess,
+):
+    trials = []
+    for candidate in build_autotune_candidates(compute_types, thread_counts, beam_sizes):
+        settings = dict(base_settings)
+        settings["compute_type"] = candidate["compute_type"]
+        settings["cpu_threads"] = candidate["cpu_threads"]
+        trial = dict(candidate)
+        try:
+            trial.update(trial_runner(settings, audio_path, candidate["beam_size"], runs))
+            trial["error"] = None
+            report(
+                f"compute_type={trial['compute_type']:<13} cpu_threads={trial['cpu_threads']:<3} "
+                f"beam_size={trial['beam_size']:<2} rtf={trial['rtf']:.3f} "
+                f"load={trial['load_seconds']:.1f}s peak_rss={trial['peak_rss_mb']:.0f}MB"
+            )
+        except Exception as e:
+            trial["error"] = str(e)
+            report(
+                f"compute_type={trial['compute_type']:<13} cpu_threads={trial['cpu_threads']:<3} "
+                f"beam_size={trial['beam_size']:<2} failed: {trial['error']}"
+            )
+        trials.append(trial)
+
+    # Beam size trades accuracy for speed, so it is only reported; the saved
+    # profile picks the fastest settings at the reference (first) beam size.
+    best = choose_best_trial(trials, beam_sizes[0])
+    if best is None:
+        report("No successful trial; model profile not updated")
+        return None
+
+    profile = {
+        "version": 1,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "cpu_count": os.cpu_count(),
+        "audio_path": audio_path,
+        "settings": {
+            "model": base_settings["model"],
+            "device": base_settings["device"],
+            "compute_type": best["compute_type"],
+            "cpu_threads": best["cpu_threads"],
+            "num_workers": base_settings["num_workers"],
+        },
+        "trials": trials,
+    }
+    os.makedirs(os.path.dirname(profile_path) or ".", exist_ok=True)
+    temp_path = f"{profile_path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(profile, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, profile_path)
+    report(
+        f"Best: compute_type={best['compute_type']}, cpu_threads={best['cpu_threads']} "
+        f"(rtf={best['rtf']:.3f}); saved to {profile_path}"
+    )
+    return profile
+
+
+def parse_csv_values(value, cast):
+    return [cast(item.strip()) for item in value.split(",") if item.strip()]
+
+
+def build_argument_parser():
+    parser = argparse.ArgumentParser(description="KotoType transcription server")
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="load the model once and serve requests on a Unix domain socket",
+    )
+    parser.add_argument(
+        "--autotune",
+        action="store_true",
+        help="benchmark model settings on this machine and save the best profile",
+    )
+    parser.add_argument("--autotune-audio", default=None)
+    parser.add_argument("--autotune-compute-types", default=",".join(AUTOTUNE_COMPUTE_TYPES))
+    parser.add_argument("--autotune-threads", default=None)
+    parser.add_argument("--autotune-beam-sizes", default="5")
+    parser.add_argument("--autotune-runs", type=int, default=2)
+    parser.add_argument("--autotune-output", default=None)
+    parser.add_argument("--autotune-trial", default=None, help=argparse.SUPPRESS)
+    parser.add_argument(
+        "--startup-profile",
+        action="store_true",
+        help="start a server, report where its cold start time goes as JSON, and exit",
+    )
+    return parser
+
+
+def autotune_main(args):
+    if args.autotune_trial:
+        trial = json.loads(args.autotune_trial)
+        print(
+            json.dumps(
+                run_autotune_trial(
+                    trial["settings"],
+                    trial["audio_path"],
+                    trial["beam_size"],
+                    trial["runs"],
+                )
+            )
+        )
+        return 0
+
+    base_settings, _ = resolve_model_settings(profile_path="")
+    profile_path = args.autotune_output or os.environ.get(
+        "KOTOTYPE_MODEL_PROFILE_PATH"
+    ) or default_model_profile_path()
+    thread_counts = (
+        parse_csv_values(args.autotune_threads, int)
+        if args.autotune_threads
+        else default_autotune_thread_counts()
+    )
+
+    with tempfile.TemporaryDirectory(prefix="kototype_autotune_") as temp_dir:
+        audio_path = args.autotune_audio or default_autotune_audio_path()
+        if not os.path.exists(audio_path):
+            audio_path = os.path.join(temp_dir, "synthetic.wav")
+            write_synthetic_warmup_wav(audio_path, duration_seconds=10.0)
+            print(f"Benchmark audio not found; using synthetic audio at {audio_path}")
+
+        profile = run_autotune(
+            base_settings,
+            audio_path,
+            compute_types=parse_csv_values(args.autotune_compute_types, str),
+            thread_counts=thread_counts,
+            beam_sizes=parse_csv_values(args.autotune_beam_sizes, int),
+            runs=args.autotune_runs,
+            profile_path=profile_path,
+            report=print,
+        )
+    return 0 if profile else 1
+
+
+def main(argv=None):
+    profile = StartupProfile()
+    args = build_argument_parser().parse_args(argv)
+    if args.autotune or args.autotune_trial:
+        return autotune_main(args)
+    if args.startup_profile:
+        try:
+            report = run_startup_profile()
+        except RuntimeError as e:
+            print(str(e), file=sys.stderr)
+            return 1
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return 0
+
+    _log_file, log = setup_logging()
+    daemon_socket_path = (
+        os.environ.get("KOTOTYPE_DAEMON_SOCKET") or default_daemon_socket_path()
+    )
+    if not args.daemon and parse_bool(os.environ.get("KOTOTYPE_USE_DAEMON", "1"), default=True):
+        connection = connect_daemon(daemon_socket_path)
+        if connection is not None:
+            log(f"=== Relay client started (daemon={daemon_socket_path}) ===")
+            write_event_line(format_ready_event(0.0, None, daemon_socket=daemon_socket_path))
+            relay_to_daemon(connection, iter(sys.stdin.readline, ""))
+            log("EOF reached, exiting")
+            return
+
+    log(f"=== Server started{' (daemon)' if args.daemon else ''} ===")
+    if args.daemon:
+        existing = connect_daemon(daemon_socket_path)
+        if existing is not None:
+            existing.close()
+            log(f"Daemon startup skipped: already running on {daemon_socket_path}")
+            return 1
+
+    # Requests can be read (and queued) before inference is available.
+    stdin_reader = None if args.daemon else StdinLineReader(sys.stdin)
+    profile.mark("logging")
+
+    slot_dir = default_server_slot_dir()
+    max_active_servers = max(1, parse_int(os.environ.get("KOTOTYPE_MAX_ACTIVE_SERVERS"), 1))
+    max_parallel_model_loads = max(1, parse_int(os.environ.get("KOTOTYPE_MAX_PARALLEL_MODEL_LOADS"), 1))
+    model_load_wait_timeout = max(1, parse_int(os.environ.get("KOTOTYPE_MODEL_LOAD_WAIT_TIMEOUT_SECONDS"), 120))
+
+    server_slots = LockSlots(slot_dir, "active_server", max_active_servers)
+    if server_slots.try_acquire() is None:
+        log(
+            "Server startup skipped: active server limit reached "
+            f"(max={max_active_servers}, current={server_slots.busy_count()})"
+        )
+        return
+
+    # Admitted: nothing below needs faster-whisper until the model is
+    # constructed, so the import overlaps the load-slot wait. A refused
+    # process never pays for it.
+    backend_import = BackgroundCall(load_whisper_model_class)
+    model_load_slots = LockSlots(slot_dir, "model_load", max_parallel_model_loads)
+
+    def cleanup_server_state():
+        model_load_slots.release()
+        server_slots.release()
+
+    atexit.register(cleanup_server_state)
+
+    for signal_name in ("SIGTERM", "SIGINT"):
+        if hasattr(signal, signal_name):
+            sig = getattr(signal, signal_name)
+
+            def _handler(signum, frame):
+                cleanup_server_state()
+                raise SystemExit(0)
+
+            signal.signal(sig, _handler)
+
+    profile.mark("registration")
+    wait_started = time.perf_counter()
+    if model_load_slots.acquire(timeout=model_load_wait_timeout) is None:
+        log(
+            "Server startup aborted: timed out waiting for model-load slot "
+            f"(timeout={model_load_wait_timeout}s, max_parallel={max_parallel_model_loads})"
+        )
+        cleanup_server_state()
+        return
+
+    waited = time.perf_counter() - wait_started
+    if waited >= 0.01:
+        log(
+            f"Model load slot acquired after waiting {waited:.2f} seconds "
+            f"(max_parallel={max_parallel_model_loads})"
+        )
+    profile.mark("slot_wait")
+
+    max_concurrent_requests = max(
+        1, parse_int(os.environ.get("KOTOTYPE_CONCURRENT_REQUESTS"), 1)
+    )
+    model_settings, model_settings_source = resolve_model_settings(log=log)
+    chunked_min_duration_seconds = max(
+        0.0,
+        parse_float(os.environ.get("KOTOTYPE_CHUNKED_MIN_DURATION_SECONDS"), 0.0),
+    )
+    chunk_workers = max(1, parse_int(os.environ.get("KOTOTYPE_CHUNK_WORKERS"), 2))
+    num_workers = max(max_concurrent_requests, model_settings["num_workers"])
+    if chunked_min_duration_seconds > 0 and chunk_workers > num_workers:
+        # Chunks run on threads sharing the model; CTranslate2 only decodes
+        # them in parallel when it has a worker per thread.
+        log(
+            f"Raising num_workers from {num_workers} to {chunk_workers} "
+            f"for chunked transcription (chunk_workers={chunk_workers})"
+        )
+        num_workers = chunk_workers
+    elif chunk_workers > num_workers:
+        log(
+            f"Per-request chunked transcription will decode chunks serially: "
+            f"num_workers={num_workers} < chunk_workers={chunk_workers} "
+            "(set KOTOTYPE_CHUNKED_MIN_DURATION_SECONDS or KOTOTYPE_NUM_WORKERS to run them in parallel)"
+        )
+    profile.mark("settings")
+
+    WhisperModel = backend_import.result()
+    profile.mark("imports")
+    log(f"Backend imported in {backend_import.seconds:.2f} seconds")
+    log("Loading Whisper model...")
+
+    def load_model():
+        return WhisperModel(
+            model_settings["model"],
+            device=model_settings["device"],
+            compute_type=model_settings["compute_type"],
+            cpu_threads=model_settings["cpu_threads"],
+            num_workers=num_workers,
+        )
+
+    load_started = time.perf_counter()
+    model = load_model()
+    model_load_slots.release()
+    load_seconds = time.perf_counter() - load_started
+    profile.mark("model_load")
+
+    log(
+        f"Model loaded in {load_seconds:.2f} seconds (model={model_settings['model']}, "
+        f"device={model_settings['device']}, compute_type={model_settings['compute_type']}, "
+        f"cpu_threads={model_settings['cpu_threads']}, num_workers={num_workers}, "
+        f"settings_from={model_settings_source})"
+    )
+    log("Using faster-whisper backend")
+
+    preprocess_in_memory = parse_bool(
+        os.environ.get("KOTOTYPE_PREPROCESS_IN_MEMORY", "1"),
+        default=True,
+    )
+    log(f"Audio preprocess mode: {'in-memory' if preprocess_in_memory else 'file'}")
+
+    filter_capabilities = FilterChainCapabilityCache.load(
+        default_filter_capability_cache_path(),
+        detect_ffmpeg_identity(),
+    )
+    log(
+        "FFmpeg filter capability cache: "
+        f"ffmpeg={filter_capabilities.ffmpeg_identity}, "
+        f"known_unsupported={len(filter_capabilities.unsupported)}"
+    )
+
+    result_cache = None
+    if parse_bool(os.environ.get("KOTOTYPE_RESULT_CACHE", "0"), default=False):
+        result_cache = ResultCache(
+            os.environ.get("KOTOTYPE_RESULT_CACHE_DIR") or default_result_cache_dir(),
+            max_entries=parse_int(os.environ.get("KOTOTYPE_RESULT_CACHE_MAX_ENTRIES"), 2000),
+            max_bytes=parse_int(os.environ.get("KOTOTYPE_RESULT_CACHE_MAX_MB"), 64) * 1024 * 1024,
+        )
+        log(f"Result cache enabled: {result_cache.directory}")
+
+    metrics = create_stage_metrics(log)
+    atexit.register(metrics.close)
+    trace = create_trace_recorder(log)
+    if trace is not None:
+        atexit.register(trace.close)
+
+    idle_unload_seconds = max(
+        0.0,
+        parse_float(os.environ.get("KOTOTYPE_IDLE_UNLOAD_SECONDS"), 0.0),
+    )
+    model_holder = ModelHolder(
+        model=model,
+        loader=load_model,
+        log=log,
+        idle_unload_seconds=idle_unload_seconds,
+        load_slots=model_load_slots,
+        load_timeout=model_load_wait_timeout,
+        emit_event=write_event_line,
+    )
+    del model
+
+    runtime = ServerRuntime(
+        model=None,
+        model_holder=model_holder,
+        log=log,
+        preprocess_in_memory=preprocess_in_memory,
+        filter_capabilities=filter_capabilities,
+        dictionary_cache=UserDictionaryCache(),
+        fallback_on_empty_vad=parse_bool(
+            os.environ.get("KOTOTYPE_RETRY_WITHOUT_VAD_ON_EMPTY", "1"),
+            default=True,
+        ),
+        max_concurrent_requests=max_concurrent_requests,
+        batched_min_duration_seconds=max(
+            0.0,
+            parse_float(os.environ.get("KOTOTYPE_BATCHED_MIN_DURATION_SECONDS"), 0.0),
+        ),
+        batch_size=parse_int(os.environ.get("KOTOTYPE_BATCH_SIZE"), 8),
+        live_settings=resolve_live_settings(),
+        silence_gate=resolve_silence_gate_settings(),
+        chunked_min_duration_seconds=chunked_min_duration_seconds,
+        chunk_seconds=parse_float(os.environ.get("KOTOTYPE_CHUNK_SECONDS"), 60.0),
+        chunk_workers=chunk_workers,
+        result_cache=result_cache,
+        result_cache_context=build_result_cache_context(model_settings),
+        metrics=metrics,
+        trace=trace,
+    )
+    profile.mark("runtime_setup")
+
+    warmup_seconds = None
+    if parse_bool(os.environ.get("KOTOTYPE_WARMUP", "1"), default=True):
+        log("Warming up model with synthetic audio...")
+        warmup_seconds = run_warmup(
+            runtime,
+            language=os.environ.get("KOTOTYPE_WARMUP_LANGUAGE", "ja"),
+            duration_seconds=max(
+                0.1,
+                parse_float(os.environ.get("KOTOTYPE_WARMUP_SECONDS"), 1.0),
+            ),
+        )
+        profile.mark("warmup")
+
+    server_socket = None
+    ready_details = {}
+    if args.daemon:
+        try:
+            server_socket = create_daemon_socket(daemon_socket_path, log)
+        except Exception as e:
+            log(f"Daemon startup aborted: {str(e)}", level="error")
+            return 1
+
+        def remove_daemon_socket():
+            server_socket.close()
+            if os.path.exists(daemon_socket_path):
+                os.remove(daemon_socket_path)
+
+        atexit.register(remove_daemon_socket)
+        ready_details["daemon_socket"] = daemon_socket_path
+        log(
+            f"Daemon listening on {daemon_socket_path} "
+            f"(concurrent_requests={max_concurrent_requests})"
+        )
+    else:
+        log(f"Waiting for input from stdin... (concurrent_requests={max_concurrent_requests})")
+    sys.stdout.flush()
+    if model_holder.start_idle_monitor() is not None:
+        log(f"Idle model unload enabled (idle_unload_seconds={idle_unload_seconds:g})")
+    profile.mark("ready")
+    if backend_import.seconds is not None:
+        profile.details["backend_import_seconds"] = round(backend_import.seconds, 4)
+    if stdin_reader is not None:
+        profile.details["queued_lines"] = stdin_reader.queued()
+    log(f"Startup phases: {profile.summary()}")
+    if parse_bool(os.environ.get("KOTOTYPE_STARTUP_PROFILE", "0"), default=False):
+        ready_details["startup"] = profile.as_dict()
+    write_event_line(
+        format_ready_event(
+            load_seconds,
+            warmup_seconds,
+            concurrent_requests=max_concurrent_requests,
+            model=model_settings["model"],
+            compute_type=model_settings["compute_type"],
+            cpu_threads=model_settings["cpu_threads"],
+            **ready_details,
+        )
+    )
+
+    if server_socket is not None:
+        serve_daemon(runtime, server_socket)
+        return
+
+    assert stdin_reader is not None
+    if max_concurrent_requests > 1:
+        serve_concurrently(
+            runtime,
+            iter(stdin_reader.readline, ""),
+            max_workers=max_concurrent_requests,
+        )
+        log("EOF reached, exiting")
+        return
+
+    pipeline_depth = max(0, parse_int(os.environ.get("KOTOTYPE_PIPELINE_DEPTH"), 2))
+    if pipeline_depth > 0:
+        log(f"Overlapping preprocessing with transcription (pipeline_depth={pipeline_depth})")
+        serve_pipelined(runtime, iter(stdin_reader.readline, ""), depth=pipeline_depth)
+        log("EOF reached, exiting")
+        return
+
+    while True:
+        line = stdin_reader.readline()
+        if not line:
+            log("EOF reached, exiting")
+            break
+
+        serve_request_line(runtime, line)
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import itertools
+import json
+import os
+import queue
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT / "python"))
+
+import whisper_server  # noqa: E402
+
+SERVER_SCRIPT = PROJECT_ROOT / "python" / "whisper_server.py"
+FINAL_RESPONSE_TYPES = {"result", "done", "error"}
+
+
+def load_trace(path):
+    entries = []
+    with open(path, "r", encoding="utf-8") as trace_file:
+        for line in trace_file:
+            if line.strip():
+                entries.append(json.loads(line))
+    entries.sort(key=lambda entry: entry["ts"])
+    return entries
+
+
+def resolve_trace_audio(entry, trace_path, work_dir):
+    # Prefer the copy captured with the trace, then the original file if it
+    # still has the recorded content, and finally a synthetic clip of the
+    # same length so hash-only traces still reproduce the load shape.
+    if entry.get("copy"):
+        copy_path = os.path.join(f"{trace_path}.audio", entry["copy"])
+        if os.path.exists(copy_path):
+            return copy_path, "copy"
+
+    audio_path = entry.get("audio")
+    if (
+        audio_path
+        and os.path.exists(audio_path)
+        and (entry.get("sha256") is None or whisper_server.hash_file(audio_path) == entry["sha256"])
+    ):
+        return audio_path, "original"
+
+    seconds = entry.get("seconds") or 2.0
+    synthetic_path = os.path.join(work_dir, f"synthetic_{seconds:.3f}.wav")
+    if not os.path.exists(synthetic_path):
+        whisper_server.write_synthetic_warmup_wav(synthetic_path, duration_seconds=seconds)
+    return synthetic_path, "synthetic"
+
+
+def build_replay_request(entry, audio_path, request_id):
+    # Legacy lines are answered strictly in order and carry no id, so every
+    # request is replayed as JSON with its original parameters.
+    request = whisper_server.parse_request_line(entry["line"], lambda _: None)
+    payload = {
+        key: request[key]
+        for key in (
+            "language",
+            "temperature",
+            "beam_size",
+            "no_speech_threshold",
+            "compression_ratio_threshold",
+            "task",
+            "best_of",
+            "vad_threshold",
+            "auto_punctuation",
+            "auto_gain_enabled",
+            "auto_gain_weak_threshold_dbfs",
+            "auto_gain_target_peak_dbfs",
+            "auto_gain_max_db",
+            "batched",
+            "chunked",
+            "screenshot_context",
+        )
+        if request.get(key) is not None
+    }
+    payload.update({"v": whisper_server.PROTOCOL_VERSION, "id": request_id, "audio": audio_path})
+    return json.dumps(payload, ensure_ascii=False)
+
+
+def build_schedule(entries, rate, speed, repeat, seed):
+    # Arrival offsets in seconds: the recorded spacing scaled by `speed`, or a
+    # Poisson process at `rate` requests per second when a rate is given.
+    schedule = []
+    generator = random.Random(seed)
+    offset = 0.0
+    for round_index in range(repeat):
+        first_ts = entries[0]["ts"]
+        round_start = offset
+        for entry in entries:
+            if rate > 0:
+                offset += generator.expovariate(rate)
+            elif speed > 0:
+                offset = round_start + (entry["ts"] - first_ts) / speed
+            schedule.append((offset, entry))
+        if rate <= 0 and speed > 0:
+            offset += 1.0 / speed
+    return schedule
+
+
+def percentile(values, percent):
+    return whisper_server.nearest_rank_percentile(sorted(values), percent)
+
+
+class ServerProcess:
+    def __init__(self, index, env, concurrency):
+        self.index = index
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.process = subprocess.Popen(
+            [sys.executable, str(SERVER_SCRIPT)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            env=env,
+        )
+
+    def wait_ready(self):
+        while True:
+            line = self.process.stderr.readline()
+            if not line:
+                raise RuntimeError(f"Server {self.index} exited before it was ready")
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if event.get("type") == "ready":
+                threading.Thread(target=self.drain_stderr, daemon=True).start()
+                return event
+
+    def drain_stderr(self):
+        for _ in self.process.stderr:
+            pass
+
+    def send(self, request_id, line, on_sent):
+        self.slots.acquire()
+        with self.lock:
+            self.pending[request_id] = time.perf_counter()
+        on_sent()
+        self.process.stdin.write(line + "\n")
+        self.process.stdin.flush()
+
+    def read_responses(self, results):
+        for line in self.process.stdout:
+            try:
+                response = json.loads(line)
+            except ValueError:
+                continue
+            if response.get("type") not in FINAL_RESPONSE_TYPES:
+                continue
+            received = time.perf_counter()
+            with self.lock:
+                sent = self.pending.pop(response.get("id"), None)
+            if sent is None:
+                continue
+            self.slots.release()
+            results.put((self.index, sent, received, response))
+
+    def close(self):
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.process.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+
+def build_server_env(args, work_dir):
+    env = dict(
+        os.environ,
+        KOTOTYPE_USE_DAEMON="0",
+        KOTOTYPE_CONCURRENT_REQUESTS=str(args.concurrency),
+        KOTOTYPE_MAX_ACTIVE_SERVERS=str(args.servers),
+        KOTOTYPE_RESULT_CACHE="1" if args.result_cache else "0",
+    )
+    env.pop("KOTOTYPE_TRACE_PATH", None)
+    if args.fake_model:
+        # Slots, logs and metrics go to a scratch home so replays never touch
+        # the installed app's state.
+        home_dir = os.path.join(work_dir, "home")
+        os.makedirs(home_dir, exist_ok=True)
+        env.update(
+            HOME=home_dir,
+            KOTOTYPE_MODEL_BACKEND="fake",
+            KOTOTYPE_FAKE_MODEL_RTF=str(args.fake_rtf),
+        )
+    return env
+
+
+def replay(args):
+    entries = load_trace(args.trace)
+    if not entries:
+        print(f"Trace is empty: {args.trace}", file=sys.stderr)
+        return 1
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        audio_sources = {}
+        prepared = []
+        for entry in entries:
+            audio_path, source = resolve_trace_audio(entry, args.trace, work_dir)
+            audio_sources[source] = audio_sources.get(source, 0) + 1
+            prepared.append(dict(entry, replay_audio=audio_path))
+        schedule = build_schedule(prepared, args.rate, args.speed, args.repeat, args.seed)
+
+        env = build_server_env(args, work_dir)
+        startup_started = time.perf_counter()
+        servers = [ServerProcess(index, env, args.concurrency) for index in range(args.servers)]
+        results = queue.Queue()
+        try:
+            ready_events = [server.wait_ready() for server in servers]
+            startup_seconds = time.perf_counter() - startup_started
+            readers = [
+                threading.Thread(target=server.read_responses, args=(results,), daemon=True)
+                for server in servers
+            ]
+            for reader in readers:
+                reader.start()
+
+            request_ids = itertools.count(1)
+            send_delays = []
+            replay_started = time.perf_counter()
+            for index, (offset, entry) in enumerate(schedule):
+                delay = replay_started + offset - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                server = servers[index % len(servers)]
+                request_id = f"replay-{next(request_ids)}"
+                line = build_replay_request(entry, entry["replay_audio"], request_id)
+
+                def on_sent(offset=offset):
+                    send_delays.append(time.perf_counter() - replay_started - offset)
+
+                server.send(request_id, line, on_sent)
+
+            completed = [results.get(timeout=args.timeout) for _ in schedule]
+            wall_seconds = time.perf_counter() - replay_started
+        finally:
+            for server in servers:
+                server.close()
+
+    # Children have exited, so their high-water mark is now reported.
+    peak_rss = whisper_server.peak_rss_mb(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+    latencies = [received - sent for _, sent, received, _ in completed]
+    queue_waits = [
+        response.get("timings", {}).get("queue_wait", 0.0)
+        for _, _, _, response in completed
+    ]
+    errors = [response for _, _, _, response in completed if response.get("type") == "error"]
+    audio_seconds = sum(entry.get("seconds") or 0.0 for _, entry in schedule)
+    report = {
+        "trace": args.trace,
+        "requests": len(completed),
+        "errors": len(errors),
+        "servers": args.servers,
+        "concurrency": args.concurrency,
+        "fake_model": args.fake_model,
+        "audio_sources": audio_sources,
+        "startup_seconds": round(startup_seconds, 3),
+        "load_seconds": [event.get("load_seconds") for event in ready_events],
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_rps": round(len(completed) / wall_seconds, 3) if wall_seconds else None,
+        "audio_seconds_per_second": round(audio_seconds / wall_seconds, 3) if wall_seconds else None,
+        "latency": {
+            f"p{percent}": round(percentile(latencies, percent), 4) for percent in (50, 95, 99)
+        },
+        "client_send_delay_max": round(max(send_delays), 4) if send_delays else 0.0,
+        "queue_wait": {
+            f"p{percent}": round(percentile(queue_waits, percent), 4) for percent in (50, 95, 99)
+        },
+        "peak_rss_mb": round(peak_rss, 1),
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(report, output_file, ensure_ascii=False, indent=2)
+    return 1 if errors and args.fail_on_error else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay a whisper_server trace (KOTOTYPE_TRACE_PATH) against fresh server processes"
+    )
+    parser.add_argument("trace", help="trace file written by whisper_server")
+    parser.add_argument("--servers", type=int, default=1, help="server processes to start")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="in-flight requests per server (also KOTOTYPE_CONCURRENT_REQUESTS)")
+    parser.add_argument("--rate", type=float, default=0.0,
+                        help="Poisson arrival rate in requests/s (default: recorded timing)")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="time-scale for recorded timing; 0 sends as fast as slots allow")
+    parser.add_argument("--repeat", type=int, default=1, help="replay the trace this many times")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fake-model", action="store_true",
+                        help="use the deterministic fake backend (no model weights needed)")
+    parser.add_argument("--fake-rtf", type=float, default=0.05,
+                        help="fake decoder cost as a fraction of audio length")
+    parser.add_argument("--result-cache", action="store_true", help="leave the result cache on")
+    parser.add_argument("--timeout", type=float, default=600.0, help="seconds to wait per response")
+    parser.add_argument("--output", help="also write the report as JSON to this path")
+    parser.add_argument("--fail-on-error", action="store_true")
+    args = parser.parse_args()
+    args.servers = max(1, args.servers)
+    args.concurrency = max(1, args.concurrency)
+    args.repeat = max(1, args.repeat)
+    return replay(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,13 +1,20 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import math
 import os
 import sys
 import tempfile
 import unittest
+import wave
 from pathlib import Path
 from types import SimpleNamespace
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
 sys.path.insert(0, str(PROJECT_ROOT / "python"))
 
@@ -44,7 +51,7 @@ class AudioPreprocessTests(unittest.TestCase):
 
             logs = []
 
-            def capture_log(message):
+            def capture_log(message, level=None):
                 logs.append(message)
 
             original_env = os.environ.get("KOTOTYPE_ENABLE_NOISE_REDUCTION")
@@ -90,7 +97,7 @@ class AudioPreprocessTests(unittest.TestCase):
 
             logs = []
 
-            def capture_log(message):
+            def capture_log(message, level=None):
                 logs.append(message)
 
             original_noise_env = os.environ.get("KOTOTYPE_ENABLE_NOISE_REDUCTION")
@@ -133,7 +140,7 @@ class AudioPreprocessTests(unittest.TestCase):
             try:
                 whisper_server.audio_preprocess(
                     str(input_path),
-                    lambda _: None,
+                    lambda message, level=None: None,
                     ffmpeg_module=fake_ffmpeg,
                     peak_analyzer=lambda _: -40.0,
                     auto_gain_enabled=True,
@@ -167,6 +174,36 @@ class AudioPreprocessTests(unittest.TestCase):
         )
         self.assertEqual(no_gain, 0.0)
 
+    def test_determine_gain_caps_noise_floor_lift(self):
+        gain = whisper_server.determine_gain_for_weak_audio(
+            peak_dbfs=-30.0,
+            weak_threshold_dbfs=-18.0,
+            target_peak_dbfs=-10.0,
+            max_gain_db=18.0,
+            noise_floor_dbfs=-50.0,
+            max_noise_floor_dbfs=-40.0,
+        )
+        self.assertEqual(gain, 10.0)
+
+    def test_noise_floor_cap_is_off_unless_configured(self):
+        stats = whisper_server.AudioLevelStats(-30.0, -36.0, 0, -45.0, 1, 16000, 0.5, 0.1)
+        original_env = os.environ.pop("KOTOTYPE_AUTO_GAIN_MAX_NOISE_FLOOR_DBFS", None)
+        try:
+            default_gain = whisper_server.analyze_and_determine_gain(
+                lambda _: stats, "input.wav", lambda message, level=None: None, -18.0, -10.0, 18.0
+            )
+            os.environ["KOTOTYPE_AUTO_GAIN_MAX_NOISE_FLOOR_DBFS"] = "-40"
+            capped_gain = whisper_server.analyze_and_determine_gain(
+                lambda _: stats, "input.wav", lambda message, level=None: None, -18.0, -10.0, 18.0
+            )
+        finally:
+            os.environ.pop("KOTOTYPE_AUTO_GAIN_MAX_NOISE_FLOOR_DBFS", None)
+            if original_env is not None:
+                os.environ["KOTOTYPE_AUTO_GAIN_MAX_NOISE_FLOOR_DBFS"] = original_env
+
+        self.assertEqual(default_gain, 18.0)
+        self.assertEqual(capped_gain, 5.0)
+
     def test_build_vad_parameters_strict_mode_default(self):
         original_env = os.environ.get("KOTOTYPE_VAD_STRICT")
         os.environ.pop("KOTOTYPE_VAD_STRICT", None)
@@ -218,6 +255,211 @@ class AudioPreprocessTests(unittest.TestCase):
         self.assertFalse(whisper_server.should_retry_without_vad(unrelated))
 
 
+class FilterChainCapabilityCacheTests(unittest.TestCase):
+    def run_preprocess(self, fake_ffmpeg, filter_capabilities, input_path):
+        original_env = os.environ.get("KOTOTYPE_ENABLE_NOISE_REDUCTION")
+        os.environ["KOTOTYPE_ENABLE_NOISE_REDUCTION"] = "1"
+        try:
+            return whisper_server.audio_preprocess(
+                input_path,
+                lambda message, level=None: None,
+                ffmpeg_module=fake_ffmpeg,
+                auto_gain_enabled=False,
+                filter_capabilities=filter_capabilities,
+            )
+        finally:
+            if original_env is None:
+                os.environ.pop("KOTOTYPE_ENABLE_NOISE_REDUCTION", None)
+            else:
+                os.environ["KOTOTYPE_ENABLE_NOISE_REDUCTION"] = original_env
+
+    def test_unsupported_chains_are_cached_per_ffmpeg_identity(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cache_path = str(Path(temp_dir) / "ffmpeg_filter_cache.json")
+            input_path = Path(temp_dir) / "input.wav"
+            input_path.write_bytes(b"dummy")
+
+            first_ffmpeg = FakeFFmpegModule(fail_on_denoise=True)
+            capabilities = whisper_server.FilterChainCapabilityCache.load(
+                cache_path, "ffmpeg|version 7.0"
+            )
+            self.run_preprocess(first_ffmpeg, capabilities, str(input_path))
+            # Two failed real runs, two confirming probes, one successful run.
+            self.assertEqual(first_ffmpeg.run_call_count, 5)
+            self.assertEqual(len(capabilities.unsupported), 2)
+
+            second_ffmpeg = FakeFFmpegModule(fail_on_denoise=True)
+            reloaded = whisper_server.FilterChainCapabilityCache.load(
+                cache_path, "ffmpeg|version 7.0"
+            )
+            output_path = self.run_preprocess(second_ffmpeg, reloaded, str(input_path))
+            self.assertTrue(output_path.endswith("_processed.wav"))
+            self.assertEqual(second_ffmpeg.run_call_count, 1)
+            self.assertNotIn("afftdn", second_ffmpeg.filter_history[0])
+
+            other_binary = whisper_server.FilterChainCapabilityCache.load(
+                cache_path, "ffmpeg|version 6.1"
+            )
+            self.assertEqual(other_binary.unsupported, set())
+
+    def test_input_specific_failures_are_not_cached(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cache_path = str(Path(temp_dir) / "ffmpeg_filter_cache.json")
+            fake_ffmpeg = FakeFFmpegModule(fail_on_real_input=True)
+            capabilities = whisper_server.FilterChainCapabilityCache.load(
+                cache_path, "ffmpeg|version 7.0"
+            )
+
+            output_path = self.run_preprocess(fake_ffmpeg, capabilities, "broken.wav")
+
+            self.assertEqual(output_path, "broken.wav")
+            self.assertEqual(capabilities.unsupported, set())
+            self.assertEqual(len(capabilities.supported), 3)
+            self.assertEqual(fake_ffmpeg.input_history.count("broken.wav"), 3)
+
+
+class LevelAnalysisTests(unittest.TestCase):
+    def write_wav(self, directory, samples, channel_count=1):
+        path = Path(directory) / "levels.wav"
+        with wave.open(str(path), "wb") as wav_file:
+            wav_file.setnchannels(channel_count)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(whisper_server.SAMPLE_RATE)
+            wav_file.writeframes(
+                b"".join(
+                    int(value).to_bytes(2, byteorder="little", signed=True)
+                    for value in samples
+                )
+            )
+        return str(path)
+
+    def test_analyze_wav_levels_reports_all_channels(self):
+        # Interleaved stereo: the loud sample lives in the right channel only.
+        samples = [0, 0] * 400 + [100, 32767, -100, -32768] + [0, 0] * 400
+        with tempfile.TemporaryDirectory() as temp_dir:
+            wav_path = self.write_wav(temp_dir, samples, channel_count=2)
+            stats = whisper_server.analyze_wav_levels(wav_path, use_numpy=False)
+
+        self.assertEqual(stats.channel_count, 2)
+        self.assertEqual(stats.frame_count, 802)
+        self.assertEqual(stats.clip_count, 2)
+        self.assertAlmostEqual(stats.peak_dbfs, 20.0 * math.log10(32768 / 32767))
+        self.assertEqual(stats.noise_floor_dbfs, float("-inf"))
+        self.assertLess(stats.rms_dbfs, stats.peak_dbfs)
+
+    @unittest.skipIf(numpy is None, "numpy is required for vectorized analysis")
+    def test_numpy_and_memoryview_analyzers_agree(self):
+        samples = [int(8000 * ((index % 37) / 37.0 - 0.5)) for index in range(5000)]
+        with tempfile.TemporaryDirectory() as temp_dir:
+            wav_path = self.write_wav(temp_dir, samples)
+            vectorized = whisper_server.analyze_wav_levels(wav_path)
+            fallback = whisper_server.analyze_wav_levels(wav_path, use_numpy=False)
+
+        for field in (
+            "peak_dbfs",
+            "rms_dbfs",
+            "noise_floor_dbfs",
+            "speech_ratio",
+            "zero_crossing_rate",
+        ):
+            self.assertAlmostEqual(getattr(vectorized, field), getattr(fallback, field))
+        self.assertEqual(vectorized.clip_count, fallback.clip_count)
+        self.assertEqual(vectorized.frame_count, 5000)
+
+    def test_analyze_wav_peak_dbfs_returns_silence_as_negative_infinity(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            wav_path = self.write_wav(temp_dir, [0] * 100)
+            self.assertEqual(
+                whisper_server.analyze_wav_peak_dbfs(wav_path),
+                float("-inf"),
+            )
+
+
+@unittest.skipIf(numpy is None, "numpy is required for in-memory preprocessing")
+class InMemoryPreprocessTests(unittest.TestCase):
+    def test_in_memory_preprocess_returns_array_without_temp_files(self):
+        samples = numpy.array([0.0, 0.5, -0.25, 0.1], dtype=numpy.float32)
+        fake_ffmpeg = FakeFFmpegModule(pcm_output=samples.tobytes())
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            input_path = Path(temp_dir) / "input.wav"
+            input_path.write_bytes(b"dummy")
+
+            audio = whisper_server.audio_preprocess_in_memory(
+                str(input_path),
+                lambda message, level=None: None,
+                ffmpeg_module=fake_ffmpeg,
+                auto_gain_enabled=True,
+            )
+
+            self.assertEqual(sorted(os.listdir(temp_dir)), ["input.wav"])
+
+        self.assertEqual(audio.dtype, numpy.float32)
+        numpy.testing.assert_array_equal(audio, samples)
+        self.assertEqual(fake_ffmpeg.run_call_count, 1)
+
+    def test_in_memory_preprocess_applies_gain_without_second_ffmpeg_run(self):
+        samples = numpy.zeros(whisper_server.SAMPLE_RATE, dtype=numpy.float32)
+        samples[8000:8003] = [0.0, 0.01, -0.02]
+        fake_ffmpeg = FakeFFmpegModule(pcm_output=samples.tobytes())
+        logs = []
+
+        audio = whisper_server.audio_preprocess_in_memory(
+            "input.wav",
+            logs.append,
+            ffmpeg_module=fake_ffmpeg,
+            auto_gain_enabled=True,
+            auto_gain_weak_threshold_dbfs=-18.0,
+            auto_gain_target_peak_dbfs=-10.0,
+            auto_gain_max_db=18.0,
+        )
+
+        self.assertEqual(fake_ffmpeg.run_call_count, 1)
+        self.assertAlmostEqual(
+            whisper_server.analyze_array_peak_dbfs(audio),
+            whisper_server.analyze_array_peak_dbfs(samples) + 18.0,
+            places=3,
+        )
+        self.assertTrue(
+            any("Applied automatic gain for weak input" in line for line in logs)
+        )
+
+    def test_in_memory_preprocess_retries_without_denoise_filter(self):
+        samples = numpy.array([0.25, -0.25], dtype=numpy.float32)
+        fake_ffmpeg = FakeFFmpegModule(
+            fail_on_denoise=True,
+            pcm_output=samples.tobytes(),
+        )
+
+        original_env = os.environ.get("KOTOTYPE_ENABLE_NOISE_REDUCTION")
+        os.environ["KOTOTYPE_ENABLE_NOISE_REDUCTION"] = "1"
+        try:
+            audio = whisper_server.audio_preprocess_in_memory(
+                "input.wav",
+                lambda message, level=None: None,
+                ffmpeg_module=fake_ffmpeg,
+                auto_gain_enabled=False,
+            )
+        finally:
+            if original_env is None:
+                os.environ.pop("KOTOTYPE_ENABLE_NOISE_REDUCTION", None)
+            else:
+                os.environ["KOTOTYPE_ENABLE_NOISE_REDUCTION"] = original_env
+
+        self.assertEqual(fake_ffmpeg.run_call_count, 3)
+        self.assertNotIn("afftdn", fake_ffmpeg.filter_history[2])
+        numpy.testing.assert_array_equal(audio, samples)
+
+    def test_apply_gain_to_array_limits_peaks(self):
+        samples = numpy.array([0.5, -0.6], dtype=numpy.float32)
+        boosted = whisper_server.apply_gain_to_array(samples, 12.0)
+        self.assertEqual(boosted.dtype, numpy.float32)
+        self.assertLessEqual(float(abs(boosted).max()), 0.98 + 1e-6)
+        numpy.testing.assert_array_equal(
+            samples, numpy.array([0.5, -0.6], dtype=numpy.float32)
+        )
+
+
 class TranscriptionFallbackTests(unittest.TestCase):
     def test_retry_without_vad_when_vad_result_is_empty(self):
         model = FakeTranscribeModel(
@@ -242,7 +484,7 @@ class TranscriptionFallbackTests(unittest.TestCase):
                 "compression_ratio_threshold": 2.4,
             },
             vad_parameters={"threshold": 0.57},
-            log=logs.append,
+            log=lambda message, level=None: logs.append(message),
             fallback_on_empty_vad=True,
         )
 
@@ -279,7 +521,7 @@ class TranscriptionFallbackTests(unittest.TestCase):
                 "compression_ratio_threshold": 2.4,
             },
             vad_parameters={"threshold": 0.57},
-            log=lambda _: None,
+            log=lambda message, level=None: None,
             fallback_on_empty_vad=True,
         )
 
@@ -314,7 +556,7 @@ class TranscriptionFallbackTests(unittest.TestCase):
                 "compression_ratio_threshold": 2.4,
             },
             vad_parameters={"threshold": 0.57},
-            log=logs.append,
+            log=lambda message, level=None: logs.append(message),
             fallback_on_empty_vad=True,
         )
 
@@ -325,24 +567,266 @@ class TranscriptionFallbackTests(unittest.TestCase):
             any("missing vad asset" in message.lower() for message in logs)
         )
 
+    def test_retry_after_partial_pass_does_not_restream_segments(self):
+        def failing_midway():
+            yield SimpleNamespace(text="前半", start=0.0, end=2.0)
+            raise Exception("NO_SUCHFILE : silero_vad_v6.onnx")
+
+        model = FakeTranscribeModel(
+            responses=[
+                (failing_midway(), SimpleNamespace(language="ja")),
+                (
+                    iter(
+                        [
+                            SimpleNamespace(text="前半", start=0.0, end=2.1),
+                            SimpleNamespace(text="後半", start=2.1, end=4.0),
+                        ]
+                    ),
+                    SimpleNamespace(language="ja"),
+                ),
+            ]
+        )
+        streamed = []
+        segments, _ = whisper_server.transcribe_with_vad_fallback(
+            model=model,
+            transcribe_kwargs={
+                "audio": "dummy.wav",
+                "language": "ja",
+                "task": "transcribe",
+                "temperature": 0.0,
+                "beam_size": 5,
+                "best_of": 5,
+                "word_timestamps": False,
+                "initial_prompt": None,
+                "no_speech_threshold": 0.6,
+                "compression_ratio_threshold": 2.4,
+            },
+            vad_parameters={"threshold": 0.57},
+            log=lambda message, level=None: None,
+            on_segment=lambda segment, _: streamed.append(segment.text),
+        )
+
+        self.assertEqual([segment.text for segment in segments], ["前半", "後半"])
+        self.assertEqual(streamed, ["前半", "後半"])
+
+
+class VadReuseFallbackTests(unittest.TestCase):
+    def transcribe(self, model, vad_helpers, audio="quiet.wav"):
+        return whisper_server.transcribe_with_vad_fallback(
+            model=model,
+            transcribe_kwargs={
+                "audio": audio,
+                "language": "ja",
+                "task": "transcribe",
+                "temperature": 0.0,
+                "beam_size": 5,
+                "best_of": 5,
+                "word_timestamps": False,
+                "initial_prompt": None,
+                "no_speech_threshold": 0.6,
+                "compression_ratio_threshold": 2.4,
+            },
+            vad_parameters={"threshold": 0.57},
+            log=lambda message, level=None: None,
+            vad_helpers=vad_helpers,
+        )
+
+    def fake_helpers(self, speech_timestamps, decoded, calls):
+        def decode_audio(path, sampling_rate):
+            calls.append(("decode", path, sampling_rate))
+            return decoded
+
+        def get_speech_timestamps(audio, options):
+            calls.append(("vad", options.threshold))
+            return speech_timestamps
+
+        def vad_options(**kwargs):
+            return SimpleNamespace(**kwargs)
+
+        return decode_audio, get_speech_timestamps, vad_options
+
+    def test_retry_covers_only_regions_vad_dropped(self):
+        model = FakeTranscribeModel(
+            responses=[
+                ([SimpleNamespace(text="")], SimpleNamespace(language="ja")),
+                ([SimpleNamespace(text="小さな声")], SimpleNamespace(language="ja")),
+            ]
+        )
+        decoded = [0.0] * (5 * whisper_server.SAMPLE_RATE)
+        calls = []
+        segments, _ = self.transcribe(
+            model,
+            self.fake_helpers([{"start": 16000, "end": 32000}], decoded, calls),
+        )
+
+        self.assertEqual(segments[0].text, "小さな声")
+        self.assertEqual(calls, [("decode", "quiet.wav", 16000), ("vad", 0.57)])
+        retry_kwargs = model.kwargs_history[1]
+        self.assertFalse(retry_kwargs["vad_filter"])
+        self.assertEqual(retry_kwargs["clip_timestamps"], [0.0, 1.2, 1.8, 5.0])
+
+    def test_in_memory_audio_is_not_decoded_again(self):
+        model = FakeTranscribeModel(
+            responses=[
+                ([], SimpleNamespace(language="ja")),
+                ([SimpleNamespace(text="はい")], SimpleNamespace(language="ja")),
+            ]
+        )
+        calls = []
+        self.transcribe(
+            model,
+            self.fake_helpers([], None, calls),
+            audio=[0.0] * whisper_server.SAMPLE_RATE,
+        )
+        self.assertEqual(calls, [("vad", 0.57)])
+        self.assertEqual(model.kwargs_history[1]["clip_timestamps"], [0.0, 1.0])
+
+    def test_no_retry_when_vad_dropped_nothing(self):
+        model = FakeTranscribeModel(responses=[([], SimpleNamespace(language="ja"))])
+        decoded = [0.0] * whisper_server.SAMPLE_RATE
+        segments, _ = self.transcribe(
+            model,
+            self.fake_helpers([{"start": 0, "end": 16000}], decoded, []),
+        )
+        self.assertEqual(segments, [])
+        self.assertEqual(model.vad_filter_history, [True])
+
+    def test_full_retry_when_vad_cannot_be_reused(self):
+        def broken_decode(path, sampling_rate):
+            raise RuntimeError("cannot decode")
+
+        model = FakeTranscribeModel(
+            responses=[
+                ([], SimpleNamespace(language="ja")),
+                ([SimpleNamespace(text="全体")], SimpleNamespace(language="ja")),
+            ]
+        )
+        segments, _ = self.transcribe(model, (broken_decode, None, None))
+
+        self.assertEqual(segments[0].text, "全体")
+        self.assertNotIn("clip_timestamps", model.kwargs_history[1])
+
+    def test_dropped_regions_skip_short_gaps_and_merge_padding(self):
+        rate = whisper_server.SAMPLE_RATE
+        regions = whisper_server.find_vad_dropped_regions(
+            [
+                {"start": 1 * rate, "end": 2 * rate},
+                {"start": int(2.1 * rate), "end": 3 * rate},
+                {"start": int(3.5 * rate), "end": 4 * rate},
+            ],
+            total_samples=4 * rate,
+        )
+        self.assertEqual(regions, [(0.0, 1.2), (2.8, 3.7)])
+
+
+class BatchedInferenceTests(unittest.TestCase):
+    def test_should_use_batched_inference(self):
+        self.assertFalse(whisper_server.should_use_batched_inference(None, 3600.0, 0.0))
+        self.assertTrue(whisper_server.should_use_batched_inference(None, 600.0, 300.0))
+        self.assertFalse(whisper_server.should_use_batched_inference(None, 10.0, 300.0))
+        self.assertFalse(whisper_server.should_use_batched_inference(None, None, 300.0))
+        self.assertTrue(whisper_server.should_use_batched_inference(True, 10.0, 0.0))
+        self.assertFalse(whisper_server.should_use_batched_inference(False, 3600.0, 300.0))
+
+    def test_build_fixed_clip_timestamps(self):
+        clips = whisper_server.build_fixed_clip_timestamps(65.0)
+        self.assertEqual(
+            clips,
+            [
+                {"start": 0.0, "end": 30.0},
+                {"start": 30.0, "end": 60.0},
+                {"start": 60.0, "end": 65.0},
+            ],
+        )
+        self.assertIsNone(whisper_server.build_fixed_clip_timestamps(None))
+
+    def test_batched_retry_splits_long_dropped_regions(self):
+        model = FakeTranscribeModel(responses=[([], SimpleNamespace(language="ja"))])
+        whisper_server.transcribe_once(
+            model,
+            {
+                "audio": "long.wav",
+                "batch_size": 8,
+                "clip_regions": [(0.0, 1.5), (5.0, 70.0)],
+                "language": "ja",
+                "task": "transcribe",
+                "temperature": 0.0,
+                "beam_size": 5,
+                "best_of": 5,
+                "word_timestamps": False,
+                "initial_prompt": None,
+                "no_speech_threshold": 0.6,
+                "compression_ratio_threshold": 2.4,
+            },
+            vad_filter=False,
+        )
+
+        self.assertEqual(
+            model.kwargs_history[0]["clip_timestamps"],
+            [
+                {"start": 0.0, "end": 1.5},
+                {"start": 5.0, "end": 35.0},
+                {"start": 35.0, "end": 65.0},
+                {"start": 65.0, "end": 70.0},
+            ],
+        )
+
+    def test_batched_fallback_passes_batch_size_and_clips(self):
+        model = FakeTranscribeModel(
+            responses=[
+                ([], SimpleNamespace(language="ja")),
+                ([SimpleNamespace(text="会議")], SimpleNamespace(language="ja")),
+            ]
+        )
+        segments, _ = whisper_server.transcribe_with_vad_fallback(
+            model=model,
+            transcribe_kwargs={
+                "audio": "long.wav",
+                "audio_duration": 45.0,
+                "batch_size": 8,
+                "language": "ja",
+                "task": "transcribe",
+                "temperature": 0.0,
+                "beam_size": 5,
+                "best_of": 5,
+                "word_timestamps": False,
+                "initial_prompt": None,
+                "no_speech_threshold": 0.6,
+                "compression_ratio_threshold": 2.4,
+            },
+            vad_parameters={"threshold": 0.57},
+            log=lambda message, level=None: None,
+        )
+
+        self.assertEqual(segments[0].text, "会議")
+        self.assertEqual(model.kwargs_history[0]["batch_size"], 8)
+        self.assertNotIn("clip_timestamps", model.kwargs_history[0])
+        self.assertEqual(len(model.kwargs_history[1]["clip_timestamps"]), 2)
+
 
 class FakeFFmpegModule:
-    def __init__(self, fail_on_denoise=False):
+    def __init__(self, fail_on_denoise=False, pcm_output=b"", fail_on_real_input=False):
         self.fail_on_denoise = fail_on_denoise
+        self.fail_on_real_input = fail_on_real_input
+        self.pcm_output = pcm_output
         self.filter_history = []
+        self.input_history = []
         self.run_call_count = 0
 
-    def input(self, input_path):
-        return FakeFFmpegPipeline(self)
+    def input(self, input_path, **kwargs):
+        self.input_history.append(input_path)
+        return FakeFFmpegPipeline(self, input_path, kwargs)
 
 
 class FakeFFmpegPipeline:
-    def __init__(self, module):
+    def __init__(self, module, input_path=None, input_kwargs=None):
         self.module = module
+        self.input_path = input_path
+        self.is_probe = (input_kwargs or {}).get("f") == "lavfi"
         self.filter_chain = ""
         self.output_path = None
 
-    def output(self, output_path, acodec, ac, ar, af):
+    def output(self, output_path, acodec, ac, ar, af, **kwargs):
         self.filter_chain = af
         self.output_path = output_path
         self.module.filter_history.append(af)
@@ -351,11 +835,15 @@ class FakeFFmpegPipeline:
     def overwrite_output(self):
         return self
 
-    def run(self, quiet=True):
+    def run(self, quiet=True, capture_stdout=False, capture_stderr=False):
         self.module.run_call_count += 1
         if self.module.fail_on_denoise and "afftdn" in self.filter_chain:
             raise RuntimeError("No such filter: 'afftdn'")
-        if self.output_path is not None:
+        if self.module.fail_on_real_input and not self.is_probe:
+            raise RuntimeError("Invalid data found when processing input")
+        if self.output_path == "pipe:":
+            return self.module.pcm_output, b""
+        if self.output_path not in (None, "-"):
             Path(self.output_path).write_bytes(b"processed")
         return None
 
@@ -364,9 +852,11 @@ class FakeTranscribeModel:
     def __init__(self, responses):
         self._responses = list(responses)
         self.vad_filter_history = []
+        self.kwargs_history = []
 
     def transcribe(self, audio, **kwargs):
         self.vad_filter_history.append(kwargs.get("vad_filter"))
+        self.kwargs_history.append(kwargs)
         if not self._responses:
             raise AssertionError("FakeTranscribeModel has no more responses")
 
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import json
+import math
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+from array import array
+from math import inf, log10
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT / "python"))
+
+import whisper_server  # noqa: E402
+
+SERVER_SCRIPT = PROJECT_ROOT / "python" / "whisper_server.py"
+
+SAMPLE_TEXTS = [
+    "えーと今日は会議がありますあのー資料を確認してください",
+    "まあその件については明日までに回答しますえっと",
+    "これは句読点のないとても長い文章で自動句読点の処理速度を測るために使います",
+]
+
+
+def legacy_analyze_wav_peak_dbfs(wav_path):
+    # Reference copy of the original per-sample loop, kept for comparison.
+    max_peak = 0
+
+    with wave.open(wav_path, "rb") as wav_file:
+        sample_width = wav_file.getsampwidth()
+        channel_count = wav_file.getnchannels()
+
+        while True:
+            frames = wav_file.readframes(4096)
+            if not frames:
+                break
+
+            frame_count = len(frames) // (sample_width * channel_count)
+            for frame_index in range(frame_count):
+                offset = frame_index * sample_width * channel_count
+                sample_value = int.from_bytes(
+                    frames[offset : offset + sample_width],
+                    byteorder="little",
+                    signed=True,
+                )
+                max_peak = max(max_peak, abs(sample_value))
+
+    if max_peak <= 0:
+        return -inf
+
+    return 20.0 * log10(max_peak / 32767.0)
+
+
+def write_synthetic_wav(path, seconds, sample_rate=16000):
+    # 220 Hz fits a whole number of periods in one second, so a single second
+    # of samples can be repeated without a seam.
+    one_second = array(
+        "h",
+        (int(6000 * math.sin(2 * math.pi * 220 * index / sample_rate)) for index in range(sample_rate)),
+    )
+    if sys.byteorder != "little":
+        one_second.byteswap()
+    one_second = one_second.tobytes()
+
+    frame_count = int(seconds * sample_rate)
+    with wave.open(str(path), "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        for _ in range(frame_count // sample_rate):
+            wav_file.writeframes(one_second)
+        wav_file.writeframes(one_second[: 2 * (frame_count % sample_rate)])
+
+
+def best_of(runs, func, *args, **kwargs):
+    best = inf
+    result = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = func(*args, **kwargs)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def benchmark_peak_analysis(seconds, runs):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        wav_path = str(Path(temp_dir) / "synthetic.wav")
+        write_synthetic_wav(wav_path, seconds)
+
+        legacy_time, legacy_peak = best_of(runs, legacy_analyze_wav_peak_dbfs, wav_path)
+        fallback_time, fallback_stats = best_of(
+            runs, whisper_server.analyze_wav_levels, wav_path, use_numpy=False
+        )
+        numpy_time, numpy_stats = best_of(runs, whisper_server.analyze_wav_levels, wav_path)
+
+    print(f"Peak analysis on {seconds:.0f}s of 16 kHz mono audio (best of {runs}):")
+    print(f"  legacy per-sample loop : {legacy_time * 1000:9.2f} ms (peak={legacy_peak:.2f} dBFS)")
+    print(
+        f"  memoryview analyzer    : {fallback_time * 1000:9.2f} ms "
+        f"({legacy_time / fallback_time:6.1f}x, {whisper_server.format_level_stats(fallback_stats)})"
+    )
+    print(
+        f"  numpy analyzer         : {numpy_time * 1000:9.2f} ms "
+        f"({legacy_time / numpy_time:6.1f}x, {whisper_server.format_level_stats(numpy_stats)})"
+    )
+
+    if abs(numpy_stats.peak_dbfs - legacy_peak) > 1e-6:
+        print("Peak mismatch between legacy and vectorized analyzers", file=sys.stderr)
+        return 1
+    return 0
+
+
+def benchmark_audio_stages(durations, runs, results, work_dir):
+    ffmpeg_available = shutil.which("ffmpeg") is not None
+    if not ffmpeg_available:
+        print("ffmpeg not found; skipping audio_preprocess stages", file=sys.stderr)
+
+    for seconds in durations:
+        label = f"{seconds:g}s"
+        wav_path = str(Path(work_dir) / f"synthetic_{label}.wav")
+        write_synthetic_wav(wav_path, seconds)
+
+        results[f"analyze_wav_peak_dbfs/{label}"], _ = best_of(
+            runs, whisper_server.analyze_wav_peak_dbfs, wav_path
+        )
+        results[f"analyze_wav_levels/{label}"], _ = best_of(
+            runs, whisper_server.analyze_wav_levels, wav_path
+        )
+        if not ffmpeg_available:
+            continue
+
+        def quiet_log(message, level=None):
+            return None
+
+        def preprocess_to_file(wav_path=wav_path):
+            output_path = whisper_server.audio_preprocess(wav_path, quiet_log)
+            if output_path != wav_path:
+                os.remove(output_path)
+
+        results[f"audio_preprocess/{label}"], _ = best_of(runs, preprocess_to_file)
+        results[f"audio_preprocess_in_memory/{label}"], _ = best_of(
+            runs, whisper_server.audio_preprocess_in_memory, wav_path, quiet_log
+        )
+
+
+def benchmark_text_stages(runs, results, iterations=1000):
+    def post_process_batch():
+        for index in range(iterations):
+            whisper_server.post_process_text(SAMPLE_TEXTS[index % len(SAMPLE_TEXTS)], "ja")
+
+    user_words = [f"専門用語{index}" for index in range(200)]
+
+    def prompt_batch():
+        for index in range(iterations):
+            whisper_server.generate_initial_prompt(
+                "ja",
+                user_words=user_words,
+                screenshot_context=f"エディタ {index}",
+            )
+
+    results[f"post_process_text/x{iterations}"], _ = best_of(runs, post_process_batch)
+    results[f"generate_initial_prompt/x{iterations}"], _ = best_of(runs, prompt_batch)
+
+
+def benchmark_end_to_end(durations, requests_per_duration, results, work_dir):
+    home_dir = Path(work_dir) / "home"
+    home_dir.mkdir()
+
+    # The fake backend is deterministic and needs no weights, so only the
+    # server's own overhead is measured.
+    env = dict(
+        os.environ,
+        HOME=str(home_dir),
+        KOTOTYPE_MODEL_BACKEND="fake",
+        KOTOTYPE_USE_DAEMON="0",
+        KOTOTYPE_RESULT_CACHE="0",
+        KOTOTYPE_SILENCE_GATE="0",
+    )
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, str(SERVER_SCRIPT)],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        env=env,
+    )
+    try:
+        ready = json.loads(process.stderr.readline())
+        if ready.get("type") != "ready":
+            raise RuntimeError(f"Unexpected startup event: {ready}")
+        results["end_to_end/startup_to_ready"] = time.perf_counter() - started
+
+        for seconds in durations:
+            label = f"{seconds:g}s"
+            wav_path = str(Path(work_dir) / f"e2e_{label}.wav")
+            write_synthetic_wav(wav_path, seconds)
+            latencies = []
+            for index in range(requests_per_duration):
+                request = {"id": f"{label}-{index}", "audio": wav_path, "language": "ja"}
+                sent = time.perf_counter()
+                process.stdin.write(json.dumps(request) + "\n")
+                process.stdin.flush()
+                response = json.loads(process.stdout.readline())
+                latencies.append(time.perf_counter() - sent)
+                if response.get("type") != "result":
+                    raise RuntimeError(f"Unexpected response: {response}")
+            latencies.sort()
+            results[f"end_to_end/request_p50/{label}"] = latencies[len(latencies) // 2]
+            results[f"end_to_end/request_max/{label}"] = latencies[-1]
+    finally:
+        process.stdin.close()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        process.stdout.close()
+        process.stderr.close()
+
+
+def find_regressions(results, baseline, threshold, min_delta_seconds):
+    regressions = []
+    for name, seconds in sorted(results.items()):
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if seconds > previous * (1.0 + threshold) and seconds - previous > min_delta_seconds:
+            regressions.append((name, previous, seconds))
+    return regressions
+
+
+def print_results(results):
+    width = max(len(name) for name in results)
+    for name, seconds in sorted(results.items()):
+        print(f"  {name:<{width}} : {seconds * 1000:10.2f} ms")
+
+
+def parse_durations(value):
+    return [float(item) for item in value.split(",") if item.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="whisper_server stage benchmarks")
+    parser.add_argument("--seconds", type=parse_durations, default=[10.0, 60.0],
+                        help="comma-separated synthetic audio lengths (default: 10,60)")
+    parser.add_argument("--runs", type=int, default=3, help="best-of runs per stage")
+    parser.add_argument("--requests", type=int, default=5, help="end-to-end requests per length")
+    parser.add_argument("--skip-end-to-end", action="store_true")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--baseline", help="compare against a previous --output file")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed slowdown over the baseline (default: 0.25 = 25%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0,
+                        help="ignore slowdowns smaller than this, to absorb timer noise")
+    parser.add_argument("--compare-legacy", action="store_true",
+                        help="also compare peak analysis against the original per-sample loop")
+    args = parser.parse_args()
+
+    if args.compare_legacy and benchmark_peak_analysis(max(args.seconds), args.runs):
+        return 1
+
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        benchmark_audio_stages(args.seconds, args.runs, results, work_dir)
+        benchmark_text_stages(args.runs, results)
+        if not args.skip_end_to_end:
+            benchmark_end_to_end(args.seconds, args.requests, results, work_dir)
+
+    print(f"Stage timings (best of {args.runs}, synthetic audio {args.seconds}):")
+    print_results(results)
+
+    if args.output:
+        report = {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "seconds": args.seconds,
+            "runs": args.runs,
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(report, output_file, ensure_ascii=False, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+        regressions = find_regressions(
+            results,
+            baseline,
+            args.threshold,
+            args.min_delta_ms / 1000.0,
+        )
+        for name, previous, seconds in regressions:
+            print(
+                f"REGRESSION {name}: {previous * 1000:.2f} ms -> {seconds * 1000:.2f} ms "
+                f"(+{(seconds / previous - 1.0) * 100:.0f}%)",
+                file=sys.stderr,
+            )
+        if regressions:
+            return 1
+        print(f"No stage regressed more than {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import sys
+import threading
+import time
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT / "python"))
+
+import whisper_server  # noqa: E402
+
+SAMPLE_RATE = whisper_server.SAMPLE_RATE
+
+
+def tone(seconds, amplitude=0.3):
+    t = np.arange(int(seconds * SAMPLE_RATE), dtype=np.float32) / SAMPLE_RATE
+    return (amplitude * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+
+def silence(seconds):
+    return np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32)
+
+
+class ChunkIndexModel:
+    # Emits one segment centred in each chunk; optional per-call delays make
+    # chunks finish out of order.
+    def __init__(self, delays=None):
+        self.delays = list(delays or [])
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def transcribe(self, audio, **kwargs):
+        with self.lock:
+            index = self.calls
+            self.calls += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            if index < len(self.delays):
+                time.sleep(self.delays[index])
+            duration = len(audio) / SAMPLE_RATE
+            segment = SimpleNamespace(
+                text=f"len{round(duration)}",
+                start=duration / 2 - 0.5,
+                end=duration / 2 + 0.5,
+                avg_logprob=-0.1,
+                no_speech_prob=0.0,
+            )
+            return iter([segment]), SimpleNamespace(language="ja", chunk_text=segment.text)
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+class ChunkPlanningTests(unittest.TestCase):
+    def test_short_audio_is_a_single_chunk(self):
+        audio = tone(80)
+        self.assertEqual(
+            whisper_server.plan_chunk_boundaries(audio, chunk_seconds=60),
+            [(0, len(audio))],
+        )
+
+    def test_cuts_land_in_nearby_pauses(self):
+        audio = np.concatenate([tone(55), silence(1), tone(60), silence(1), tone(40)])
+        boundaries = whisper_server.plan_chunk_boundaries(audio, chunk_seconds=60)
+
+        self.assertEqual(len(boundaries), 3)
+        self.assertEqual(boundaries[0][0], 0)
+        self.assertEqual(boundaries[-1][1], len(audio))
+        first_cut = boundaries[0][1] / SAMPLE_RATE
+        second_cut = boundaries[1][1] / SAMPLE_RATE
+        self.assertTrue(55 <= first_cut <= 56, first_cut)
+        self.assertTrue(116 <= second_cut <= 117, second_cut)
+        for (_, end), (start, _) in zip(boundaries, boundaries[1:]):
+            self.assertEqual(end, start)
+
+    def test_trim_repeated_prefix_removes_seam_duplicates(self):
+        self.assertEqual(
+            whisper_server.trim_repeated_prefix("今日は会議があります", "会議があります。明日も"),
+            "。明日も",
+        )
+        self.assertEqual(whisper_server.trim_repeated_prefix("abc", "abcdef"), "abcdef")
+
+    def test_merge_keeps_segments_owned_by_each_chunk(self):
+        results = [
+            (0.0, 10.0, 0.0, [SimpleNamespace(text="a", start=1.0, end=2.0)]),
+            (
+                10.0,
+                20.0,
+                9.5,
+                [
+                    SimpleNamespace(text="overlap", start=0.0, end=0.4),
+                    SimpleNamespace(text="b", start=2.0, end=3.0),
+                ],
+            ),
+        ]
+        merged = whisper_server.merge_chunk_segments(results)
+
+        self.assertEqual([segment.text for segment in merged], ["a", "b"])
+        self.assertEqual((merged[1].start, merged[1].end), (11.5, 12.5))
+
+    def test_merge_trims_only_the_first_segment_of_a_chunk(self):
+        results = [
+            (0.0, 10.0, 0.0, [SimpleNamespace(text="今日は定例会議", start=1.0, end=9.0)]),
+            (
+                10.0,
+                20.0,
+                10.0,
+                [
+                    SimpleNamespace(text="定例会議があります", start=0.0, end=2.0),
+                    SimpleNamespace(text="はい、はい", start=2.0, end=3.0),
+                    SimpleNamespace(text="はい、はい", start=3.0, end=4.0),
+                ],
+            ),
+        ]
+        merged = whisper_server.merge_chunk_segments(results)
+
+        self.assertEqual(
+            [segment.text for segment in merged],
+            ["今日は定例会議", "があります", "はい、はい", "はい、はい"],
+        )
+
+
+class ChunkedTranscriptionTests(unittest.TestCase):
+    def setUp(self):
+        self.audio = np.concatenate([tone(55), silence(1), tone(60), silence(1), tone(40)])
+        self.transcribe_kwargs = {
+            "audio": None,
+            "audio_duration": None,
+            "batch_size": None,
+            "language": "ja",
+            "task": "transcribe",
+            "temperature": 0.0,
+            "beam_size": 5,
+            "best_of": 5,
+            "word_timestamps": False,
+            "initial_prompt": None,
+            "no_speech_threshold": 0.6,
+            "compression_ratio_threshold": 2.4,
+        }
+
+    def test_out_of_order_chunks_merge_in_audio_order(self):
+        model = ChunkIndexModel(delays=[0.2, 0.0, 0.0])
+        progress = []
+        streamed = []
+        streamed_infos = []
+
+        def on_segment(segment, chunk_info):
+            streamed.append(segment.start)
+            streamed_infos.append((segment.text, chunk_info.chunk_text))
+
+        segments, info = whisper_server.transcribe_in_chunks(
+            model=model,
+            transcribe_kwargs=self.transcribe_kwargs,
+            vad_parameters={},
+            log=lambda message, level=None: None,
+            audio=self.audio,
+            chunk_seconds=60,
+            max_workers=3,
+            on_segment=on_segment,
+            on_progress=lambda completed, total, _: progress.append((completed, total)),
+        )
+
+        starts = [segment.start for segment in segments]
+        self.assertEqual(len(segments), 3)
+        self.assertEqual(starts, sorted(starts))
+        self.assertEqual(streamed, starts)
+        self.assertEqual([text for text, chunk_text in streamed_infos if text != chunk_text], [])
+        self.assertEqual(progress, [(1, 3), (2, 3), (3, 3)])
+        self.assertEqual(info.language, "ja")
+        self.assertGreater(model.max_active, 1)
+
+    def test_streaming_request_emits_progress_and_ordered_segments(self):
+        model = ChunkIndexModel()
+        runtime = whisper_server.ServerRuntime(
+            model=model,
+            log=lambda message, level=None: None,
+            chunked_min_duration_seconds=120,
+            chunk_seconds=60,
+            chunk_workers=2,
+        )
+        request = whisper_server.default_request(protocol="json", request_id="long-1")
+        request["stream"] = True
+        prepared = {
+            "request": request,
+            "log": lambda message, level=None: None,
+            "audio_path": "meeting.wav",
+            "actual_language": "ja",
+            "transcription_audio": self.audio,
+            "initial_prompt": None,
+            "timings": {},
+            "request_started": time.perf_counter(),
+            "prepared_at": time.perf_counter(),
+            "result": None,
+            "cache_key": None,
+        }
+        lines = []
+        result = whisper_server.run_prepared_transcription(runtime, prepared, emit_line=lines.append)
+
+        events = [json.loads(line) for line in lines]
+        progress = [event for event in events if event["type"] == "progress"]
+        segments = [event for event in events if event["type"] == "segment"]
+        self.assertEqual([event["completed_chunks"] for event in progress], [1, 2, 3])
+        self.assertEqual([event["index"] for event in segments], [0, 1, 2])
+        self.assertEqual(len(result["segments"]), 3)
+        self.assertEqual(model.calls, 3)
+
+    def test_short_audio_stays_on_single_pass(self):
+        runtime = whisper_server.ServerRuntime(
+            model=ChunkIndexModel(),
+            log=lambda message, level=None: None,
+            chunked_min_duration_seconds=120,
+        )
+        self.assertFalse(
+            whisper_server.should_use_chunked_transcription(
+                None, 30.0, runtime.chunked_min_duration_seconds
+            )
+        )
+        self.assertTrue(whisper_server.should_use_chunked_transcription(True, 30.0, 0.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
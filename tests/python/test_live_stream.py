@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import base64
+import io
+import json
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from pathlib import Path
+from types import SimpleNamespace
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT / "python"))
+
+import whisper_server  # noqa: E402
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - optional test dependency
+    numpy = None
+
+
+def pcm_chunk(seconds, amplitude):
+    sample_count = int(seconds * whisper_server.SAMPLE_RATE)
+    samples = numpy.full(sample_count, int(amplitude * 32767), dtype="<i2")
+    samples[::2] *= -1
+    return base64.b64encode(samples.tobytes()).decode("ascii")
+
+
+class LocalAgreementTests(unittest.TestCase):
+    def test_commits_common_prefix_ignoring_punctuation_and_case(self):
+        previous = [(0.0, 0.4, " Hello,"), (0.4, 0.8, " big"), (0.8, 1.2, " word")]
+        current = [(0.0, 0.4, " hello"), (0.4, 0.8, " big"), (0.8, 1.2, " world")]
+        agreed = whisper_server.local_agreement_prefix(previous, current)
+        self.assertEqual(agreed, current[:2])
+
+    def test_nothing_is_agreed_on_first_hypothesis(self):
+        self.assertEqual(whisper_server.local_agreement_prefix([], [(0.0, 1.0, "a")]), [])
+
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class LiveStreamTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.model = ScriptedWordModel(
+            [
+                [(0.0, 0.4, " hello"), (0.4, 0.8, " big")],
+                [(0.0, 0.4, " hello"), (0.4, 0.8, " big"), (0.8, 1.6, " world")],
+                [(0.0, 0.6, " world"), (0.6, 1.0, " today")],
+            ]
+        )
+        self.runtime = whisper_server.ServerRuntime(
+            model=self.model,
+            log=lambda message, level=None: None,
+            preprocess_in_memory=False,
+            dictionary_cache=whisper_server.UserDictionaryCache(
+                path=str(Path(self.temp_dir.name) / "missing.json")
+            ),
+        )
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def send(self, payload):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            whisper_server.serve_request_line(self.runtime, json.dumps(payload))
+        return json.loads(output.getvalue())
+
+    def test_commits_text_once_consecutive_hypotheses_agree(self):
+        started = self.send({"type": "stream_start", "id": "live", "language": "en"})
+        first = self.send({"type": "stream_audio", "id": "live", "pcm": pcm_chunk(1.0, 0.3)})
+        second = self.send({"type": "stream_audio", "id": "live", "pcm": pcm_chunk(1.0, 0.3)})
+        pause = self.send({"type": "stream_audio", "id": "live", "pcm": pcm_chunk(1.0, 0.0)})
+        done = self.send({"type": "stream_end", "id": "live"})
+
+        self.assertEqual(started["type"], "stream_started")
+        self.assertEqual((first["type"], first["committed"], first["pending"]), ("partial", "", "hello big"))
+        self.assertEqual((second["committed"], second["pending"]), ("hello big", "world"))
+        self.assertEqual((pause["committed"], pause["pending"]), ("world today", ""))
+        self.assertEqual(done["type"], "done")
+        self.assertEqual(done["text"], "hello big world today.")
+
+        self.assertEqual([len(audio) for audio in self.model.audios], [16000, 32000, 35200])
+        self.assertEqual(self.model.prompts, [None, None, "hello big"])
+        self.assertNotIn((None, "live"), self.runtime.live_sessions)
+
+    def test_silence_before_speech_is_not_decoded(self):
+        self.send({"type": "stream_start", "id": "quiet", "language": "en"})
+        for _ in range(5):
+            response = self.send({"type": "stream_audio", "id": "quiet", "pcm": pcm_chunk(1.0, 0.0)})
+        done = self.send({"type": "stream_end", "id": "quiet"})
+
+        self.assertEqual(response["pending"], "")
+        self.assertEqual(done["text"], "")
+        self.assertEqual(self.model.audios, [])
+        self.assertNotIn((None, "quiet"), self.runtime.live_sessions)
+
+    def test_live_requests_run_in_the_completion_stage(self):
+        line = json.dumps({"type": "stream_start", "id": "live", "language": "en"})
+        pending = whisper_server.prepare_request_line(self.runtime, line)
+
+        self.assertIsNone(pending[3])
+        self.assertNotIn((None, "live"), self.runtime.live_sessions)
+
+        _, response_line = whisper_server.complete_request_line(self.runtime, pending)
+        self.assertEqual(json.loads(response_line)["type"], "stream_started")
+        self.assertIn((None, "live"), self.runtime.live_sessions)
+
+    def test_idle_sessions_expire(self):
+        self.send({"type": "stream_start", "id": "stale", "language": "en"})
+        self.runtime.live_sessions[(None, "stale")].last_active -= 301.0
+        self.send({"type": "stream_start", "id": "fresh", "language": "en"})
+
+        self.assertNotIn((None, "stale"), self.runtime.live_sessions)
+        self.assertIn((None, "fresh"), self.runtime.live_sessions)
+        response = self.send({"type": "stream_end", "id": "stale"})
+        self.assertEqual(response["error"]["code"], "unknown_stream")
+
+    def test_sessions_are_scoped_to_their_daemon_client(self):
+        for client in (1, 2):
+            line = json.dumps({"type": "stream_start", "id": "live", "language": "en"})
+            pending = whisper_server.prepare_request_line(self.runtime, line)
+            pending[1]["client"] = client
+            whisper_server.complete_request_line(self.runtime, pending)
+
+        self.assertEqual(self.runtime.drop_live_sessions(1), [(1, "live")])
+        self.assertEqual(list(self.runtime.live_sessions), [(2, "live")])
+
+    def test_unknown_stream_reports_error(self):
+        response = self.send({"type": "stream_audio", "id": "nope", "pcm": pcm_chunk(0.1, 0.3)})
+        self.assertEqual(response["type"], "error")
+        self.assertEqual(response["error"]["code"], "unknown_stream")
+
+
+class ScriptedWordModel:
+    def __init__(self, hypotheses):
+        self.hypotheses = list(hypotheses)
+        self.audios = []
+        self.prompts = []
+
+    def transcribe(self, audio, **kwargs):
+        self.audios.append(audio)
+        self.prompts.append(kwargs["initial_prompt"])
+        words = [
+            SimpleNamespace(start=start, end=end, word=word)
+            for start, end, word in self.hypotheses.pop(0)
+        ]
+        segment = SimpleNamespace(
+            text="".join(word.word for word in words),
+            start=0.0,
+            end=words[-1].end if words else 0.0,
+            words=words,
+        )
+        return [segment], SimpleNamespace(language="en")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT / "python"))
+
+import whisper_server  # noqa: E402
+
+
+class BackgroundLogWriterTests(unittest.TestCase):
+    def test_lines_are_written_in_order_after_flush(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "server.log")
+            writer = whisper_server.BackgroundLogWriter(path)
+            for index in range(500):
+                writer.write(f"line {index}\n")
+            writer.flush()
+            lines = Path(path).read_text(encoding="utf-8").splitlines()
+            writer.close()
+
+        self.assertEqual(lines, [f"line {index}" for index in range(500)])
+
+    def test_rotates_by_size_and_keeps_backup_count(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "server.log")
+            writer = whisper_server.BackgroundLogWriter(path, max_bytes=100, backup_count=2)
+            for index in range(30):
+                writer.write(f"{index:02d} " + "x" * 40 + "\n")
+                writer.flush()
+            writer.close()
+
+            names = sorted(os.listdir(temp_dir))
+            newest_backup = Path(f"{path}.1").read_text(encoding="utf-8")
+
+        self.assertEqual(names, ["server.log", "server.log.1", "server.log.2"])
+        self.assertLessEqual(len(newest_backup), 100 + 44)
+
+    def test_close_drains_pending_lines_and_ignores_later_writes(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "server.log")
+            writer = whisper_server.BackgroundLogWriter(path)
+            writer.write("before close\n")
+            writer.close()
+            writer.write("after close\n")
+            writer.close()
+            content = Path(path).read_text(encoding="utf-8")
+
+        self.assertEqual(content, "before close\n")
+
+
+class LogHelperTests(unittest.TestCase):
+    def test_setup_logging_filters_by_level(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with mock.patch.dict(os.environ, {"HOME": temp_dir, "KOTOTYPE_LOG_LEVEL": "warning"}):
+                log_file, log = whisper_server.setup_logging()
+                log("Model loaded")
+                log("Error: something broke")
+                log("detail", level="debug")
+                log.flush()
+                lines = Path(log_file).read_text(encoding="utf-8").splitlines()
+
+        self.assertEqual(len(lines), 1)
+        self.assertTrue(lines[0].endswith("Error: something broke"))
+
+    def test_setup_logging_registers_one_fork_hook(self):
+        with (
+            tempfile.TemporaryDirectory() as temp_dir,
+            mock.patch.dict(os.environ, {"HOME": temp_dir}),
+            mock.patch.object(whisper_server, "LOG_WRITERS", []),
+            mock.patch.object(os, "register_at_fork", create=True) as register_at_fork,
+        ):
+            for _ in range(3):
+                _, log = whisper_server.setup_logging()
+                log.writer.close()
+
+        register_at_fork.assert_called_once()
+
+    def test_infer_log_level(self):
+        self.assertEqual(whisper_server.infer_log_level("Error: x"), "error")
+        self.assertEqual(whisper_server.infer_log_level("Traceback: x"), "error")
+        self.assertEqual(whisper_server.infer_log_level("Warning: x"), "warning")
+        self.assertEqual(whisper_server.infer_log_level("Retrying after failed VAD pass"), "info")
+        self.assertEqual(whisper_server.infer_log_level("Model loaded"), "info")
+
+    def test_request_log_keeps_explicit_and_prefixed_levels(self):
+        levels = []
+        runtime = whisper_server.ServerRuntime(
+            model=None,
+            log=lambda message, level=None: levels.append((message, level)),
+            max_concurrent_requests=2,
+        )
+        log = runtime.request_log({"id": "a"})
+        log("Error: x")
+        log("detail", level="debug")
+
+        self.assertEqual(levels, [("[req=a] Error: x", "error"), ("[req=a] detail", "debug")])
+
+    def test_truncate_log_text(self):
+        self.assertEqual(whisper_server.truncate_log_text("abcdef", max_chars=0), "abcdef")
+        self.assertEqual(whisper_server.truncate_log_text("abc", max_chars=5), "abc")
+        self.assertEqual(
+            whisper_server.truncate_log_text("abcdef", max_chars=2),
+            "ab...(+4 chars)",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from pathlib import Path
+from types import SimpleNamespace
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT / "python"))
+
+import whisper_server  # noqa: E402
+
+
+class ListWriter:
+    def __init__(self):
+        self.lines = []
+
+    def write(self, line):
+        self.lines.append(line)
+
+    def close(self):
+        pass
+
+
+class StageMetricsTests(unittest.TestCase):
+    def test_summary_reports_rolling_percentiles(self):
+        metrics = whisper_server.StageMetrics(window=100)
+        for value in range(1, 201):
+            metrics.record({"id": value}, {"timings": {"transcribe": float(value)}})
+
+        stage = metrics.summary()["stages"]["transcribe"]
+        self.assertEqual(metrics.summary()["requests"], 200)
+        self.assertEqual(stage["count"], 100)
+        self.assertEqual(stage["p50"], 150.0)
+        self.assertEqual(stage["p95"], 195.0)
+        self.assertEqual(stage["p99"], 199.0)
+        self.assertEqual(stage["max"], 200.0)
+
+    def test_record_includes_audio_duration_and_real_time_factor(self):
+        writer = ListWriter()
+        metrics = whisper_server.StageMetrics(writer=writer)
+        metrics.record(
+            {"id": "seg-1", "number": 3, "type": "transcribe"},
+            {"timings": {"transcribe": 0.5, "total": 1.0}, "audio_seconds": 4.0},
+            write_seconds=0.001,
+        )
+
+        record = json.loads(writer.lines[0])
+        self.assertEqual(record["id"], "seg-1")
+        self.assertEqual(record["outcome"], "ok")
+        self.assertEqual(record["audio_seconds"], 4.0)
+        self.assertEqual(record["rtf"], 0.25)
+        self.assertEqual(record["transcribe_rtf"], 0.125)
+        self.assertEqual(record["timings"]["write"], 0.001)
+
+    def test_environment_can_disable_the_metrics_file(self):
+        metrics = whisper_server.create_stage_metrics(
+            lambda message, level=None: None,
+            environ={"KOTOTYPE_METRICS_ENABLED": "0", "KOTOTYPE_METRICS_WINDOW": "10"},
+        )
+        self.assertIsNone(metrics.writer)
+        self.assertEqual(metrics.window, 10)
+
+
+class ServedRequestMetricsTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.audio_path = Path(self.temp_dir.name) / "segment.wav"
+        self.audio_path.write_bytes(b"dummy")
+        self.writer = ListWriter()
+        self.runtime = whisper_server.ServerRuntime(
+            model=FakeModel(),
+            log=lambda message, level=None: None,
+            preprocess_in_memory=False,
+            dictionary_cache=whisper_server.UserDictionaryCache(
+                path=os.path.join(self.temp_dir.name, "missing.json")
+            ),
+            ffmpeg_module=FailingFFmpegModule(),
+            metrics=whisper_server.StageMetrics(writer=self.writer),
+        )
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def serve(self, line):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            whisper_server.serve_request_line(self.runtime, line)
+        return output.getvalue()
+
+    def test_every_stage_is_recorded_per_request(self):
+        self.serve(json.dumps({"id": "seg-1", "audio": str(self.audio_path), "language": "ja"}))
+
+        record = json.loads(self.writer.lines[0])
+        for stage in (
+            "parse",
+            "stat",
+            "ffmpeg_attempt_0",
+            "preprocess",
+            "dictionary",
+            "prompt",
+            "transcribe_first",
+            "transcribe",
+            "postprocess",
+            "write",
+            "total",
+        ):
+            self.assertIn(stage, record["timings"])
+        self.assertEqual(record["id"], "seg-1")
+
+    def test_metrics_request_returns_summary_without_recording_itself(self):
+        self.serve(f"{self.audio_path}|ja\n")
+        response = json.loads(self.serve(json.dumps({"id": "m", "type": "metrics"})))
+
+        self.assertEqual(response["type"], "metrics")
+        self.assertEqual(response["metrics"]["requests"], 1)
+        self.assertIn("p95", response["metrics"]["stages"]["transcribe"])
+        self.assertEqual(len(self.writer.lines), 1)
+
+
+    def test_pipelined_metrics_request_sees_every_earlier_request(self):
+        lines = [
+            json.dumps({"id": f"seg-{index}", "audio": str(self.audio_path)}) + "\n"
+            for index in range(5)
+        ]
+        lines.append(json.dumps({"id": "m", "type": "metrics"}) + "\n")
+        output = io.StringIO()
+        with redirect_stdout(output):
+            whisper_server.serve_pipelined(self.runtime, iter(lines), depth=8)
+
+        responses = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(responses[-1]["type"], "metrics")
+        self.assertEqual(responses[-1]["metrics"]["requests"], 5)
+
+class FailingFFmpegModule:
+    def input(self, input_path, **kwargs):
+        raise RuntimeError("ffmpeg unavailable in tests")
+
+
+class FakeModel:
+    def transcribe(self, audio, **kwargs):
+        segment = SimpleNamespace(text="こんにちは", start=0.0, end=1.5)
+        return [segment], SimpleNamespace(language="ja")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import io
+import json
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from contextlib import redirect_stdout
+from pathlib import Path
+from types import SimpleNamespace
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT / "python"))
+
+import whisper_server  # noqa: E402
+
+
+class CountingLoader:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.loads = 0
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        time.sleep(self.delay)
+        with self.lock:
+            self.loads += 1
+        return whisper_server.FakeWhisperModel(text=f"load{self.loads}")
+
+
+class ModelHolderTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.events = []
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def build_holder(self, loader, **kwargs):
+        return whisper_server.ModelHolder(
+            model=loader(),
+            loader=loader,
+            idle_unload_seconds=kwargs.pop("idle_unload_seconds", 60.0),
+            emit_event=lambda line: self.events.append(json.loads(line)),
+            **kwargs,
+        )
+
+    def test_idle_model_is_unloaded_and_reloaded_on_next_use(self):
+        loader = CountingLoader()
+        holder = self.build_holder(loader)
+        dropped = []
+        holder.unload_callbacks.append(lambda: dropped.append(True))
+
+        self.assertFalse(holder.unload_if_idle(now=holder.last_used + 30))
+        self.assertTrue(holder.unload_if_idle(now=holder.last_used + 61))
+        self.assertIsNone(holder.model)
+        self.assertEqual(dropped, [True])
+
+        model = holder.acquire()
+        holder.release()
+        self.assertEqual(model.text, "load2")
+        self.assertEqual(
+            [event["state"] for event in self.events],
+            ["unloaded", "loading", "loaded"],
+        )
+        self.assertEqual(self.events[0]["type"], "model_state")
+
+    def test_model_in_use_is_never_unloaded(self):
+        holder = self.build_holder(CountingLoader())
+        holder.acquire()
+        self.assertFalse(holder.unload_if_idle(now=holder.last_used + 3600))
+        holder.release()
+        self.assertTrue(holder.unload_if_idle(now=holder.last_used + 3600))
+
+    def test_disabled_policy_keeps_the_model(self):
+        holder = self.build_holder(CountingLoader(), idle_unload_seconds=0)
+        self.assertFalse(holder.unload_if_idle(now=holder.last_used + 3600))
+        self.assertIsNone(holder.start_idle_monitor())
+
+    def test_concurrent_requests_share_one_reload(self):
+        loader = CountingLoader(delay=0.05)
+        holder = self.build_holder(loader)
+        holder.unload_if_idle(now=holder.last_used + 61)
+
+        models = []
+
+        def use_model():
+            models.append(holder.acquire())
+            holder.release()
+
+        threads = [threading.Thread(target=use_model) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(loader.loads, 2)
+        self.assertEqual(len({id(model) for model in models}), 1)
+
+    def test_reload_waits_for_a_model_load_slot(self):
+        slot_dir = self.temp_dir.name
+        other_process = whisper_server.LockSlots(slot_dir, "model_load", 1)
+        self.assertIsNotNone(other_process.try_acquire())
+        try:
+            holder = self.build_holder(
+                CountingLoader(),
+                load_slots=whisper_server.LockSlots(slot_dir, "model_load", 1),
+                load_timeout=0.2,
+            )
+            holder.unload_if_idle(now=holder.last_used + 61)
+            with self.assertRaises(RuntimeError):
+                holder.acquire()
+            self.assertEqual(holder.in_use, 0)
+        finally:
+            other_process.release()
+
+        holder.acquire()
+        holder.release()
+        self.assertIsNotNone(holder.model)
+
+
+class RuntimeReloadTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.audio_path = Path(self.temp_dir.name) / "segment.wav"
+        self.audio_path.write_bytes(b"dummy")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_request_after_unload_reloads_the_model(self):
+        loader = CountingLoader()
+        holder = whisper_server.ModelHolder(
+            model=loader(),
+            loader=loader,
+            idle_unload_seconds=1.0,
+        )
+        runtime = whisper_server.ServerRuntime(
+            model=None,
+            model_holder=holder,
+            log=lambda message, level=None: None,
+            preprocess_in_memory=False,
+            dictionary_cache=whisper_server.UserDictionaryCache(
+                path=str(Path(self.temp_dir.name) / "missing.json")
+            ),
+            ffmpeg_module=FailingFFmpegModule(),
+            batched_pipeline_factory=lambda model: SimpleNamespace(model=model),
+        )
+        runtime.get_batched_pipeline(holder.model)
+        holder.unload_if_idle(now=holder.last_used + 5)
+        self.assertIsNone(runtime.batched_pipeline)
+
+        output = io.StringIO()
+        with redirect_stdout(output):
+            whisper_server.serve_request_line(
+                runtime,
+                json.dumps({"id": 1, "audio": str(self.audio_path)}),
+            )
+
+        response = json.loads(output.getvalue())
+        self.assertEqual(response["text"], "load2。")
+        self.assertIn("model_acquire", response["timings"])
+        self.assertEqual(holder.in_use, 0)
+
+
+class FailingFFmpegModule:
+    def input(self, input_path, **kwargs):
+        raise RuntimeError("ffmpeg unavailable in tests")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT / "python"))
+
+import whisper_server  # noqa: E402
+
+
+class ModelSettingsTests(unittest.TestCase):
+    def test_defaults_without_profile_or_env(self):
+        settings, source = whisper_server.resolve_model_settings(
+            environ={},
+            profile_path="/does/not/exist.json",
+        )
+        self.assertEqual(settings, whisper_server.DEFAULT_MODEL_SETTINGS)
+        self.assertEqual(source, "defaults")
+
+    def test_profile_is_loaded_and_env_overrides_it(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            profile_path = Path(temp_dir) / "model_profile.json"
+            profile_path.write_text(
+                json.dumps({"settings": {"compute_type": "float32", "cpu_threads": 8, "unknown": 1}}),
+                encoding="utf-8",
+            )
+            settings, source = whisper_server.resolve_model_settings(
+                environ={"KOTOTYPE_CPU_THREADS": "4", "KOTOTYPE_MODEL": "small"},
+                profile_path=str(profile_path),
+            )
+
+        self.assertEqual(source, str(profile_path))
+        self.assertEqual(settings["compute_type"], "float32")
+        self.assertEqual(settings["cpu_threads"], 4)
+        self.assertEqual(settings["model"], "small")
+        self.assertNotIn("unknown", settings)
+
+    def test_unreadable_profile_falls_back_to_defaults(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            profile_path = Path(temp_dir) / "model_profile.json"
+            profile_path.write_text("{broken", encoding="utf-8")
+            settings, source = whisper_server.resolve_model_settings(
+                environ={},
+                profile_path=str(profile_path),
+                log=lambda message, level=None: None,
+            )
+        self.assertEqual(source, "defaults")
+        self.assertEqual(settings["compute_type"], "int8")
+
+    def test_thread_candidates_scale_with_core_count(self):
+        self.assertEqual(whisper_server.default_autotune_thread_counts(4), [1, 2, 4])
+        self.assertEqual(whisper_server.default_autotune_thread_counts(16), [4, 8, 16])
+        self.assertEqual(whisper_server.default_autotune_thread_counts(1), [1])
+
+    def test_peak_rss_units_per_platform(self):
+        self.assertEqual(whisper_server.peak_rss_mb(2 * 1024 * 1024, platform="darwin"), 2)
+        self.assertEqual(whisper_server.peak_rss_mb(2048, platform="linux"), 2)
+
+
+class AutotuneTests(unittest.TestCase):
+    def test_autotune_saves_fastest_setting_at_reference_beam_size(self):
+        rtf_by_setting = {
+            ("int8", 2, 5): 0.4,
+            ("int8", 4, 5): 0.2,
+            ("float32", 4, 5): 0.5,
+            ("int8", 4, 1): 0.05,
+        }
+
+        def trial_runner(settings, audio_path, beam_size, runs):
+            key = (settings["compute_type"], settings["cpu_threads"], beam_size)
+            if key not in rtf_by_setting:
+                raise RuntimeError("unsupported")
+            return {
+                "load_seconds": 1.0,
+                "transcribe_seconds": rtf_by_setting[key] * 10,
+                "audio_seconds": 10.0,
+                "rtf": rtf_by_setting[key],
+                "peak_rss_mb": 900.0,
+                "text": "",
+            }
+
+        reports = []
+        with tempfile.TemporaryDirectory() as temp_dir:
+            profile_path = Path(temp_dir) / "profile" / "model_profile.json"
+            profile = whisper_server.run_autotune(
+                dict(whisper_server.DEFAULT_MODEL_SETTINGS),
+                "speech.wav",
+                compute_types=["int8", "float32"],
+                thread_counts=[2, 4],
+                beam_sizes=[5, 1],
+                runs=1,
+                profile_path=str(profile_path),
+                report=reports.append,
+                trial_runner=trial_runner,
+            )
+            saved = json.loads(profile_path.read_text(encoding="utf-8"))
+            settings, _ = whisper_server.resolve_model_settings(
+                environ={},
+                profile_path=str(profile_path),
+            )
+
+        self.assertEqual(profile["settings"]["compute_type"], "int8")
+        self.assertEqual(profile["settings"]["cpu_threads"], 4)
+        self.assertEqual(len(saved["trials"]), 8)
+        self.assertTrue(any("failed" in line for line in reports))
+        self.assertEqual(settings["cpu_threads"], 4)
+
+    def test_autotune_without_successful_trial_keeps_existing_profile(self):
+        def failing_runner(settings, audio_path, beam_size, runs):
+            raise RuntimeError("no model")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            profile_path = Path(temp_dir) / "model_profile.json"
+            profile = whisper_server.run_autotune(
+                dict(whisper_server.DEFAULT_MODEL_SETTINGS),
+                "speech.wav",
+                compute_types=["int8"],
+                thread_counts=[1],
+                beam_sizes=[5],
+                runs=1,
+                profile_path=str(profile_path),
+                report=lambda _: None,
+                trial_runner=failing_runner,
+            )
+            self.assertIsNone(profile)
+            self.assertFalse(profile_path.exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,680 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import base64
+import io
+import json
+import math
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import wave
+from array import array
+from contextlib import redirect_stdout
+from pathlib import Path
+from types import SimpleNamespace
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT / "python"))
+
+import whisper_server  # noqa: E402
+
+
+class RequestParsingTests(unittest.TestCase):
+    def test_parse_legacy_request_with_all_fields(self):
+        context = base64.b64encode("画面".encode("utf-8")).decode("ascii")
+        request = whisper_server.parse_legacy_request(
+            f"/tmp/a.wav|ja|0.2|3|0.5|2.0|translate|4|0.4|0|1|-20|-8|12|{context}\n",
+            lambda message, level=None: None,
+        )
+
+        self.assertEqual(request["protocol"], "legacy")
+        self.assertIsNone(request["id"])
+        self.assertEqual(request["audio_path"], "/tmp/a.wav")
+        self.assertEqual(request["language"], "ja")
+        self.assertEqual(request["temperature"], 0.2)
+        self.assertEqual(request["beam_size"], 3)
+        self.assertEqual(request["task"], "translate")
+        self.assertEqual(request["best_of"], 4)
+        self.assertFalse(request["auto_punctuation"])
+        self.assertTrue(request["auto_gain_enabled"])
+        self.assertEqual(request["auto_gain_max_db"], 12.0)
+        self.assertEqual(request["screenshot_context"], "画面")
+
+    def test_parse_legacy_request_defaults(self):
+        request = whisper_server.parse_legacy_request("/tmp/a.wav\n", lambda message, level=None: None)
+        self.assertEqual(request["language"], "auto")
+        self.assertEqual(request["beam_size"], 5)
+        self.assertTrue(request["auto_punctuation"])
+        self.assertIsNone(request["auto_gain_enabled"])
+
+    def test_parse_json_request(self):
+        request = whisper_server.parse_request_line(
+            json.dumps(
+                {
+                    "v": 1,
+                    "id": "seg-1",
+                    "audio": "/tmp/a.wav",
+                    "language": "en",
+                    "beam_size": 2,
+                    "auto_punctuation": False,
+                    "auto_gain_enabled": True,
+                    "screenshot_context": "Editor",
+                }
+            ),
+            lambda message, level=None: None,
+        )
+
+        self.assertEqual(request["protocol"], "json")
+        self.assertEqual(request["id"], "seg-1")
+        self.assertEqual(request["audio_path"], "/tmp/a.wav")
+        self.assertEqual(request["language"], "en")
+        self.assertEqual(request["beam_size"], 2)
+        self.assertFalse(request["auto_punctuation"])
+        self.assertTrue(request["auto_gain_enabled"])
+        self.assertEqual(request["screenshot_context"], "Editor")
+
+    def test_parse_json_request_rejects_unknown_version(self):
+        with self.assertRaises(ValueError):
+            whisper_server.parse_json_request('{"v": 99, "audio": "a.wav"}', lambda message, level=None: None)
+
+
+class ServeRequestLineTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.audio_path = Path(self.temp_dir.name) / "segment.wav"
+        self.audio_path.write_bytes(b"dummy")
+        self.model = FakeModel()
+        self.runtime = whisper_server.ServerRuntime(
+            model=self.model,
+            log=lambda message, level=None: None,
+            preprocess_in_memory=False,
+            dictionary_cache=whisper_server.UserDictionaryCache(
+                path=str(Path(self.temp_dir.name) / "missing.json")
+            ),
+            ffmpeg_module=FailingFFmpegModule(),
+        )
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def serve(self, line):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            whisper_server.serve_request_line(self.runtime, line)
+        return output.getvalue()
+
+    def test_legacy_request_prints_bare_text(self):
+        output = self.serve(f"{self.audio_path}|ja\n")
+        self.assertEqual(output, "こんにちは。\n")
+
+    def test_json_request_returns_id_timings_and_segments(self):
+        output = self.serve(json.dumps({"id": 7, "audio": str(self.audio_path), "language": "ja"}))
+        response = json.loads(output)
+
+        self.assertEqual(response["v"], 1)
+        self.assertEqual(response["id"], 7)
+        self.assertEqual(response["type"], "result")
+        self.assertEqual(response["text"], "こんにちは。")
+        self.assertEqual(response["language"], "ja")
+        self.assertEqual(response["segments"][0]["text"], "こんにちは")
+        self.assertEqual(response["segments"][0]["end"], 1.5)
+        self.assertIn("transcribe", response["timings"])
+        self.assertIn("total", response["timings"])
+
+    def test_pipelined_json_requests_keep_their_ids(self):
+        lines = [
+            json.dumps({"id": f"req-{index}", "audio": str(self.audio_path)})
+            for index in range(3)
+        ]
+        responses = [json.loads(self.serve(line)) for line in lines]
+        self.assertEqual([response["id"] for response in responses], ["req-0", "req-1", "req-2"])
+
+    def test_batched_flag_routes_through_batched_pipeline(self):
+        created = []
+
+        def pipeline_factory(model):
+            created.append(model)
+            return FakeModel(text="バッチ")
+
+        self.runtime.batched_pipeline_factory = pipeline_factory
+        self.runtime.silence_gate["enabled"] = False
+        with wave.open(str(self.audio_path), "wb") as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(16000)
+            wav_file.writeframes(array("h", [0] * 32000).tobytes())
+        response = json.loads(
+            self.serve(json.dumps({"id": 1, "audio": str(self.audio_path), "batched": True}))
+        )
+        self.serve(json.dumps({"id": 2, "audio": str(self.audio_path), "batched": True}))
+
+        self.assertEqual(response["text"], "バッチ。")
+        self.assertEqual(created, [self.model])
+
+    def test_batched_flag_is_ignored_when_duration_is_unknown(self):
+        created = []
+        self.runtime.batched_pipeline_factory = lambda model: created.append(model)
+        audio_path = Path(self.temp_dir.name) / "segment.mp3"
+        audio_path.write_bytes(b"dummy")
+
+        response = json.loads(
+            self.serve(json.dumps({"id": 1, "audio": str(audio_path), "batched": True}))
+        )
+
+        self.assertEqual(response["text"], "こんにちは。")
+        self.assertEqual(created, [])
+
+    def test_missing_file_keeps_legacy_empty_line(self):
+        self.assertEqual(self.serve("/does/not/exist.wav|ja\n"), "\n")
+
+    def test_missing_file_reports_json_error(self):
+        response = json.loads(self.serve('{"id": "x", "audio": "/does/not/exist.wav"}'))
+        self.assertEqual(response["type"], "error")
+        self.assertEqual(response["id"], "x")
+        self.assertEqual(response["error"]["code"], "file_not_found")
+
+    def test_empty_legacy_path_is_skipped(self):
+        self.assertEqual(self.serve("\n"), "")
+
+    def test_malformed_json_reports_error_with_id(self):
+        response = json.loads(self.serve('{"id": "bad", "audio": "a.wav", "beam_size": "x"}'))
+        self.assertEqual(response["id"], "bad")
+        self.assertEqual(response["error"]["code"], "internal_error")
+
+
+class SilenceGateTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.model = RecordingModel()
+        self.runtime = whisper_server.ServerRuntime(
+            model=self.model,
+            log=lambda message, level=None: None,
+            preprocess_in_memory=False,
+            dictionary_cache=whisper_server.UserDictionaryCache(
+                path=str(Path(self.temp_dir.name) / "missing.json")
+            ),
+            ffmpeg_module=FailingFFmpegModule(),
+        )
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_wav(self, name, samples):
+        path = Path(self.temp_dir.name) / name
+        with wave.open(str(path), "wb") as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(16000)
+            wav_file.writeframes(array("h", samples).tobytes())
+        return path
+
+    def serve(self, path):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            whisper_server.serve_request_line(
+                self.runtime,
+                json.dumps({"id": path.stem, "audio": str(path)}),
+            )
+        return json.loads(output.getvalue())
+
+    def test_silent_clip_skips_model(self):
+        response = self.serve(self.write_wav("silent.wav", [0, 1, -1, 0] * 4000))
+
+        self.assertEqual(response["text"], "")
+        self.assertEqual(response["skipped"], "silent")
+        self.assertEqual(self.model.calls, [])
+        self.assertEqual(
+            self.runtime.counter_snapshot(),
+            {"silence_gate_checked": 1, "silence_gate_skipped": 1},
+        )
+
+    def test_low_hiss_without_speech_is_skipped(self):
+        generator = random.Random(7)
+        hiss = [generator.randint(-300, 300) for _ in range(32000)]
+        response = self.serve(self.write_wav("hiss.wav", hiss))
+        self.assertEqual(response["skipped"], "no_speech")
+
+    def test_voiced_clip_reaches_model(self):
+        tone = [int(3000 * math.sin(2 * math.pi * 200 * index / 16000)) for index in range(16000)]
+        response = self.serve(self.write_wav("voiced.wav", [0] * 16000 + tone))
+
+        self.assertNotIn("skipped", response)
+        self.assertTrue(self.model.calls)
+        self.assertIn("silence_gate", response["timings"])
+
+    def test_gate_can_be_disabled(self):
+        self.runtime.silence_gate["enabled"] = False
+        response = self.serve(self.write_wav("silent.wav", [0] * 16000))
+        self.assertNotIn("skipped", response)
+        self.assertTrue(self.model.calls)
+
+
+class StreamingResponseTests(unittest.TestCase):
+    def serve(self, model, payload):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            audio_path = Path(temp_dir) / "segment.wav"
+            audio_path.write_bytes(b"dummy")
+            runtime = whisper_server.ServerRuntime(
+                model=model,
+                log=lambda message, level=None: None,
+                preprocess_in_memory=False,
+                dictionary_cache=whisper_server.UserDictionaryCache(
+                    path=str(Path(temp_dir) / "missing.json")
+                ),
+                ffmpeg_module=FailingFFmpegModule(),
+            )
+            payload["audio"] = str(audio_path)
+            output = io.StringIO()
+            with redirect_stdout(output):
+                whisper_server.serve_request_line(runtime, json.dumps(payload))
+        return [json.loads(line) for line in output.getvalue().splitlines()]
+
+    def test_segments_are_written_while_decoding_continues(self):
+        model = GeneratorModel(["こんにちは", "", "世界"])
+        records = self.serve(model, {"id": "s", "stream": True, "language": "ja"})
+
+        self.assertEqual([record["type"] for record in records], ["segment", "segment", "done"])
+        self.assertEqual([record["text"] for record in records[:2]], ["こんにちは。", "世界。"])
+        self.assertEqual([record["index"] for record in records[:2]], [0, 1])
+        self.assertEqual(records[2]["id"], "s")
+        self.assertEqual(records[2]["text"], "こんにちは 世界。")
+        self.assertIn("first_segment", records[2]["timings"])
+        self.assertEqual(model.lines_written_before_next_segment, [0, 1, 1])
+
+    def test_empty_vad_pass_falls_back_without_duplicates(self):
+        model = GeneratorModel(["たすけて"], empty_with_vad=True)
+        records = self.serve(model, {"id": "v", "stream": True, "language": "ja"})
+
+        self.assertEqual([record["type"] for record in records], ["segment", "done"])
+        self.assertEqual(records[0]["text"], "たすけて。")
+        self.assertEqual(model.vad_filters, [True, False])
+
+    def test_non_streaming_request_keeps_single_result(self):
+        records = self.serve(GeneratorModel(["a", "b"]), {"id": "r", "language": "en"})
+        self.assertEqual([record["type"] for record in records], ["result"])
+
+
+class ConcurrentServingTests(unittest.TestCase):
+    def test_ordered_writer_releases_legacy_lines_in_submission_order(self):
+        written = []
+        writer = whisper_server.OrderedResponseWriter(write_line=written.append)
+        first = writer.reserve()
+        second = writer.reserve()
+        third = writer.reserve()
+
+        writer.complete(second, "second")
+        writer.write_now('{"id": "json"}')
+        writer.complete(third, None)
+        self.assertEqual(written, ['{"id": "json"}'])
+
+        writer.complete(first, "first")
+        self.assertEqual(written, ['{"id": "json"}', "first", "second"])
+
+    def test_requests_share_one_model_concurrently(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            slow_path = Path(temp_dir) / "slow.wav"
+            fast_path = Path(temp_dir) / "fast.wav"
+            slow_path.write_bytes(b"dummy")
+            fast_path.write_bytes(b"dummy")
+
+            model = BarrierModel(parties=2)
+            runtime = whisper_server.ServerRuntime(
+                model=model,
+                log=lambda message, level=None: None,
+                preprocess_in_memory=False,
+                dictionary_cache=whisper_server.UserDictionaryCache(
+                    path=str(Path(temp_dir) / "missing.json")
+                ),
+                ffmpeg_module=FailingFFmpegModule(),
+                max_concurrent_requests=2,
+            )
+            written = []
+            whisper_server.serve_concurrently(
+                runtime,
+                [f"{slow_path}|en\n", f"{fast_path}|en\n"],
+                max_workers=2,
+                writer=whisper_server.OrderedResponseWriter(write_line=written.append),
+            )
+
+        self.assertEqual(model.max_in_flight, 2)
+        self.assertEqual(written, ["slow.", "fast."])
+
+    def test_reading_pauses_while_too_many_requests_are_in_flight(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            audio_path = Path(temp_dir) / "segment.wav"
+            audio_path.write_bytes(b"dummy")
+            release = threading.Event()
+            model = GatedModel(release)
+            runtime = whisper_server.ServerRuntime(
+                model=model,
+                log=lambda message, level=None: None,
+                preprocess_in_memory=False,
+                dictionary_cache=whisper_server.UserDictionaryCache(
+                    path=str(Path(temp_dir) / "missing.json")
+                ),
+                ffmpeg_module=FailingFFmpegModule(),
+                max_concurrent_requests=1,
+            )
+            read = []
+
+            def lines():
+                for index in range(6):
+                    read.append(index)
+                    yield f"{audio_path}|en\n"
+
+            written = []
+            server = threading.Thread(
+                target=whisper_server.serve_concurrently,
+                kwargs={
+                    "runtime": runtime,
+                    "lines": lines(),
+                    "max_workers": 1,
+                    "writer": whisper_server.OrderedResponseWriter(write_line=written.append),
+                    "max_in_flight": 2,
+                },
+            )
+            server.start()
+            time.sleep(0.2)
+            read_while_blocked = len(read)
+            release.set()
+            server.join(timeout=5)
+
+        self.assertEqual(read_while_blocked, 3)
+        self.assertEqual(len(written), 6)
+
+
+class PipelinedServingTests(unittest.TestCase):
+    def test_next_request_is_preprocessed_while_current_one_transcribes(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            first_path = Path(temp_dir) / "first.wav"
+            second_path = Path(temp_dir) / "second.wav"
+            first_path.write_bytes(b"dummy")
+            second_path.write_bytes(b"dummy")
+
+            ffmpeg_module = RecordingFFmpegModule()
+            model = WaitForPreprocessModel(ffmpeg_module.preprocessed, str(second_path))
+            runtime = whisper_server.ServerRuntime(
+                model=model,
+                log=lambda message, level=None: None,
+                preprocess_in_memory=False,
+                dictionary_cache=whisper_server.UserDictionaryCache(
+                    path=str(Path(temp_dir) / "missing.json")
+                ),
+                ffmpeg_module=ffmpeg_module,
+            )
+            output = io.StringIO()
+            with redirect_stdout(output):
+                whisper_server.serve_pipelined(
+                    runtime,
+                    [
+                        f"{first_path}|en\n",
+                        json.dumps({"id": "b", "audio": str(second_path)}) + "\n",
+                        "/does/not/exist.wav|en\n",
+                    ],
+                    depth=2,
+                )
+
+        lines = output.getvalue().splitlines()
+        self.assertTrue(model.overlapped)
+        self.assertEqual(lines[0], "first.")
+        self.assertEqual(json.loads(lines[1])["id"], "b")
+        self.assertIn("queue_wait", json.loads(lines[1])["timings"])
+        self.assertEqual(lines[2], "")
+
+
+@unittest.skipUnless(hasattr(socket, "AF_UNIX"), "Unix domain sockets are unavailable")
+class DaemonTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.socket_path = str(Path(self.temp_dir.name) / "server.sock")
+        self.audio_path = Path(self.temp_dir.name) / "segment.wav"
+        self.audio_path.write_bytes(b"dummy")
+        self.runtime = whisper_server.ServerRuntime(
+            model=FakeModel(),
+            log=lambda message, level=None: None,
+            preprocess_in_memory=False,
+            dictionary_cache=whisper_server.UserDictionaryCache(
+                path=str(Path(self.temp_dir.name) / "missing.json")
+            ),
+            ffmpeg_module=FailingFFmpegModule(),
+        )
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def start_daemon(self):
+        server_socket = whisper_server.create_daemon_socket(self.socket_path, lambda message, level=None: None)
+        stop_event = threading.Event()
+        thread = threading.Thread(
+            target=whisper_server.serve_daemon,
+            args=(self.runtime, server_socket, stop_event, 0.05),
+            daemon=True,
+        )
+        thread.start()
+
+        def stop():
+            stop_event.set()
+            thread.join(timeout=5)
+            server_socket.close()
+
+        self.addCleanup(stop)
+
+    def relay(self, lines):
+        connection = whisper_server.connect_daemon(self.socket_path)
+        self.assertIsNotNone(connection)
+        written = []
+        whisper_server.relay_to_daemon(connection, lines, write_line=written.append)
+        return written
+
+    def test_relay_client_matches_stdin_server_output(self):
+        self.start_daemon()
+        written = self.relay(
+            [
+                f"{self.audio_path}|ja\n",
+                "\n",
+                json.dumps({"id": "j", "audio": str(self.audio_path)}),
+                "/does/not/exist.wav|ja\n",
+            ]
+        )
+
+        self.assertEqual(len(written), 3)
+        self.assertEqual(written[0], "こんにちは。")
+        self.assertEqual(json.loads(written[1])["id"], "j")
+        self.assertEqual(written[2], "")
+
+    def test_several_clients_share_one_daemon(self):
+        self.start_daemon()
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(self.relay([f"{self.audio_path}|ja\n"] * 3))
+            )
+            for _ in range(3)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=5)
+
+        self.assertEqual(results, [["こんにちは。"] * 3] * 3)
+
+    def test_stale_socket_is_replaced_and_live_daemon_is_refused(self):
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(self.socket_path)
+        stale.close()
+        self.assertIsNone(whisper_server.connect_daemon(self.socket_path))
+
+        self.start_daemon()
+        with self.assertRaises(RuntimeError):
+            whisper_server.create_daemon_socket(self.socket_path, lambda message, level=None: None)
+
+    def test_connect_without_daemon_returns_none(self):
+        self.assertIsNone(whisper_server.connect_daemon(self.socket_path))
+
+
+class WarmupTests(unittest.TestCase):
+    def make_runtime(self, model, temp_dir):
+        return whisper_server.ServerRuntime(
+            model=model,
+            log=lambda message, level=None: None,
+            preprocess_in_memory=False,
+            dictionary_cache=whisper_server.UserDictionaryCache(
+                path=str(Path(temp_dir) / "missing.json")
+            ),
+            ffmpeg_module=FailingFFmpegModule(),
+        )
+
+    def test_synthetic_warmup_wav_is_half_silence_half_tone(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = str(Path(temp_dir) / "warmup.wav")
+            whisper_server.write_synthetic_warmup_wav(path, duration_seconds=0.5)
+            stats = whisper_server.analyze_wav_levels(path, use_numpy=False)
+
+        self.assertEqual(stats.frame_count, 8000)
+        self.assertAlmostEqual(stats.peak_dbfs, -20.0, delta=0.1)
+
+    def test_warmup_runs_full_request_path_and_removes_audio(self):
+        model = RecordingModel()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            elapsed = whisper_server.run_warmup(self.make_runtime(model, temp_dir), language="en")
+
+        self.assertIsNotNone(elapsed)
+        self.assertEqual(model.calls[0]["language"], "en")
+        self.assertFalse(Path(model.audio_paths[0]).exists())
+
+    def test_warmup_bypasses_result_cache_and_counters(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            runtime = self.make_runtime(RecordingModel(), temp_dir)
+            runtime.result_cache = whisper_server.ResultCache(str(Path(temp_dir) / "cache"))
+            runtime.silence_gate["enabled"] = True
+            self.assertIsNotNone(whisper_server.run_warmup(runtime))
+
+            self.assertEqual(runtime.counter_snapshot(), {})
+            self.assertEqual(
+                runtime.result_cache.stats(),
+                {"hits": 0, "misses": 0, "stores": 0, "evictions": 0},
+            )
+
+    def test_warmup_failure_does_not_block_startup(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            runtime = self.make_runtime(RecordingModel(), temp_dir)
+            runtime.dictionary_cache = None
+            self.assertIsNone(whisper_server.run_warmup(runtime))
+
+    def test_ready_event_reports_timings(self):
+        event = json.loads(
+            whisper_server.format_ready_event(12.3456, 0.5, concurrent_requests=2)
+        )
+        self.assertEqual(event["type"], "ready")
+        self.assertEqual(event["v"], 1)
+        self.assertEqual(event["load_seconds"], 12.346)
+        self.assertEqual(event["warmup_seconds"], 0.5)
+        self.assertEqual(event["concurrent_requests"], 2)
+
+
+class RecordingModel:
+    def __init__(self):
+        self.calls = []
+        self.audio_paths = []
+
+    def transcribe(self, audio, **kwargs):
+        self.audio_paths.append(audio)
+        self.calls.append(kwargs)
+        return [SimpleNamespace(text="", start=0.0, end=0.0)], SimpleNamespace(language="en")
+
+
+class RecordingFFmpegModule:
+    def __init__(self):
+        self.preprocessed = set()
+
+    def input(self, input_path, **kwargs):
+        self.preprocessed.add(input_path)
+        raise RuntimeError("ffmpeg unavailable in tests")
+
+
+class WaitForPreprocessModel:
+    def __init__(self, preprocessed, next_path):
+        self.preprocessed = preprocessed
+        self.next_path = next_path
+        self.overlapped = None
+
+    def transcribe(self, audio, **kwargs):
+        name = Path(audio).stem
+        if self.overlapped is None:
+            deadline = time.monotonic() + 5
+            while self.next_path not in self.preprocessed and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.overlapped = self.next_path in self.preprocessed
+        return [SimpleNamespace(text=name, start=0.0, end=1.0)], SimpleNamespace(language="en")
+
+
+class GeneratorModel:
+    def __init__(self, texts, empty_with_vad=False):
+        self.texts = texts
+        self.empty_with_vad = empty_with_vad
+        self.vad_filters = []
+        self.lines_written_before_next_segment = []
+
+    def transcribe(self, audio, **kwargs):
+        self.vad_filters.append(kwargs["vad_filter"])
+        texts = [""] if self.empty_with_vad and kwargs["vad_filter"] else self.texts
+        output = sys.stdout
+
+        def generate():
+            for index, text in enumerate(texts):
+                self.lines_written_before_next_segment.append(len(output.getvalue().splitlines()))
+                yield SimpleNamespace(text=text, start=float(index), end=index + 1.0)
+
+        return generate(), SimpleNamespace(language="ja")
+
+
+class BarrierModel:
+    def __init__(self, parties):
+        self.barrier = threading.Barrier(parties, timeout=5)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def transcribe(self, audio, **kwargs):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        self.barrier.wait()
+        name = Path(audio).stem
+        if name == "slow":
+            time.sleep(0.1)
+        with self.lock:
+            self.in_flight -= 1
+        return [SimpleNamespace(text=name)], SimpleNamespace(language="en")
+
+
+class GatedModel:
+    def __init__(self, release):
+        self.release = release
+
+    def transcribe(self, audio, **kwargs):
+        self.release.wait(timeout=5)
+        return [SimpleNamespace(text="ok")], SimpleNamespace(language="en")
+
+
+class FailingFFmpegModule:
+    def input(self, input_path, **kwargs):
+        raise RuntimeError("ffmpeg unavailable in tests")
+
+
+class FakeModel:
+    def __init__(self, text="こんにちは"):
+        self.text = text
+
+    def transcribe(self, audio, **kwargs):
+        segment = SimpleNamespace(text=self.text, start=0.0, end=1.5)
+        return [segment], SimpleNamespace(language="ja")
+
+
+if __name__ == "__main__":
+    unittest.main()
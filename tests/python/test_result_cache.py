@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from pathlib import Path
+from types import SimpleNamespace
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT / "python"))
+
+import whisper_server  # noqa: E402
+
+
+class ResultCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.temp_dir.name, "cache")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_round_trip_and_stats(self):
+        cache = whisper_server.ResultCache(self.cache_dir)
+        self.assertIsNone(cache.get("missing"))
+        cache.put("key", {"text": "こんにちは", "language": "ja", "segments": []})
+
+        self.assertEqual(cache.get("key")["text"], "こんにちは")
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 1, "stores": 1, "evictions": 0})
+
+    def test_evicts_least_recently_used_entries(self):
+        cache = whisper_server.ResultCache(self.cache_dir, max_entries=2)
+        cache.put("a", {"text": "a"})
+        cache.put("b", {"text": "b"})
+        os.utime(cache.entry_path("a"), ns=(1_000_000_000, 1_000_000_000))
+        os.utime(cache.entry_path("b"), ns=(2_000_000_000, 2_000_000_000))
+        cache.get("a")
+        cache.put("c", {"text": "c"})
+
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("c"))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_size_bound_evicts_oldest(self):
+        cache = whisper_server.ResultCache(self.cache_dir, max_bytes=150)
+        cache.put("old", {"text": "x" * 80})
+        os.utime(cache.entry_path("old"), ns=(1_000_000_000, 1_000_000_000))
+        cache.put("new", {"text": "y" * 80})
+
+        self.assertFalse(os.path.exists(cache.entry_path("old")))
+        self.assertTrue(os.path.exists(cache.entry_path("new")))
+
+
+class CachedTranscriptionTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        root = Path(self.temp_dir.name)
+        self.audio_path = root / "meeting.wav"
+        self.audio_path.write_bytes(b"archived meeting")
+        self.dictionary_path = root / "user_dictionary.json"
+        self.model = CountingModel()
+        self.runtime = whisper_server.ServerRuntime(
+            model=self.model,
+            log=lambda message, level=None: None,
+            preprocess_in_memory=False,
+            dictionary_cache=whisper_server.UserDictionaryCache(path=str(self.dictionary_path)),
+            ffmpeg_module=FailingFFmpegModule(),
+            result_cache=whisper_server.ResultCache(str(root / "cache")),
+            result_cache_context="large-v3-turbo|int8",
+        )
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def serve(self, **fields):
+        payload = {"id": "m", "audio": str(self.audio_path), "language": "ja"}
+        payload.update(fields)
+        output = io.StringIO()
+        with redirect_stdout(output):
+            whisper_server.serve_request_line(self.runtime, json.dumps(payload))
+        return [json.loads(line) for line in output.getvalue().splitlines()]
+
+    def test_repeat_request_is_served_from_cache(self):
+        first = self.serve()[0]
+        second = self.serve()[0]
+
+        self.assertEqual(self.model.calls, 1)
+        self.assertNotIn("cached", first)
+        self.assertTrue(second["cached"])
+        self.assertEqual(second["text"], first["text"])
+        self.assertEqual(second["segments"], first["segments"])
+        self.assertIn("cache", second["timings"])
+
+    def test_parameters_dictionary_and_model_are_part_of_the_key(self):
+        self.serve()
+        self.serve(beam_size=1)
+        self.assertEqual(self.model.calls, 2)
+
+        self.dictionary_path.write_text(json.dumps({"words": ["KotoType"]}), encoding="utf-8")
+        self.serve()
+        self.assertEqual(self.model.calls, 3)
+
+        self.runtime.result_cache_context = "small|float32"
+        self.serve()
+        self.assertEqual(self.model.calls, 4)
+
+    def test_decode_path_settings_are_part_of_the_context(self):
+        settings = {"model": "large-v3-turbo", "device": "cpu", "compute_type": "int8"}
+        baseline = whisper_server.build_result_cache_context(settings, environ={})
+        for key, value in (("KOTOTYPE_BATCH_SIZE", "16"), ("KOTOTYPE_PREPROCESS_IN_MEMORY", "0")):
+            self.assertNotEqual(
+                whisper_server.build_result_cache_context(settings, environ={key: value}),
+                baseline,
+            )
+
+    def test_cached_stream_request_replays_segments(self):
+        self.serve()
+        records = self.serve(stream=True)
+
+        self.assertEqual([record["type"] for record in records], ["segment", "done"])
+        self.assertEqual(records[0]["text"], "議事録。")
+        self.assertTrue(records[1]["cached"])
+
+    def test_empty_results_are_not_cached(self):
+        self.model.text = ""
+        self.serve()
+        self.serve()
+        self.assertEqual(self.runtime.result_cache.stats()["stores"], 0)
+
+
+class CountingModel:
+    def __init__(self):
+        self.calls = 0
+        self.text = "議事録"
+
+    def transcribe(self, audio, **kwargs):
+        self.calls += 1
+        return [SimpleNamespace(text=self.text, start=0.0, end=2.0)], SimpleNamespace(language="ja")
+
+
+class FailingFFmpegModule:
+    def input(self, input_path, **kwargs):
+        raise RuntimeError("ffmpeg unavailable in tests")
+
+
+if __name__ == "__main__":
+    unittest.main()
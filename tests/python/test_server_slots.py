@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT / "python"))
+
+import whisper_server  # noqa: E402
+
+
+class LockSlotsTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.slot_dir = self.temp_dir.name
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def slots(self, count=1):
+        slots = whisper_server.LockSlots(self.slot_dir, "model_load", count)
+        self.addCleanup(slots.release)
+        return slots
+
+    def test_limits_holders_to_slot_count(self):
+        first = self.slots(count=2)
+        second = self.slots(count=2)
+        third = self.slots(count=2)
+
+        self.assertEqual(first.try_acquire(), 0)
+        self.assertEqual(second.try_acquire(), 1)
+        self.assertIsNone(third.try_acquire())
+        self.assertEqual(third.busy_count(), 2)
+
+        second.release()
+        self.assertEqual(third.try_acquire(), 1)
+
+    def test_waiter_wakes_when_slot_is_released(self):
+        holder = self.slots()
+        waiter = self.slots()
+        holder.try_acquire()
+        result = {}
+
+        def wait():
+            started = time.perf_counter()
+            result["index"] = waiter.acquire(timeout=5)
+            result["released_after"] = time.perf_counter() - started
+
+        thread = threading.Thread(target=wait)
+        thread.start()
+        time.sleep(0.2)
+        holder.release()
+        thread.join(timeout=5)
+
+        self.assertEqual(result["index"], 0)
+        self.assertLess(result["released_after"], 1.0)
+
+    def test_acquire_times_out_while_slots_are_busy(self):
+        holder = self.slots()
+        holder.try_acquire()
+        self.assertIsNone(self.slots().acquire(timeout=0.1))
+
+        holder.release()
+        self.assertEqual(self.slots().acquire(timeout=1), 0)
+
+    def test_timed_out_acquire_leaves_no_waiters_behind(self):
+        holders = [self.slots(count=2) for _ in range(2)]
+        for holder in holders:
+            holder.try_acquire()
+        threads_before = threading.active_count()
+
+        self.assertIsNone(self.slots(count=2).acquire(timeout=0.1))
+        self.assertEqual(threading.active_count(), threads_before)
+
+        holders[1].release()
+        self.assertEqual(self.slots(count=2).try_acquire(), 1)
+
+    def test_slot_of_killed_process_is_freed(self):
+        script = (
+            "import sys, time; sys.path.insert(0, sys.argv[1]); import whisper_server; "
+            "slots = whisper_server.LockSlots(sys.argv[2], 'model_load', 1); "
+            "print(slots.try_acquire(), flush=True); time.sleep(60)"
+        )
+        process = subprocess.Popen(
+            [sys.executable, "-c", script, str(PROJECT_ROOT / "python"), self.slot_dir],
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        try:
+            self.assertEqual(process.stdout.readline().strip(), "0")
+            self.assertIsNone(self.slots().try_acquire())
+        finally:
+            process.kill()
+            process.wait()
+            process.stdout.close()
+
+        self.assertEqual(self.slots().acquire(timeout=5), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT / "python"))
+
+import whisper_server  # noqa: E402
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class StartupProfileTests(unittest.TestCase):
+    def test_phases_are_recorded_in_order_and_accumulate(self):
+        clock = FakeClock()
+        profile = whisper_server.StartupProfile(clock=clock)
+        clock.now = 0.5
+        profile.mark("logging")
+        clock.now = 2.0
+        profile.mark("model_load")
+        clock.now = 2.25
+        profile.mark("logging")
+
+        report = profile.as_dict()
+        self.assertEqual(list(report["phases"]), ["logging", "model_load"])
+        self.assertEqual(report["phases"], {"logging": 0.75, "model_load": 1.5})
+        self.assertEqual(report["total_seconds"], 2.25)
+        self.assertEqual(profile.summary(), "logging=0.750s, model_load=1.500s")
+
+    def test_background_call_retries_on_the_caller_after_a_failure(self):
+        calls = []
+
+        def flaky():
+            calls.append(True)
+            if len(calls) == 1:
+                raise ValueError("only on the first call")
+            return "loaded"
+
+        call = whisper_server.BackgroundCall(flaky)
+        self.assertEqual(call.result(), "loaded")
+        self.assertEqual(len(calls), 2)
+        self.assertIsNotNone(call.seconds)
+
+    def test_stdin_reader_queues_lines_and_keeps_reporting_eof(self):
+        reader = whisper_server.StdinLineReader(io.StringIO("first\nsecond\n"))
+        reader.thread.join()
+
+        self.assertEqual(reader.queued(), 3)
+        self.assertEqual(list(iter(reader.readline, "")), ["first\n", "second\n"])
+        self.assertEqual(reader.readline(), "")
+
+    def test_optional_module_lookups_are_memoized(self):
+        whisper_server.OPTIONAL_MODULES.pop("ffmpeg", None)
+        first = whisper_server.load_ffmpeg_module()
+        self.assertIn("ffmpeg", whisper_server.OPTIONAL_MODULES)
+        self.assertIs(whisper_server.load_ffmpeg_module(), first)
+
+
+class StartupProfileProcessTests(unittest.TestCase):
+    def test_report_covers_interpreter_and_server_phases(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            report = whisper_server.run_startup_profile(
+                command=[sys.executable, str(PROJECT_ROOT / "python" / "whisper_server.py")],
+                environ=dict(
+                    os.environ,
+                    HOME=temp_dir,
+                    KOTOTYPE_MODEL_BACKEND="fake",
+                    KOTOTYPE_WARMUP="0",
+                ),
+                timeout=60.0,
+            )
+
+        self.assertEqual(report["type"], "startup_profile")
+        phases = report["phases"]
+        self.assertEqual(next(iter(phases)), "interpreter")
+        for name in ("logging", "registration", "slot_wait", "imports", "model_load", "ready"):
+            self.assertIn(name, phases)
+        self.assertNotIn("warmup", phases)
+        self.assertGreater(report["ready_seconds"], phases["interpreter"])
+        self.assertEqual(report["queued_lines"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT / "python"))
+
+import whisper_server  # noqa: E402
+
+
+class ListWriter:
+    def __init__(self):
+        self.lines = []
+
+    def write(self, line):
+        self.lines.append(line)
+
+    def close(self):
+        pass
+
+
+class TraceCaptureTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        self.audio_path = self.root / "segment.wav"
+        whisper_server.write_synthetic_warmup_wav(str(self.audio_path), duration_seconds=1.5)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def serve(self, runtime, line):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            whisper_server.serve_request_line(runtime, line)
+        return output.getvalue()
+
+    def build_runtime(self, trace):
+        return whisper_server.ServerRuntime(
+            model=whisper_server.FakeWhisperModel(text="記録"),
+            log=lambda message, level=None: None,
+            preprocess_in_memory=False,
+            dictionary_cache=whisper_server.UserDictionaryCache(
+                path=str(self.root / "missing.json")
+            ),
+            ffmpeg_module=FailingFFmpegModule(),
+            trace=trace,
+        )
+
+    def test_served_lines_are_recorded_with_audio_hash_and_duration(self):
+        writer = ListWriter()
+        runtime = self.build_runtime(whisper_server.TraceRecorder(writer))
+        line = f"{self.audio_path}|ja\n"
+        self.assertEqual(self.serve(runtime, line), "記録。\n")
+
+        entry = json.loads(writer.lines[0])
+        self.assertEqual(entry["line"], line.rstrip("\n"))
+        self.assertEqual(entry["audio"], str(self.audio_path))
+        self.assertEqual(entry["sha256"], whisper_server.hash_file(str(self.audio_path)))
+        self.assertEqual(entry["seconds"], 1.5)
+        self.assertIsNone(entry["copy"])
+
+    def test_copy_mode_keeps_one_copy_per_content(self):
+        writer = ListWriter()
+        audio_dir = str(self.root / "trace.jsonl.audio")
+        runtime = self.build_runtime(
+            whisper_server.TraceRecorder(writer, audio_mode="copy", audio_dir=audio_dir)
+        )
+        for index in range(2):
+            self.serve(runtime, json.dumps({"id": index, "audio": str(self.audio_path)}))
+
+        entries = [json.loads(line) for line in writer.lines]
+        self.assertEqual(entries[0]["copy"], entries[1]["copy"])
+        self.assertEqual(os.listdir(audio_dir), [entries[0]["copy"]])
+
+    def test_trace_is_off_unless_a_path_is_configured(self):
+        self.assertIsNone(whisper_server.create_trace_recorder(lambda message, level=None: None, environ={}))
+        recorder = whisper_server.create_trace_recorder(
+            lambda message, level=None: None,
+            environ={
+                "KOTOTYPE_TRACE_PATH": str(self.root / "trace.jsonl"),
+                "KOTOTYPE_TRACE_AUDIO": "bogus",
+            },
+        )
+        try:
+            self.assertEqual(recorder.audio_mode, "hash")
+        finally:
+            recorder.close()
+
+
+class FakeModelBackendTests(unittest.TestCase):
+    def test_fake_backend_is_selected_by_environment(self):
+        model_class = whisper_server.load_whisper_model_class(
+            {"KOTOTYPE_MODEL_BACKEND": "fake", "KOTOTYPE_FAKE_MODEL_TEXT": "固定"}
+        )
+        model = model_class("large-v3-turbo", device="cpu", compute_type="int8")
+        segments, info = model.transcribe("missing.mp3", language="ja")
+
+        segment = list(segments)[0]
+        self.assertEqual(segment.text, "固定")
+        self.assertEqual(segment.end, 1.0)
+        self.assertEqual(info.language, "ja")
+
+
+class FailingFFmpegModule:
+    def input(self, input_path, **kwargs):
+        raise RuntimeError("ffmpeg unavailable in tests")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import json
+import os
 import sys
 import tempfile
 import unittest
@@ -51,6 +52,74 @@ class UserDictionaryTests(unittest.TestCase):
         self.assertIn("faster-whisper", prompt)
         self.assertEqual(prompt.count("OpenAI"), 1)
 
+    def test_generate_initial_prompt_matches_for_pre_normalized_words(self):
+        words = whisper_server.normalize_user_words(["  OpenAI ", "openai", "MPS"])
+        self.assertEqual(
+            whisper_server.generate_initial_prompt(
+                "en", user_words=words, words_normalized=True
+            ),
+            whisper_server.generate_initial_prompt("en", user_words=["  OpenAI ", "MPS"]),
+        )
+
+    def test_dictionary_cache_reloads_only_when_file_changes(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            dict_path = Path(temp_dir) / "user_dictionary.json"
+            dict_path.write_text(json.dumps({"words": ["OpenAI"]}), encoding="utf-8")
+            cache = whisper_server.UserDictionaryCache(path=str(dict_path))
+
+            self.assertEqual(cache.get_words(), ["OpenAI"])
+            self.assertEqual(cache.get_words(), ["OpenAI"])
+            self.assertEqual(cache.version, 1)
+            self.assertEqual(cache.dictionary_hits, 1)
+            self.assertEqual(cache.dictionary_misses, 1)
+
+            dict_path.write_text(
+                json.dumps({"words": ["OpenAI", "CTranslate2"]}),
+                encoding="utf-8",
+            )
+            stat_result = os.stat(dict_path)
+            os.utime(
+                dict_path,
+                ns=(stat_result.st_atime_ns, stat_result.st_mtime_ns + 1_000_000),
+            )
+
+            self.assertEqual(cache.get_words(), ["OpenAI", "CTranslate2"])
+            self.assertEqual(cache.version, 2)
+
+    def test_dictionary_cache_handles_missing_file(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cache = whisper_server.UserDictionaryCache(
+                path=str(Path(temp_dir) / "missing.json")
+            )
+            self.assertEqual(cache.get_words(), [])
+            self.assertEqual(cache.get_words(), [])
+            self.assertEqual(cache.dictionary_misses, 1)
+
+    def test_dictionary_cache_memoizes_prompt_per_language_and_context(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            dict_path = Path(temp_dir) / "user_dictionary.json"
+            dict_path.write_text(json.dumps({"words": ["faster-whisper"]}), encoding="utf-8")
+            cache = whisper_server.UserDictionaryCache(path=str(dict_path))
+
+            ja_prompt = cache.get_initial_prompt("ja", screenshot_context="Editor")
+            self.assertIs(cache.get_initial_prompt("ja", screenshot_context="Editor"), ja_prompt)
+            en_prompt = cache.get_initial_prompt("en", screenshot_context="Editor")
+            other_context = cache.get_initial_prompt("ja", screenshot_context="Browser")
+
+            self.assertIn("faster-whisper", ja_prompt)
+            self.assertIn("Please accurately recognize", en_prompt)
+            self.assertIn("Browser", other_context)
+            self.assertEqual(cache.prompt_hits, 1)
+            self.assertEqual(cache.prompt_misses, 3)
+            self.assertEqual(
+                ja_prompt,
+                whisper_server.generate_initial_prompt(
+                    "ja",
+                    user_words=["faster-whisper"],
+                    screenshot_context="Editor",
+                ),
+            )
+
     def test_post_process_text_with_auto_punctuation_enabled(self):
         text = "今日は晴れです そして散歩に行きます"
         processed = whisper_server.post_process_text(